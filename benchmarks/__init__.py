@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+
+"""Performance benchmarks of cronls (see benchmarks.run)."""
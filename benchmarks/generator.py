@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+"""Deterministic generator of synthetic crontab spools."""
+
+import os
+import random
+
+# ==================================================================== #
+
+# Field values with their weights, roughly as found on real hosts
+MINUTES = [('0', 30), ('*/5', 10), ('*/15', 6), ('15,45', 4), ('30', 10), ('0-30/10', 3), ('7', 10), ('*', 1)]
+HOURS = [('*', 30), ('2', 10), ('8-18', 10), ('*/6', 5), ('0,12', 5), ('23', 5)]
+DAYS_OF_MONTH = [('*', 80), ('1', 8), ('1,15', 5), ('*/10', 2)]
+MONTHS = [('*', 90), ('jan,jul', 3), ('*/3', 3), ('mar-oct', 2)]
+DAYS_OF_WEEK = [('*', 70), ('mon-fri', 15), ('sun', 8), ('1-5', 5), ('sat,sun', 2)]
+MACROS = [('@daily', 5), ('@hourly', 5), ('@weekly', 3), ('@monthly', 2)]
+
+# Probability that a rule is an @-macro
+MACRO_RATE = 0.1
+
+# ==================================================================== #
+
+def weighted_choice(rnd, choices):
+	"""
+	Return a value from a list of (value, weight) pairs
+	"""
+	total = sum(weight for value, weight in choices)
+	r = rnd.uniform(0, total)
+	for value, weight in choices:
+		r -= weight
+		if r <= 0:
+			return value
+	return choices[-1][0]
+
+# -------------------------------------------------------------------- #
+
+def generate_rows(rnd, rules):
+	"""
+	Generate the rows of a crontab file
+
+	Args:
+		rnd (random.Random): Random generator
+		rules (int): Number of rules
+
+	Returns:
+		list: Crontab rows ("\\n" terminated), with some comments and variables
+	"""
+	rows = [
+		'# Generated crontab\n',
+		'SHELL=/bin/sh\n',
+		'MAILTO=""\n',
+		'\n',
+	]
+
+	for i in range(rules):
+		if rnd.random() < MACRO_RATE:
+			schedule = weighted_choice(rnd, MACROS)
+		else:
+			schedule = ' '.join(weighted_choice(rnd, field) for field in (
+				MINUTES, HOURS, DAYS_OF_MONTH, MONTHS, DAYS_OF_WEEK))
+
+		if rnd.random() < 0.1:
+			rows.append('# Job %d\n' % i)
+
+		rows.append('%s /opt/jobs/job_%d.sh --id %d > /dev/null 2>&1\n' % (schedule, i, rnd.randint(0, 9999)))
+
+	return rows
+
+# -------------------------------------------------------------------- #
+
+def generate_spool(path, users, rules, seed=0):
+	"""
+	Generate a synthetic spool: "users" crontab files with "rules" rules each
+	in "<path>/crontabs", plus a system crontab ("<path>/crontab") with
+	run-parts rows on "<path>/cron.{hourly,daily,weekly}". The same arguments
+	always generate the same files.
+
+	Args:
+		path (str): Destination directory (created if needed)
+		users (int): Number of users
+		rules (int): Number of rules per user
+		seed (int): Random seed
+
+	Returns:
+		tuple: Tuple containing:
+
+			cron_dir (str): Users crontabs directory
+			sys_cron_file (str): System crontab path
+	"""
+	rnd = random.Random(seed)
+
+	cron_dir = os.path.join(path, 'crontabs')
+	if not os.path.isdir(cron_dir):
+		os.makedirs(cron_dir)
+
+	for u in range(users):
+		with open(os.path.join(cron_dir, 'user%05d' % u), 'w') as f:
+			f.writelines(generate_rows(rnd, rules))
+
+	sys_rows = ['SHELL=/bin/sh\n']
+	for name, schedule in (('hourly', '17 * * * *'), ('daily', '25 6 * * *'), ('weekly', '47 6 * * 7')):
+		parts_dir = os.path.join(path, 'cron.%s' % name)
+		if not os.path.isdir(parts_dir):
+			os.makedirs(parts_dir)
+		for i in range(3):
+			open(os.path.join(parts_dir, 'script%d' % i), 'w').close()
+		sys_rows.append('%s root run-parts %s\n' % (schedule, parts_dir))
+
+	sys_cron_file = os.path.join(path, 'crontab')
+	with open(sys_cron_file, 'w') as f:
+		f.writelines(sys_rows)
+
+	return cron_dir, sys_cron_file
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+"""
+Time the cronls stages (read, parse, evaluate, print) on a synthetic spool and
+write the results to a JSON file, to compare them between commits.
+
+Usage:
+	python -m benchmarks.run [--users N] [--rules M] [-o results.json]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import platform
+import tempfile
+import subprocess
+
+import cronls
+import cronls.args
+import cronls.cronls
+
+from benchmarks import generator
+
+# ==================================================================== #
+
+# Start of every evaluation window (a fixed date keeps results comparable)
+WINDOW_START = datetime.datetime(2016, 5, 20)
+
+WINDOWS = {
+	'1h': datetime.timedelta(0, 3600),
+	'1d': datetime.timedelta(1),
+	'30d': datetime.timedelta(30),
+	'1y': datetime.timedelta(365),
+}
+
+# ==================================================================== #
+
+def best_time(func, repeat):
+	"""
+	Call "func" "repeat" times and return the best wall time and the last
+	result
+	"""
+	best = None
+	result = None
+	for i in range(repeat):
+		t = time.perf_counter()
+		result = func()
+		elapsed = time.perf_counter() - t
+		if best is None or elapsed < best:
+			best = elapsed
+	return best, result
+
+# -------------------------------------------------------------------- #
+
+def git_commit():
+	"""
+	Return the current git commit of the working directory (None if unknown)
+	"""
+	try:
+		return subprocess.check_output(
+			['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+# -------------------------------------------------------------------- #
+
+def run_benchmarks(spool_dir, bench_args):
+	"""
+	Run all the benchmarks on the spool in "spool_dir".
+
+	Args:
+		spool_dir (str): Directory where the spool is generated
+		bench_args (argparse.Namespace): Benchmark arguments
+
+	Returns:
+		list: List of results dictionaries in the form:
+			{
+				'stage': '...',         # Timed function
+				'window': '...',        # Evaluation window (if any)
+				'seconds': n,           # Best wall time
+				'items': n,             # Files, rules or executions processed
+			}
+	"""
+	cron_dir, sys_cron_file = generator.generate_spool(
+		spool_dir, bench_args.users, bench_args.rules, bench_args.seed)
+
+	input_args = cronls.args.parse_cmd_args([
+		'--all', '--no-cache',
+		'-d', cron_dir,
+		'--sys-cron-file', sys_cron_file,
+		'--cron-d-dir', os.path.join(spool_dir, 'cron.d'),
+		'-r', str(bench_args.max_hourly_repetitions),
+	])
+
+	results = []
+
+	def add_result(stage, seconds, items, window=None):
+		results.append({'stage': stage, 'window': window, 'seconds': seconds, 'items': items})
+		print('%-24s %-4s %10.4fs %10d' % (stage, window or '', seconds, items), file=sys.stderr)
+
+	# Read
+	seconds, c_files = best_time(lambda: cronls.cronls.get_crontab_files(input_args), bench_args.repeat)
+	add_result('get_crontab_files', seconds, len(c_files))
+
+	# Parse
+	def parse():
+		cronls.cronls.compile_field.cache_clear()
+		return [cronls.cronls.analyze_cron_file(c_file['user'], c_file['rows'], None, c_file.get('system'))
+			for c_file in c_files]
+
+	seconds, parsed = best_time(parse, bench_args.repeat)
+	add_result('analyze_cron_file', seconds, sum(len(rules) for rules in parsed))
+
+	crontab_l = []
+	for c_file, rules in zip(c_files, parsed):
+		crontab_l.extend(cronls.cronls.finalize_crontab_file(input_args, c_file, rules))
+
+	max_user_length = max([len(rule.user) for rule in crontab_l])
+
+	# Evaluate and print, for each window
+	with open(os.devnull, 'w') as devnull:
+		for window in bench_args.windows:
+			input_args.start_time = WINDOW_START
+			input_args.stop_time = WINDOW_START + WINDOWS[window]
+
+			seconds, exec_l = best_time(
+				lambda: cronls.cronls.calc_executed_crontabs(input_args, crontab_l), bench_args.repeat)
+			add_result('calc_executed_crontabs', seconds, len(exec_l), window)
+
+			seconds, _ = best_time(
+				lambda: cronls.cronls.print_executed_crontabs(input_args, exec_l, max_user_length, out=devnull),
+				bench_args.repeat)
+			add_result('print_executed_crontabs', seconds, len(exec_l), window)
+
+			del exec_l
+
+	return results
+
+# ==================================================================== #
+
+def parse_cmd_args(argv):
+	parser = argparse.ArgumentParser(description='Time the cronls stages on a synthetic spool')
+
+	parser.add_argument('--users', type=int, default=20, help='Number of users (default %(default)s)')
+	parser.add_argument('--rules', type=int, default=10, help='Number of rules per user (default %(default)s)')
+	parser.add_argument('--seed', type=int, default=0, help='Generator random seed (default %(default)s)')
+	parser.add_argument('--repeat', type=int, default=3, help='Runs of each stage, the best is kept (default %(default)s)')
+	parser.add_argument(
+		'--windows', nargs='+', choices=sorted(WINDOWS), default=['1h', '1d', '30d', '1y'],
+		help='Evaluation windows (default all)')
+	parser.add_argument(
+		'-r', '--max-hourly-repetitions', dest='max_hourly_repetitions', type=int, default=4,
+		help='Same as cronls "-r" (default %(default)s)')
+	parser.add_argument(
+		'--spool-dir', default=None,
+		help='Where to generate the spool (default a temporary directory)')
+	parser.add_argument(
+		'-o', '--output', default='benchmark.json', help='Results file (default %(default)s)')
+
+	return parser.parse_args(argv)
+
+# -------------------------------------------------------------------- #
+
+def main(bench_args):
+	if bench_args.spool_dir:
+		results = run_benchmarks(bench_args.spool_dir, bench_args)
+	else:
+		with tempfile.TemporaryDirectory(prefix='cronls-bench-') as spool_dir:
+			results = run_benchmarks(spool_dir, bench_args)
+
+	report = {
+		'meta': {
+			'cronls_version': cronls.__version__,
+			'commit': git_commit(),
+			'python': platform.python_version(),
+			'platform': platform.platform(),
+			'date': datetime.datetime.now().isoformat(),
+			'users': bench_args.users,
+			'rules': bench_args.rules,
+			'seed': bench_args.seed,
+			'repeat': bench_args.repeat,
+			'max_hourly_repetitions': bench_args.max_hourly_repetitions,
+		},
+		'results': results,
+	}
+
+	with open(bench_args.output, 'w') as f:
+		json.dump(report, f, indent=4)
+
+# -------------------------------------------------------------------- #
+
+if __name__ == '__main__':
+	main(parse_cmd_args(sys.argv[1:]))
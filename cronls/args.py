@@ -108,12 +108,185 @@ def check_file(value):
 	return value
 
 
+# -------------------------------------------------------------------- #
+
+def default_cache_file():
+	"""
+	Return the default path of the parse cache file
+	($XDG_CACHE_HOME/cronls/parse.cache, XDG_CACHE_HOME defaulting to ~/.cache)
+	"""
+	cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+	return os.path.join(cache_home, 'cronls', 'parse.cache')
+
+def crontab_arguments_parser():
+	"""
+	Return the parser of the arguments selecting and filtering the crontabs,
+	shared by cronls and its subcommands (see :data:`COMMANDS`)
+
+	Returns:
+		argparse.ArgumentParser: Parser to be used as a parent parser
+	"""
+	parser = argparse.ArgumentParser(add_help=False)
+
+	parser.add_argument(
+		'-a', '--all',
+		dest="all",
+		action='store_true',
+		default=False,
+		help='Search for all users and system crons instead for the current user only'
+	)
+
+	parser.add_argument(
+		'-s', '--no-system-cron',
+		dest="system_cron",
+		action='store_false',
+		default=True,
+		help='Do not include system crons'
+	)
+
+	parser.add_argument(
+		'-r', '--max-hourly-repetitions',
+		dest="max_hourly_repetitions",
+		action='store',
+		type=int,
+		default=4,
+		help='Do not show jobs that execute more than X times per hour (noise reduction, default 4)'
+	)
+
+	parser.add_argument(
+		'-R', '--max-daily-repetitions',
+		dest="max_daily_repetitions",
+		action='store',
+		type=int,
+		default=None,
+		help='Do not show jobs that execute more than X times per day (noise reduction, default no limit)'
+	)
+
+	parser.add_argument(
+		'-d', '--cron-dir',
+		dest="cron_dir",
+		action='store',
+		type=str,
+		default='/var/spool/cron',
+		help='Directory where cronls looks for cron files'
+	)
+
+	parser.add_argument(
+		'--collect',
+		dest="collect",
+		action='store',
+		choices=['spool', 'crontab'],
+		default='spool',
+		help='How "--all" reads the users crontabs: from the cron directory (spool, default) or running '
+			'"crontab -l -u USER" for every user of the passwd database (crontab), when the cron directory '
+			'is not readable'
+	)
+
+	parser.add_argument(
+		'--crontab-command',
+		dest="crontab_command",
+		action='store',
+		default='crontab',
+		metavar='COMMAND',
+		help='Command run by "--collect crontab" (e.g. "sudo -n crontab", default crontab)'
+	)
+
+	parser.add_argument(
+		'--collect-workers',
+		dest="collect_workers",
+		action='store',
+		type=int,
+		default=64,
+		metavar='N',
+		help='Max number of commands run at the same time by "--collect crontab" (default 64)'
+	)
+
+	parser.add_argument(
+		'--sys-cron-file',
+		dest="sys_cron_file",
+		action='store',
+		type=None,
+		default='/etc/crontab',
+		help='File that cronls scans for system crons'
+	)
+
+	parser.add_argument(
+		'--cron-d-dir',
+		dest="cron_d_dir",
+		action='store',
+		type=str,
+		default='/etc/cron.d',
+		help='Directory of the system crontab drop-ins, scanned with the system crons (default %(default)s)'
+	)
+
+	parser.add_argument(
+		'--cache-file',
+		dest="cache_file",
+		action='store',
+		type=str,
+		default=default_cache_file(),
+		help='File where the parsed crontabs are cached between runs (default %(default)s)'
+	)
+
+	parser.add_argument(
+		'--no-cache',
+		dest="cache_file",
+		action='store_const',
+		const=None,
+		help='Do not use the parse cache'
+	)
+
+	return parser
+
+# -------------------------------------------------------------------- #
+
+def output_arguments_parser():
+	"""
+	Return the parser of the arguments selecting the output format of the
+	executions, shared by cronls and its subcommands
+
+	Returns:
+		argparse.ArgumentParser: Parser to be used as a parent parser
+	"""
+	parser = argparse.ArgumentParser(add_help=False)
+
+	parser.add_argument(
+		'-f', '--format',
+		dest="output_format",
+		action='store',
+		choices=['text', 'jsonl', 'csv', 'tsv'],
+		default='text',
+		help='Output format of the executions (default text)'
+	)
+
+	return parser
+
+# -------------------------------------------------------------------- #
+
+def check_crontab_args(args):
+	"""
+	Check the arguments defined by :func:`crontab_arguments_parser`
+
+	Raises:
+		argparse.ArgumentTypeError
+	"""
+	if args.all:
+		if args.collect == 'spool':
+			check_dir(args.cron_dir)
+
+		if args.system_cron:
+			check_file(args.sys_cron_file)
+
 # ==================================================================== #
 
 def parse_cmd_args(argv):
 	"""
 	Parse the given arguments.
 
+	If the first argument is a subcommand (see :data:`COMMANDS`), the rest of
+	the arguments are parsed by the subcommand parser and the "command"
+	attribute of the result is the subcommand name (None otherwise).
+
 	Args:
 		argv (list): List of command line arguments (strings)
 
@@ -125,13 +298,18 @@ def parse_cmd_args(argv):
 		argparse.ArgumentTypeError
 	"""
 
+	if argv and argv[0] in COMMANDS:
+		return COMMANDS[argv[0]](argv[1:])
+
 	# -------------------------------------- #
 	# Parser definition
 
 	parser = argparse.ArgumentParser(
 		description='',
-		epilog='',
+		epilog='Commands: %s (see "cronls COMMAND --help")' % ', '.join(sorted(COMMANDS)),
+		parents=[crontab_arguments_parser(), output_arguments_parser()],
 	)
+	parser.set_defaults(command=None)
 
 	parser.add_argument(
 		'start_time',
@@ -150,47 +328,111 @@ def parse_cmd_args(argv):
 	)
 
 	parser.add_argument(
-		'-a', '--all',
-		dest="all",
+		'-S', '--summarize',
+		dest="summarize",
 		action='store_true',
 		default=False,
-		help='Search for all users and system crons instead for the current user only'
+		help='Show, for each job, the executions collapsed in compact runs (e.g. "every 5 min from 08:00 to 18:55") '
+			'instead of every execution. Frequent jobs are summarized too instead of being hidden'
 	)
 
 	parser.add_argument(
-		'-s', '--no-system-cron',
-		dest="system_cron",
-		action='store_false',
-		default=True,
-		help='Do not include system crons'
+		'-c', '--count',
+		dest="count",
+		action='store_true',
+		default=False,
+		help='Show how many times each job, user and hour of the day is executed instead of every execution. '
+			'Frequent jobs are counted too instead of being hidden'
 	)
 
 	parser.add_argument(
-		'-r', '--max-hourly-repetitions',
-		dest="max_hourly_repetitions",
+		'--heatmap',
+		dest="heatmap",
+		nargs='?',
+		const='text',
+		default=None,
+		choices=['text', 'csv'],
+		help='Show the minutes with the most job starts and the job starts per hour and day of week, '
+			'as text (default) or CSV. Frequent jobs are counted too instead of being hidden'
+	)
+
+	parser.add_argument(
+		'--top',
+		dest="top",
 		action='store',
 		type=int,
-		default=4,
-		help='Do not show jobs that execute more than X times per hour (noise reduction, default 4)'
+		default=10,
+		help='Number of peak minutes shown by --heatmap (default 10)'
 	)
 
 	parser.add_argument(
-		'-d', '--cron-dir',
-		dest="cron_dir",
+		'--fleet',
+		dest="fleet",
 		action='store',
-		type=str,
-		default='/var/spool/cron',
-		help='Directory where cronls looks for cron files'
+		default=None,
+		metavar='DIR',
+		help='Analyze together the crontabs of many hosts: DIR contains a directory or a tarball per host, '
+			'named after the host, with the cron directory and the system crontab at their usual paths. '
+			'Executions get a host column'
 	)
 
 	parser.add_argument(
-		'--sys-cron-file',
-		dest="sys_cron_file",
+		'--engine',
+		dest="engine",
 		action='store',
-		type=None,
-		default='/etc/crontab',
-		help='File that cronls scans for system crons'
+		choices=['python', 'numpy'],
+		default='python',
+		help='Engine computing the executions: numpy is faster on long windows, and falls back to python '
+			'if NumPy is not installed (default python)'
+	)
+
+	parser.add_argument(
+		'--jobs',
+		dest="jobs",
+		action='store',
+		type=int,
+		default=1,
+		metavar='N',
+		help='Compute the executions with N processes, each one on a part of the window (0 means one per CPU, '
+			'default 1)'
+	)
+
+	parser.add_argument(
+		'-w', '--watch',
+		dest="watch",
+		action='store_true',
+		default=False,
+		help='Keep running and print the executions again every time a crontab changes. The window '
+			'is as long as the start-stop one and starts from now'
+	)
+
+	parser.add_argument(
+		'--interval',
+		dest="watch_interval",
+		action='store',
+		type=float,
+		default=30,
+		metavar='SECONDS',
+		help='Seconds between two checks of the crontabs in --watch mode (default 30)'
+	)
+
+	parser.add_argument(
+		'--stats',
+		dest="stats",
+		action='store_true',
+		default=False,
+		help='Print on stderr time and peak memory of each stage, and rules and executions counts'
+	)
+
+	parser.add_argument(
+		'--profile',
+		dest="profile",
+		action='store',
+		metavar='FILE',
+		default=None,
+		help='Run under cProfile and write the pstats data to FILE'
 	)
+
 	# -------------------------------------- #
 
 	# -------------------------------------- #
@@ -205,15 +447,259 @@ def parse_cmd_args(argv):
 	if args.start_time >= args.stop_time:
 		argparse.ArgumentTypeError('Start time (%s) is higher then stop time (%s)' % (args.start_time, args.stop_time))
 
-	if args.all:
-		check_dir(args.cron_dir)
+	if args.jobs < 0:
+		parser.error('--jobs must be a positive number')
 
-		if args.system_cron:
-			check_file(args.sys_cron_file)
+	if args.jobs == 0:
+		args.jobs = os.cpu_count() or 1
+
+	if args.watch and (args.summarize or args.count or args.heatmap):
+		parser.error('--watch can\'t be used with --summarize, --count or --heatmap')
+
+	if args.watch and args.fleet:
+		parser.error('--watch can\'t be used with --fleet')
+
+	if args.fleet:
+		check_dir(args.fleet)
+	else:
+		check_crontab_args(args)
 	# -------------------------------------- #
 
 	return args
 
+# -------------------------------------------------------------------- #
+
+def parse_serve_args(argv):
+	"""
+	Parse the arguments of the "serve" subcommand.
+
+	Args:
+		argv (list): List of command line arguments (strings), subcommand excluded
+
+	Returns:
+		argparse.Namespace: The input arguments
+
+	Raises:
+		argparse.ArgumentTypeError
+	"""
+	parser = argparse.ArgumentParser(
+		prog='cronls serve',
+		description='Load the crontabs once and answer queries about their executions on a Unix socket '
+			'(one JSON object per line)',
+		parents=[crontab_arguments_parser()],
+	)
+	# Queries see every job, frequent ones included
+	parser.set_defaults(command='serve', max_hourly_repetitions=60)
+
+	parser.add_argument(
+		'--socket',
+		dest="socket",
+		action='store',
+		required=True,
+		metavar='PATH',
+		help='Path of the Unix socket to listen on'
+	)
+
+	parser.add_argument(
+		'--query-cache-size',
+		dest="query_cache_size",
+		action='store',
+		type=int,
+		default=1024,
+		help='Number of recent query results kept in memory (default 1024)'
+	)
+
+	args = parser.parse_args(argv)
+
+	check_crontab_args(args)
+
+	return args
+
+# -------------------------------------------------------------------- #
+
+def parse_at_args(argv):
+	"""
+	Parse the arguments of the "at" subcommand.
+
+	Args:
+		argv (list): List of command line arguments (strings), subcommand excluded
+
+	Returns:
+		argparse.Namespace: The input arguments
+
+	Raises:
+		argparse.ArgumentTypeError
+	"""
+	parser = argparse.ArgumentParser(
+		prog='cronls at',
+		description='Show the jobs executed at the given time',
+		parents=[crontab_arguments_parser(), output_arguments_parser()],
+	)
+	# Every job is shown, frequent ones included
+	parser.set_defaults(command='at', max_hourly_repetitions=60)
+
+	parser.add_argument(
+		'ts',
+		type=check_datetime,
+		help='Date or datetime. Admitted formats: "now", "[+|-]hh" (e.g. "+24" or "-4") or "yy/mm/dd[-HH:MM]"'
+	)
+
+	args = parser.parse_args(argv)
+
+	check_crontab_args(args)
+
+	return args
+
+# -------------------------------------------------------------------- #
+
+def parse_next_args(argv):
+	"""
+	Parse the arguments of the "next" subcommand.
+
+	Args:
+		argv (list): List of command line arguments (strings), subcommand excluded
+
+	Returns:
+		argparse.Namespace: The input arguments
+
+	Raises:
+		argparse.ArgumentTypeError
+	"""
+	parser = argparse.ArgumentParser(
+		prog='cronls next',
+		description='Show the next executions of the jobs (of a user, or whose command contains a string)',
+		parents=[crontab_arguments_parser(), output_arguments_parser()],
+	)
+	# Every job is shown, frequent ones included
+	parser.set_defaults(command='next', max_hourly_repetitions=60)
+
+	parser.add_argument(
+		'from_time',
+		type=check_datetime,
+		nargs='?',
+		default='now',
+		help='Search start. Admitted formats: "now", "[+|-]hh" (e.g. "+24" or "-4") or "yy/mm/dd[-HH:MM]"'
+	)
+
+	parser.add_argument(
+		'-n', '--runs',
+		dest="runs",
+		action='store',
+		type=int,
+		default=10,
+		help='Number of executions to show (default 10)'
+	)
+
+	parser.add_argument(
+		'-u', '--user',
+		dest="user",
+		action='store',
+		default=None,
+		help='Only the jobs of this user'
+	)
+
+	parser.add_argument(
+		'-j', '--job',
+		dest="job",
+		action='store',
+		default=None,
+		help='Only the jobs whose command contains this string'
+	)
+
+	args = parser.parse_args(argv)
+
+	check_crontab_args(args)
+
+	return args
+
+# -------------------------------------------------------------------- #
+
+def parse_reconcile_args(argv):
+	"""
+	Parse the arguments of the "reconcile" subcommand.
+
+	Args:
+		argv (list): List of command line arguments (strings), subcommand excluded
+
+	Returns:
+		argparse.Namespace: The input arguments
+
+	Raises:
+		argparse.ArgumentTypeError
+	"""
+	parser = argparse.ArgumentParser(
+		prog='cronls reconcile',
+		description='Compare the executions of a past window with the commands logged by cron, '
+			'showing the missed, late and extra runs',
+		parents=[crontab_arguments_parser(), output_arguments_parser()],
+	)
+	# Every rule is compared (run-parts rows are logged as they are)
+	parser.set_defaults(command='reconcile', max_hourly_repetitions=60, expand_run_parts=False)
+
+	parser.add_argument(
+		'start_time',
+		type=check_datetime,
+		nargs='?',
+		default='-24',
+		help='Start date or datetime (default -24). Admitted formats: "now", "[+|-]hh" (e.g. "+24" or "-4") '
+			'or "yy/mm/dd[-HH:MM]"'
+	)
+
+	parser.add_argument(
+		'stop_time',
+		type=check_datetime,
+		nargs='?',
+		default='now',
+		help='Stop date or datetime (default now). Admitted formats: "now", "[+|-]hh" (e.g. "+24" or "-4") '
+			'or "yy/mm/dd[-HH:MM]"'
+	)
+
+	parser.add_argument(
+		'-l', '--log',
+		dest="logs",
+		action='append',
+		type=check_file,
+		metavar='FILE',
+		help='Cron log file, can be repeated for rotated logs (default the first of %s)' % ', '.join(DEFAULT_CRON_LOGS)
+	)
+
+	parser.add_argument(
+		'--tolerance',
+		dest="tolerance",
+		action='store',
+		type=int,
+		default=5,
+		metavar='MINUTES',
+		help='Max delay of a late run: later runs are reported as missed and extra (default 5)'
+	)
+
+	args = parser.parse_args(argv)
+
+	if args.tolerance < 0:
+		parser.error('argument --tolerance: must not be negative')
+
+	if not args.logs:
+		args.logs = [path for path in DEFAULT_CRON_LOGS if os.path.isfile(path)][:1]
+		if not args.logs:
+			parser.error('no cron log found, use --log')
+
+	check_crontab_args(args)
+
+	return args
+
+# -------------------------------------------------------------------- #
+
+# Logs read by the "reconcile" subcommand, if none is given
+DEFAULT_CRON_LOGS = ('/var/log/cron', '/var/log/syslog')
+
+# Subcommands and the functions parsing their arguments
+COMMANDS = {
+	'serve': parse_serve_args,
+	'at': parse_at_args,
+	'next': parse_next_args,
+	'reconcile': parse_reconcile_args,
+}
+
 # ==================================================================== #
 
 if __name__ == '__main__':
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+"""Module containing the persistent cache of the parsed crontab files."""
+
+import os
+import marshal
+
+# Cache file format version: must be increased every time the format of the
+# stored data changes
+CACHE_FORMAT = 1
+
+# Default max size (in bytes) of the cache file
+DEFAULT_MAX_SIZE = 8 * 1024 * 1024
+
+# ==================================================================== #
+
+def file_key(path):
+	"""
+	Return the key identifying the current version of a file.
+
+	A file rewritten by "crontab -e" always changes at least one of inode,
+	size and modification time.
+
+	Args:
+		path (str): File path
+
+	Returns:
+		tuple: (st_ino, st_size, st_mtime_ns) or None if the file can't be stat-ed
+	"""
+	try:
+		st = os.stat(path)
+	except OSError:
+		return None
+	return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+# ==================================================================== #
+
+class ParseCache(object):
+	"""
+	On-disk cache of the parsed files, stored as a single marshal file.
+
+	Each entry is identified by the file path and is valid only as long as the
+	file key (see :func:`file_key`) doesn't change. When the cache file grows
+	over "max_size" bytes, the least recently used entries are evicted.
+
+	Any problem reading or writing the cache file is silently ignored: the
+	cache is only an optimization.
+
+	Args:
+		path (str): Cache file path (None for a memory only cache, whose values
+			don't need to be marshal-able)
+		version (object): Version of the stored values (any marshal-able object):
+			if it doesn't match the one in the cache file, the whole cache is
+			discarded
+		max_size (int): Max size in bytes of the cache file
+	"""
+
+	def __init__(self, path, version=None, max_size=DEFAULT_MAX_SIZE):
+		self.path = path
+		self.version = version
+		self.max_size = max_size
+		self.entries = {}
+		self.serial = 0
+		self.dirty = False
+
+		self.load()
+
+	# -------------------------------------------------------------------- #
+
+	def load(self):
+		if self.path is None:
+			return
+
+		try:
+			with open(self.path, 'rb') as f:
+				data = marshal.load(f)
+		except (OSError, EOFError, ValueError, TypeError):
+			return
+
+		if not isinstance(data, tuple) or len(data) != 4 or data[:2] != (CACHE_FORMAT, self.version):
+			return
+
+		self.serial, self.entries = data[2:]
+
+	# -------------------------------------------------------------------- #
+
+	def get(self, path, key):
+		"""
+		Return the value stored for "path", or None if there is no value or it
+		was stored with a different key.
+		"""
+		if key is None:
+			return None
+
+		entry = self.entries.get(path)
+		if entry is None or entry[0] != key:
+			return None
+
+		# Hits are recent uses too (see evict()). The cache isn't marked dirty:
+		# the new order is saved along with the next change
+		self.serial += 1
+		self.entries[path] = (key, self.serial, entry[2])
+
+		return entry[2]
+
+	# -------------------------------------------------------------------- #
+
+	def put(self, path, key, value):
+		"""
+		Store "value" (any marshal-able object) for "path" at version "key"
+		"""
+		if key is None:
+			return
+
+		self.serial += 1
+		self.entries[path] = (key, self.serial, value)
+		self.dirty = True
+
+	# -------------------------------------------------------------------- #
+
+	def evict(self, data_size):
+		"""
+		Remove the least recently used entries until the estimated cache size
+		is under "max_size"
+		"""
+		sizes = dict((path, len(marshal.dumps(entry))) for path, entry in self.entries.items())
+
+		for path in sorted(self.entries, key=lambda p: self.entries[p][1]):
+			if data_size <= self.max_size:
+				break
+			data_size -= sizes[path]
+			del self.entries[path]
+
+	# -------------------------------------------------------------------- #
+
+	def save(self):
+		"""
+		Write the cache file (only if something changed)
+		"""
+		if not self.dirty or self.path is None:
+			return
+
+		data = marshal.dumps((CACHE_FORMAT, self.version, self.serial, self.entries))
+		if len(data) > self.max_size:
+			self.evict(len(data))
+			data = marshal.dumps((CACHE_FORMAT, self.version, self.serial, self.entries))
+
+		tmp_path = '%s.%d.tmp' % (self.path, os.getpid())
+		try:
+			cache_dir = os.path.dirname(self.path)
+			if cache_dir and not os.path.isdir(cache_dir):
+				os.makedirs(cache_dir, 0o700)
+
+			fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+			with os.fdopen(fd, 'wb') as f:
+				f.write(data)
+			os.replace(tmp_path, self.path)
+		except OSError:
+			try:
+				os.unlink(tmp_path)
+			except OSError:
+				pass
+			return
+
+		self.dirty = False
@@ -4,26 +4,108 @@
 from __future__ import print_function
 
 import sys
-import subprocess
 import datetime
 import time
 import os
-import getpass
+import heapq
+import array
+import io
+import itertools
+import functools
+import contextlib
 import re
-import setuptools
+import argparse
 
-#import cronls.args as args
-import args
+try:
+	import cronls.args as args
+	import cronls.cache as cache
+except ImportError:
+	# Executed as a script (e.g. "python cronls/cronls.py")
+	import args
+	import cache
 
 
 SYS_USER = 'root[sys]'
 
+# Max number of threads used to read the crontab files
+READ_WORKERS = 16
+
+# Max number of "crontab -l -u" commands running at the same time
+COLLECT_WORKERS = 64
+
+# Version of the parsed rules stored in the parse cache: must be increased
+# every time parsing or CronRule.to_tuple() change
+PARSE_CACHE_VERSION = 4
+
 DAYS_OF_WEEK = {'mon':1,'tue':2,'wed':3,'thu':4,'fri':5,'sat':6,'sun':7}
 DAYS_OF_WEEK_ALIASES = {7:0}
 
 MONTHS_OF_YEAR = {'jan':1,'feb':2,'mar':3,'apr':4,'may':5,'jun':6,'jul':7,'aug':8,'sep':9,'oct':10,'nov':11,'dec':12}
 
-PRINT_FORMAT = "{ts:%%Y-%%m-%%d %%H:%%M} :: {user:%(max_user_length)d} :: {raw}"
+# Variable definitions in crontabs (e.g. "SHELL=/bin/sh")
+VARIABLE_RE = re.compile(r'\s*[A-Z_-]+=', re.IGNORECASE)
+
+# Error of "crontab -l" for users without a crontab (with or without the
+# command name, depending on the cron implementation)
+NO_CRONTAB_RE = re.compile(r'(?:\S*crontab: )?no crontab for ', re.IGNORECASE)
+
+# "run-parts [OPTIONS] DIR" in a system crontab command, also inside a longer
+# command line (e.g. "cd / && run-parts --report /etc/cron.daily")
+RUN_PARTS_RE = re.compile(r'(?:^|[\s;&|(])run-parts\s+(?:-\S+\s+)*([^\s;&|()]+)')
+
+# Names of the files run by run-parts and read by cron from the cron.d
+# directory: others (e.g. "*.dpkg-old" or ".placeholder") are ignored
+VALID_NAME_RE = re.compile(r'[A-Za-z0-9_-]+$')
+
+WEEKDAY_NAMES = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+MONTH_NAMES = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+# Output formats of the executions (see print_executed_crontabs())
+OUTPUT_FORMATS = ('text', 'jsonl', 'csv', 'tsv')
+OUTPUT_TS_FORMATS = {
+	'text':  '%Y-%m-%d %H:%M',
+	'jsonl': '{"ts": "%Y-%m-%dT%H:%M"',
+	'csv':   '%Y-%m-%d %H:%M',
+	'tsv':   '%Y-%m-%d %H:%M',
+}
+TEXT_COLUMNS_FORMAT = " :: {user:%(max_user_length)d} :: {raw}\n"
+TEXT_HOST_COLUMN_FORMAT = " :: {host:%(max_host_length)d}"
+OUTPUT_HEADERS = {
+	'text':  None,
+	'jsonl': None,
+	'csv':   'ts,user,raw,cmd\n',
+	'tsv':   'ts\tuser\traw\tcmd\n',
+}
+# Same, with the host column ("--fleet")
+OUTPUT_HOST_HEADERS = {
+	'text':  None,
+	'jsonl': None,
+	'csv':   'ts,host,user,raw,cmd\n',
+	'tsv':   'ts\thost\tuser\traw\tcmd\n',
+}
+
+# Lines written to the output at once
+OUTPUT_CHUNK_LINES = 4096
+
+# Origin of the timestamps stored as minutes (see Occurrences)
+EPOCH = datetime.datetime(1970, 1, 1)
+ONE_MINUTE = datetime.timedelta(0, 60)
+
+# Shards of the window for each worker process of "--jobs" (more shards than
+# workers balance the load)
+SHARDS_PER_JOB = 4
+
+# How far the next executions of a rule are looked for (about 10 years)
+NEXT_RUNS_HORIZON = datetime.timedelta(3660)
+
+SUMMARY_FORMAT = "{days:22} :: {user:%(max_user_length)d} :: {description} ({runs}) :: {raw}"
+SUMMARY_HOST_FORMAT = "{days:22} :: {host:%(max_host_length)d} :: {user:%(max_user_length)d} :: {description} ({runs}) :: {raw}"
+
+# Max number of arithmetic progressions listed in a summary description
+MAX_SUMMARY_RUNS = 3
+
+COUNT_FORMAT = "{count:8d} :: {user:%(max_user_length)d} :: {raw}"
+COUNT_HOST_FORMAT = "{count:8d} :: {host:%(max_host_length)d} :: {user:%(max_user_length)d} :: {raw}"
 
 # ==================================================================== #
 
@@ -40,16 +122,383 @@ class CronParseError(Exception):
 
 # ==================================================================== #
 
+def to_bitmask(values):
+	"""
+	Convert an iterable of non negative integers in a bitmask (bit "n" set
+	means "n" is in the values)
+	"""
+	mask = 0
+	for v in values:
+		mask |= 1 << v
+	return mask
+
+# -------------------------------------------------------------------- #
+
+def bitmask_values(mask):
+	"""
+	Inverse of :func:`to_bitmask`: return the sorted tuple of the bits set in
+	"mask"
+	"""
+	values = []
+	v = 0
+	while mask:
+		if mask & 1:
+			values.append(v)
+		mask >>= 1
+		v += 1
+	return tuple(values)
+
+# -------------------------------------------------------------------- #
+
+def bit_count(mask):
+	"""
+	Return the number of bits set in "mask"
+	"""
+	return bin(mask).count('1')
+
+# -------------------------------------------------------------------- #
+
+class CronRule(object):
+	"""
+	Compiled crontab rule.
+
+	Each time field is stored as an int bitmask (bit "n" set means that value
+	"n" is admitted), so a rule takes a few dozen bytes and matching a
+	timestamp is a handful of shifts and ANDs.
+
+	Attributes:
+		user (str): Crontab user
+		raw (str): Raw crontab row
+		cmd (str): Command
+		m (int): Minutes bitmask (bits 0-59)
+		h (int): Hours bitmask (bits 0-23)
+		dom (int): Days of month bitmask (bits 1-31)
+		mon (int): Months bitmask (bits 1-12)
+		dow (int): Days of week bitmask (bits 0-6, 0 is sunday)
+		dom_star (bool): Day of month field starts with "*"
+		dow_star (bool): Day of week field starts with "*"
+		host (str): Host of the crontab ("--fleet" only, None otherwise)
+	"""
+
+	__slots__ = ('user', 'raw', 'cmd', 'm', 'h', 'dom', 'mon', 'dow', 'dom_star', 'dow_star', 'host')
+
+	def __init__(self, user, raw, cmd, m, h, dom, mon, dow, dom_star=False, dow_star=False, host=None):
+		self.user = user
+		self.raw = raw
+		self.cmd = cmd
+		self.m = m
+		self.h = h
+		self.dom = dom
+		self.mon = mon
+		self.dow = dow
+		self.dom_star = dom_star
+		self.dow_star = dow_star
+		self.host = host
+
+	def __repr__(self):
+		return '<CronRule %r: %r>' % (self.user, self.raw)
+
+	def runs_per_hour(self):
+		"""
+		Return how many times the rule runs in each hour in which it runs
+		"""
+		return bit_count(self.m)
+
+	def runs_per_day(self):
+		"""
+		Return how many times the rule runs in each day in which it runs
+		"""
+		return bit_count(self.m) * bit_count(self.h)
+
+	def signature(self):
+		"""
+		Return the normalized schedule of the rule: rules with the same
+		signature are executed at the same times, whatever their fields text
+		(e.g. "*" and "*/1", "0 0 * * *" and "@daily").
+		"""
+		return (
+			self.m,
+			self.h,
+			self.dom,
+			self.mon,
+			self.dow,
+			self.dom_star or self.dow_star,
+		)
+
+	def to_tuple(self):
+		"""
+		Return the rule as a tuple of builtin types (user and host excluded), suitable
+		for serialization. See :meth:`from_tuple`.
+		"""
+		return (self.raw, self.cmd, self.m, self.h, self.dom, self.mon, self.dow, self.dom_star, self.dow_star)
+
+	@classmethod
+	def from_tuple(cls, user, t):
+		"""
+		Build a rule from the output of :meth:`to_tuple`
+		"""
+		return cls(user, *t)
+
+	def copy(self, **changes):
+		"""
+		Return a copy of the rule, with the attributes in "changes" replaced
+		"""
+		attrs = dict((a, getattr(self, a)) for a in self.__slots__)
+		attrs.update(changes)
+		return CronRule(**attrs)
+
+	def is_day_ok(self, day):
+		"""
+		Check if the rule is allowed to run in the given day (month excluded).
+
+		Day of month and day of week follow the Vixie cron semantics: if both
+		fields are restricted (i.e. they don't start with "*") they are evaluated
+		in OR, otherwise only the restricted one (if any) is considered
+		(ref: crontab(5), "Note: The day of a command's execution can be specified
+		by two fields").
+
+		Args:
+			day (datetime.date): The day to check
+
+		Returns:
+			bool: True if the rule can run in the given day
+		"""
+
+		# Sunday is 0 in cron and 7 in isoweekday()
+		dom_ok = self.dom >> day.day & 1
+		dow_ok = self.dow >> (day.isoweekday() % 7) & 1
+
+		if self.dom_star or self.dow_star:
+			return bool(dom_ok and dow_ok)
+
+		return bool(dom_ok or dow_ok)
+
+	def matches(self, ts):
+		"""
+		Check if the rule is executed at the given timestamp
+
+		Args:
+			ts (datetime.datetime): The timestamp to check
+
+		Returns:
+			bool: True if the rule is executed at "ts"
+		"""
+		return bool(
+			self.m >> ts.minute & 1 and
+			self.h >> ts.hour & 1 and
+			self.mon >> ts.month & 1 and
+			self.is_day_ok(ts)
+		)
+
+# ==================================================================== #
+
 def print_error(*args, **kwargs):
 	print(*args, file=sys.stderr, **kwargs)
 
 # ==================================================================== #
 
+class NullStats(object):
+	"""
+	Statistics collector that collects nothing, used when "--stats" is not
+	given: each method is a no-op, so disabled instrumentation costs nothing
+	more than a few calls per run.
+	"""
+
+	def __bool__(self):
+		return False
+
+	@contextlib.contextmanager
+	def stage(self, name):
+		yield
+
+	def timed(self, name, iterable, counter=None):
+		return iterable
+
+	def count(self, name, n):
+		pass
+
+	def report(self, out=None):
+		pass
+
+NULL_STATS = NullStats()
+
+# -------------------------------------------------------------------- #
+
+class Stats(NullStats):
+	"""
+	Statistics collector for "--stats": wall time and peak RSS of each stage of
+	a run, plus some counters.
+
+	Stage times are exclusive: the time spent in a :meth:`timed` iterable
+	consumed inside a :meth:`stage` (e.g. executions computed while printing)
+	is accounted only to the iterable stage.
+	"""
+
+	def __init__(self):
+		self.times = {}
+		self.peak_rss = {}
+		self.stages = []
+		self.counters = []
+		self.nested = 0.0
+
+	def __bool__(self):
+		return True
+
+	def add_time(self, name, seconds):
+		if name not in self.times:
+			self.stages.append(name)
+			self.times[name] = 0.0
+		self.times[name] += seconds
+
+		try:
+			import resource
+			# Kilobytes on Linux
+			self.peak_rss[name] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+		except ImportError:
+			self.peak_rss[name] = None
+
+	@contextlib.contextmanager
+	def stage(self, name):
+		nested = self.nested
+		t = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.add_time(name, time.perf_counter() - t - (self.nested - nested))
+
+	def timed(self, name, iterable, counter=None):
+		"""
+		Wrap "iterable", accounting the time spent producing its items to stage
+		"name" (and counting them in "counter", if given)
+		"""
+		seconds = 0.0
+		items = 0
+		it = iter(iterable)
+
+		try:
+			while True:
+				t = time.perf_counter()
+				try:
+					item = next(it)
+				finally:
+					dt = time.perf_counter() - t
+					seconds += dt
+					self.nested += dt
+				items += 1
+				yield item
+		except StopIteration:
+			pass
+		finally:
+			self.add_time(name, seconds)
+			if counter:
+				self.count(counter, items)
+
+	def count(self, name, n):
+		self.counters.append((name, n))
+
+	def report(self, out=None):
+		"""
+		Print the collected statistics (default on stderr)
+		"""
+		if out is None:
+			out = sys.stderr
+
+		print('# cronls stats', file=out)
+		print('%-24s %12s %16s' % ('stage', 'time [s]', 'peak RSS [MB]'), file=out)
+		for name in self.stages:
+			rss = self.peak_rss[name]
+			print('%-24s %12.4f %16s' % (name, self.times[name], '%.1f' % rss if rss is not None else '-'), file=out)
+		for name, n in self.counters:
+			print('%-24s %12d' % (name, n), file=out)
+
+# ==================================================================== #
+
 def read_file(file):
-	f = open(file,'r')
-	rows = f.readlines()
-	f.close()
-	return rows
+	with open(file, 'r') as f:
+		return f.readlines()
+
+# -------------------------------------------------------------------- #
+
+def read_files(files):
+	"""
+	Read concurrently a list of files, through a bounded thread pool.
+
+	Args:
+		files (list): List of file paths
+
+	Returns:
+		list: List of rows lists (as returned by :func:`read_file`), in the same
+			order of "files"
+
+	Raises:
+		IOError: If a file can't be read
+	"""
+	if len(files) <= 1:
+		return [read_file(f) for f in files]
+
+	import concurrent.futures
+
+	with concurrent.futures.ThreadPoolExecutor(max_workers=min(READ_WORKERS, len(files))) as executor:
+		return list(executor.map(read_file, files))
+
+# -------------------------------------------------------------------- #
+
+def list_files(path, recursive=False):
+	"""
+	List the regular files contained in a directory, without spawning any
+	external process.
+
+	Args:
+		path (str): Directory to scan
+		recursive (bool): Scan also the subdirectories
+
+	Returns:
+		list: Sorted list of file paths
+	"""
+	files = []
+	dirs = [path]
+
+	while dirs:
+		for entry in os.scandir(dirs.pop()):
+			if entry.is_file():
+				files.append(entry.path)
+			elif recursive and entry.is_dir(follow_symlinks=False):
+				dirs.append(entry.path)
+
+	return sorted(files)
+
+# -------------------------------------------------------------------- #
+
+def list_cron_d_files(cron_d_dir, list_dir=list_files):
+	"""
+	List the system crontabs of a cron.d directory, skipping the files that
+	cron ignores (see :data:`VALID_NAME_RE`). A missing directory has no files.
+
+	Args:
+		cron_d_dir (str): Directory to scan (None for no directory)
+		list_dir (callable): Function listing the files of a directory (see
+			:func:`list_files`)
+
+	Returns:
+		list: Dictionaries in the same form of :func:`get_crontab_files` ones
+			(without "rows")
+	"""
+	if not cron_d_dir:
+		return []
+
+	try:
+		files = list_dir(cron_d_dir)
+	except OSError:
+		return []
+
+	c_files = []
+	for file in files:
+		name = os.path.basename(file)
+		if VALID_NAME_RE.match(name):
+			source = 'cron.d/' + name
+			c_files.append({'user': source, 'path': file, 'system': source})
+
+	return c_files
 
 # -------------------------------------------------------------------- #
 
@@ -62,24 +511,41 @@ def parsa_data(data):
 
 # ==================================================================== #
 
-def get_crontab_files(input_args):
+def get_crontab_files(input_args, parse_cache=None):
 	"""
 
+	Read the crontabs to be analyzed: the current user one (using "crontab -l"),
+	or, with "--all", every file in the crontabs directory plus the system cron.
+
 	Args:
-		input_args ():
+		input_args (argparse.Namespace): Command line arguments
+		parse_cache (cache.ParseCache): If given, files whose parsed version is
+			in the cache are not read at all
 
 	Returns:
 		List of dictionaries containing user and file contents for each crontab.
 		Dictionaries are in the following form:
 		{
 			'user': '<user>',
-			'cron': [
+			'rows': [
 				'<cron line 1>',
 				'<cron line 2>',
 				...
 			]
 		}
 
+		With "--all" (and "--collect spool"), dictionaries also contain the
+		file path and, when
+		"parse_cache" is given, the cache data:
+		{
+			'path': '<file path>',
+			'system': '<source>',   # Only for system crontabs (see
+			                        # analyze_cron_file())
+			'key': <file key>,      # See cache.file_key()
+			'cached': <value>,      # Value stored in the cache (if any, and in
+			                        # this case 'rows' is missing)
+		}
+
 	Raises:
 		NotImplementedError: If "crontab" command seems not installed on the system
 		OSError: Any other error with "crontab" command
@@ -90,45 +556,180 @@ def get_crontab_files(input_args):
 
 	if input_args.all:
 
-		# Reads all crontabs from crontabs path
-		status, output = subprocess.getstatusoutput('find %s -mindepth 1 -type f' % input_args.cron_dir)
-
-		for file in output.split('/n'):
-			with open(file, 'r') as f:
+		if getattr(input_args, 'collect', 'spool') == 'crontab':
+			# Spool not readable: asks "crontab -l -u" for every user
+			outlist += collect_user_crontabs(
+				list_users(), input_args.crontab_command, input_args.collect_workers)
+		else:
+			# Reads all crontabs from crontabs path (e.g. "/var/spool/cron/<user>" or
+			# "/var/spool/cron/crontabs/<user>")
+			for file in list_files(input_args.cron_dir, recursive=True):
 				outlist += [{
 					'user': os.path.basename(file),
-					'rows': f.readlines()
+					'path': file
 				}]
 
-		# Reads the system cron
+		# Reads the system cron and its drop-ins (e.g. "/etc/cron.d/<name>")
 		if input_args.system_cron:
-			with open(input_args.sys_cron_file, 'r') as f:
-				outlist += [{
-					'user': SYS_USER,
-					'rows': f.readlines()
-				}]
+			outlist += [{
+				'user': SYS_USER,
+				'path': input_args.sys_cron_file,
+				'system': 'sys'
+			}]
+			outlist += list_cron_d_files(getattr(input_args, 'cron_d_dir', None))
+
+		# Only one stat per file if the parsed version is already in cache
+		if parse_cache is not None:
+			for c_file in outlist:
+				if 'path' not in c_file:
+					continue
+				c_file['key'] = cache.file_key(c_file['path'])
+				cached = parse_cache.get(c_file['path'], c_file['key'])
+				if cached is not None:
+					c_file['cached'] = cached
+
+		to_read = [c_file for c_file in outlist if 'cached' not in c_file and 'rows' not in c_file]
+
+		for c_file, rows in zip(to_read, read_files([c_file['path'] for c_file in to_read])):
+			c_file['rows'] = rows
 
 	else:
+		import subprocess
+		import getpass
+
 		# Reads only the user cron
-		status, output = subprocess.getstatusoutput('crontab -l')
+		try:
+			process = subprocess.run(
+				['crontab', '-l'],
+				stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+				universal_newlines=True)
+		except FileNotFoundError:
+			raise NotImplementedError('Seems that command "crontab" is not installed on the system')
+
+		rows = check_crontab_output('crontab -l', process.returncode, process.stdout, process.stderr)
 
 		# If crontab is not set for the user, return an empty list
-		if status == 1 and output.lower().startswith('crontab: no crontab for'):
+		if rows is None:
 			return []
 
-		if status > 1 and output.find('crontab: not found') >= 0:
-			raise NotImplementedError('Seems that command "crontab" is not installed on the system')
-
-		if status > 1:
-			raise OSError('"crontab -l" ended with error code "{status}" ({output})'.format(**vars()))
-
 		outlist += [{
 			'user': getpass.getuser(),
-			'rows': output.split('\n')
+			'rows': rows
 		}]
 
 	return outlist
 
+# -------------------------------------------------------------------- #
+
+def check_crontab_output(command, status, output, errors=''):
+	"""
+	Check the result of a "crontab -l" command.
+
+	Args:
+		command (str): The executed command (for error messages)
+		status (int): Exit status
+		output (str): Standard output
+		errors (str): Standard error
+
+	Returns:
+		list: The crontab rows, or None if the user has no crontab
+
+	Raises:
+		NotImplementedError: If "crontab" command seems not installed on the system
+		OSError: Any other error with "crontab" command
+	"""
+	errors = errors.strip()
+
+	if status == 0:
+		# Without the trailing newline
+		if output.endswith('\n'):
+			output = output[:-1]
+		return output.split('\n')
+
+	# "no crontab for USER" (cronie, Vixie cron) or "crontab: no crontab for
+	# USER" (BSD)
+	if NO_CRONTAB_RE.match(errors):
+		return None
+
+	if errors.find('crontab: not found') >= 0:
+		raise NotImplementedError('Seems that command "crontab" is not installed on the system')
+
+	raise OSError('"{command}" ended with error code "{status}" ({errors})'.format(**vars()))
+
+# -------------------------------------------------------------------- #
+
+def list_users():
+	"""
+	Return the names of the users in the passwd database, sorted
+	"""
+	import pwd
+	return sorted(set(p.pw_name for p in pwd.getpwall()))
+
+# -------------------------------------------------------------------- #
+
+def collect_user_crontabs(users, command='crontab', workers=COLLECT_WORKERS):
+	"""
+	Read the crontabs of "users" running "<command> -l -u USER" for each one,
+	with at most "workers" commands running at the same time (through asyncio
+	subprocesses).
+
+	Errors of single users are printed on stderr and the user is skipped.
+
+	Args:
+		users (list): User names
+		command (str): "crontab" command, with optional leading arguments (e.g.
+			"sudo -n crontab")
+		workers (int): Max number of concurrent commands
+
+	Returns:
+		list: List of dictionaries in the same form of
+			:func:`get_crontab_files`, for the users having a crontab, in the
+			"users" order
+
+	Raises:
+		NotImplementedError: If "crontab" command seems not installed on the system
+	"""
+	import asyncio
+	import shlex
+
+	argv = shlex.split(command)
+
+	async def collect(semaphore, user):
+		async with semaphore:
+			try:
+				process = await asyncio.create_subprocess_exec(
+					*(argv + ['-l', '-u', user]),
+					stdin=asyncio.subprocess.DEVNULL,
+					stdout=asyncio.subprocess.PIPE,
+					stderr=asyncio.subprocess.PIPE)
+			except FileNotFoundError:
+				raise NotImplementedError('Seems that command "%s" is not installed on the system' % argv[0])
+
+			output, errors = await process.communicate()
+
+		return process.returncode, output.decode('utf-8', 'replace'), errors.decode('utf-8', 'replace')
+
+	async def collect_all():
+		semaphore = asyncio.Semaphore(max(1, workers))
+		return await asyncio.gather(*[collect(semaphore, user) for user in users])
+
+	outlist = []
+
+	for user, (status, output, errors) in zip(users, asyncio.run(collect_all())):
+		try:
+			rows = check_crontab_output('%s -l -u %s' % (command, user), status, output, errors)
+		except OSError as e:
+			print_error(e)
+			continue
+
+		if rows is not None:
+			outlist += [{
+				'user': user,
+				'rows': rows
+			}]
+
+	return outlist
+
 
 
 # ==================================================================== #
@@ -184,176 +785,230 @@ def parse_and_remove_step(field):
 
 # -------------------------------------------------------------------- #
 
-def expand_rule(val, field_type='', values_range=0, mapping={}, aliases={}):
+def parse_value(val, e, mapping):
 	"""
-	Expand a crontab field
-	Args:
-		val (str): field value to expand.
-
-		field_type (str): field type between "m", "h", "dom", "mon", "dow".
-
-		values_range (int): max possible value for this field. Only useful when there is a "*/x" rule.
-
-		mapping (dict): dict that optionally map values that need to be converted in other values.
-			The keys of the dict are the literal starting values (i.e. strings), the values are the final
-			values (i.e. any data type).
-
-			E.g: {'A': 1, 'B': 'b', ...}
+	Convert a single field value (a number or a name, e.g. "5" or "mon") to int
+	"""
+	e = mapping.get(e.lower(), e)
+	try:
+		return int(e)
+	except ValueError:
+		raise CronParseError('%(val)r: %(e)r not numeric' % vars())
 
-		aliases (dict): after all processing, this dict map final values that should be converted in
-			other values. This is only useful by far for converting 7 in 0 in days of week.
+# -------------------------------------------------------------------- #
 
-			E.g: {7: 0, 123: 1, ...}
+def field_bitmask(val, values_range, mapping={}, aliases={}, min_value=0):
+	"""
+	Parse a crontab field in a single pass, directly into a bitmask (see
+	:func:`to_bitmask`). See :func:`expand_rule` for the arguments meaning.
 
 	Returns:
-		set: Set of expanded values
+		int: Bitmask of the expanded values
 
 	Raises:
 		CronParseError: Raises CronParseError if some known problem happens
-
-	Todo:
-		- Handling a range of months in form "jan-apr" and a range of days of week in form "tue-fri"
 	"""
 
-	# Input parameters check
-	assert values_range != 0
+	# Values allowed before the aliases substitution (e.g. 7 for sunday)
+	max_value = max([values_range] + list(aliases))
 
-	# Expanding comma separated values (e.g. "1,3,5")
-	l = val.split(',')
+	mask = 0
 
-	# Expanding ranges and wildcards (doesn't touch other values)
-	for e in list(l):
-		e_orig = e
+	# Comma separated values (e.g. "1,3,5")
+	for e in val.split(','):
 
 		if not e:
 			raise CronParseError('%(val)r: Missed value before or after ","' % vars())
 
-		# Expanding ranges (e.g. "10-20")
-		if '-' in e:
+		# Step parsing and removal (e.g. "10-20/2" becomes "10-20" step=2)
+		e, step = parse_and_remove_step(e)
+
+		if step < 1:
+			raise CronParseError('%(val)r: step must be greater than 0' % vars())
+
+		# Wildcards (e.g. "*")
+		if e == '*':
+			range_from, range_to = min_value, values_range
+
+		# Ranges (e.g. "10-20" or "mon-fri")
+		elif '-' in e:
 			if e.count('-') > 1:
 				raise CronParseError('%(val)r: more than one "-" in the same field' % vars())
 
-			# Step parsing and removal (e.g. "10-20/2" becomes "10-20" step=2)
-			e, step = parse_and_remove_step(e)
+			range_from, range_to = e.split('-')
+			range_from = parse_value(val, range_from, mapping)
+			range_to = parse_value(val, range_to, mapping)
 
-			# Indentify and check the range
-			range_from,range_to = e.split('-')
+			# Wrapping ranges starting with an alias (e.g. "sun-tue", sunday
+			# being 7)
+			if range_from > range_to:
+				range_from = aliases.get(range_from, range_from)
 
-			if range_from in mapping:
-				range_from = mapping[range_from]
-			if range_to in mapping:
-				range_to = mapping[range_to]
+			if range_from > range_to:
+				raise CronParseError('%(val)r: range start greater than range end' % vars())
 
-			try:
-				range_from = int(range_from)
-				range_to = int(range_to)
-			except ValueError:
-				raise CronParseError('%(val)r: %(range_from)r or %(range_to)r not numeric' % vars())
+		# Single values (e.g. "10" or "mon")
+		elif step == 1:
+			range_from = range_to = parse_value(val, e, mapping)
+
+		else:
+			raise CronParseError('%(val)r: %(e)r should be "*" or a range to have a step' % vars())
+
+		if not (min_value <= range_from <= max_value and min_value <= range_to <= max_value):
+			raise CronParseError('%(val)r: values must be between %(min_value)d and %(max_value)d' % vars())
+
+		for v in range(range_from, range_to + 1, step):
+			mask |= 1 << aliases.get(v, v)
+
+	return mask
+
+# -------------------------------------------------------------------- #
+
+# Parsing parameters of each crontab field: (values_range, mapping, aliases,
+# min_value)
+FIELDS = {
+	'm':   (59, {}, {}, 0),
+	'h':   (23, {}, {}, 0),
+	'dom': (31, {}, {}, 1),
+	'mon': (12, MONTHS_OF_YEAR, {}, 1),
+	'dow': (6,  DAYS_OF_WEEK, DAYS_OF_WEEK_ALIASES, 0),
+}
+
+@functools.lru_cache(maxsize=4096)
+def compile_field(val, field_type):
+	"""
+	Parse a crontab field of the given type in a bitmask. Results are memoized:
+	the same few values (e.g. "*", "0", "*/5") appear in most rows.
+
+	Args:
+		val (str): field value
+		field_type (str): field type between "m", "h", "dom", "mon", "dow"
+
+	Returns:
+		int: Bitmask of the expanded values
+
+	Raises:
+		CronParseError: Raises CronParseError if some known problem happens
+	"""
+	values_range, mapping, aliases, min_value = FIELDS[field_type]
+	return field_bitmask(val, values_range, mapping, aliases, min_value)
+
+# -------------------------------------------------------------------- #
 
-			# Remove from list the old item and extend the same list with the computed range
-			l.remove( e_orig )
-			l.extend( range(range_from, range_to+1, step) )
+def expand_rule(val, field_type='', values_range=0, mapping={}, aliases={}, min_value=0):
+	"""
+	Expand a crontab field
+	Args:
+		val (str): field value to expand.
 
-		# Expanding wildcards (e.g. "*")
-		if e.startswith('*'):
+		field_type (str): field type between "m", "h", "dom", "mon", "dow".
 
-			# Step parsing and removal (e.g. "*/2" becomes "*" step=2)
-			e, step = parse_and_remove_step(e)
+		values_range (int): max possible value for this field. Only useful when there is a "*/x" rule.
 
-			if e != '*':
-				raise CronParseError('%(val)r: %(e)r should be only "*"' % vars())
+		mapping (dict): dict that optionally map values that need to be converted in other values.
+			The keys of the dict are the literal starting values (i.e. lowercase strings), the values
+			are the final values (i.e. ints).
 
-			# Remove from list the old item and extend the same list with the computed range
-			l.remove(e_orig)
-			l.extend(range(0, values_range + 1, step))
+			E.g: {'mon': 1, 'tue': 2, ...}
 
-	# Substitutions
-	new_l = []
+		aliases (dict): after all processing, this dict map final values that should be converted in
+			other values. This is only useful by far for converting 7 in 0 in days of week.
 
-	for e in l:
-		if e in mapping:
-			e = mapping[e]
+			E.g: {7: 0, 123: 1, ...}
 
-		e = int(e)
+		min_value (int): min possible value for this field (e.g. 1 for the days of month).
 
-		if e in aliases:
-			e = aliases[e]
+	Returns:
+		set: Set of expanded values
 
-		new_l.append( int(e) )
+	Raises:
+		CronParseError: Raises CronParseError if some known problem happens
+	"""
 
-	# Returns a set in order to remove dups and make values lookups faster
-	return set(new_l)
+	# Input parameters check
+	assert values_range != 0
 
+	return set(bitmask_values(field_bitmask(val, values_range, mapping, aliases, min_value)))
 
 # -------------------------------------------------------------------- #
 
-def analyze_cron_file(user, rows) -> list:
+def analyze_cron_file(user, rows, errors=None, system=None) -> list:
 	"""
 	Analyze crontab rows and return the parsed result
 
 	Args:
 		user (str): crontab user
 		rows (list): list of crontab rows (strings)
+		errors (list): if given, the messages about the ignored rows are appended
+			here instead of being printed on stderr
+		system (str): if given, rows are in the system crontab format, with a
+			user column between the time fields and the command, and the user
+			of each rule is "<user column>[<system>]" (e.g. "root[sys]")
 
 	Returns:
-		list: List of dictionaries in the form:
-			{
-				'user': '...',              # Crontab user
-				'raw': '...',               # Raw crontab row
-				'm': [0,1, ..., 59],        # Minutes
-				'h': [0,1, ..., 23],        # Hours
-				'dom': [0, 1, ..., 31],     # Days of Month
-				'mon': [0, 1, ..., 12],     # Months
-				'dow': [0, 1, ..., 6],      # Days of week
-				'cmd': '...'                # Command
-			}
+		list: List of :class:`CronRule` objects
 
 	"""
 
-	# Remove trailing \n
-	rows = [r.strip() for r in rows]
+	c_list = []
+	for row in rows:
+
+		# Remove trailing \n
+		row = row.strip()
 
-	# Filter empty lines
-	rows = [r for r in rows if r]
+		# Filter empty lines and comment lines
+		if not row or row[0] == '#':
+			continue
 
-	# Filter comment lines
-	rows = [r for r in rows if r.find('#') != 0]
+		# Filter variable definitions (e.g. "SHELL=...")
+		if VARIABLE_RE.match(row):
+			continue
 
-	# Filter variable definitions (e.g. "SHELL=...")
-	rows = [r for r in rows if not re.match(r'\s*[A-Z_-]+=', r, re.IGNORECASE)]
-	
-	c_list = []
-	for row in rows:
 		try:
 			# Apply non standard substitutions
-			row = apply_substitutions(row)
+			if row[0] == '@':
+				row = apply_substitutions(row)
 
-			c_fields = row.split(None, 5)
+			if system is None:
+				c_fields = row.split(None, 5)
+				rule_user = user
+			else:
+				c_fields = row.split(None, 6)
+				rule_user = '%s[%s]' % (c_fields[5], system)
+				del c_fields[5]
 
-			d = {
-				'user': user,
+			rule = CronRule(
+				user=rule_user,
 
 				# Whole crontab row
-				'raw': row,
+				raw=row,
+
+				# Complete command
+				cmd=c_fields[5],
 
 				# Minute
-				'm':   expand_rule(c_fields[0], 'm',   values_range=59, mapping={}, aliases={}),
+				m=compile_field(c_fields[0], 'm'),
 				# Hour
-				'h':   expand_rule(c_fields[1], 'h',   values_range=23, mapping={}, aliases={}),
+				h=compile_field(c_fields[1], 'h'),
 				# Day of Month
-				'dom': expand_rule(c_fields[2], 'dom', values_range=31, mapping={}, aliases={}),
+				dom=compile_field(c_fields[2], 'dom'),
 				# Month
-				'mon': expand_rule(c_fields[3], 'mon', values_range=12, mapping=MONTHS_OF_YEAR, aliases={}),
+				mon=compile_field(c_fields[3], 'mon'),
 				# Day of Week
-				'dow': expand_rule(c_fields[4], 'dow', values_range=6,  mapping=DAYS_OF_WEEK, aliases=DAYS_OF_WEEK_ALIASES),
+				dow=compile_field(c_fields[4], 'dow'),
 
-				# Complete command
-				'cmd': c_fields[5],
-			}
-			c_list += [ d ]
+				# Unrestricted day fields (see :meth:`CronRule.is_day_ok`)
+				dom_star=c_fields[2].startswith('*'),
+				dow_star=c_fields[4].startswith('*'),
+			)
+			c_list += [ rule ]
 
 		except Exception as e:
-			print_error('User %(user)r: Ignored row %(row)r (%%s: %%s)' % vars() % (e.__class__.__name__, e))
+			message = 'User %(user)r: Ignored row %(row)r (%%s: %%s)' % vars() % (e.__class__.__name__, e)
+			if errors is None:
+				print_error(message)
+			else:
+				errors.append(message)
 
 	return c_list
 
@@ -403,135 +1058,1686 @@ def calcola_crontab(crontab_l,data_iniz,data_fin):
 # -------------------------------------------------------------------- #
 
 def is_ok_new(rule, field, test_value):
-	return test_value in rule[field]
+	return bool(getattr(rule, field) >> test_value & 1)
 
 # -------------------------------------------------------------------- #
 
-def calc_executed_crontabs(input_args, crontab_l):
-	ret_list = []
+def is_day_ok(rule, day):
+	"""
+	Check if a rule is allowed to run in the given day (see :meth:`CronRule.is_day_ok`)
+	"""
+	return rule.is_day_ok(day)
+
+# -------------------------------------------------------------------- #
 
-	one_minute = datetime.timedelta(0, 60)
-	current_ts = input_args.start_time #+ datetime.timedelta(0, 0)
+def month_length(year, month):
+	"""
+	Return the number of days of a month
+	"""
+	if month == 12:
+		return 31
+	return (datetime.date(year, month + 1, 1) - datetime.date(year, month, 1)).days
 
-	while current_ts <= input_args.stop_time:
+# -------------------------------------------------------------------- #
 
-		for rule in crontab_l:
-			satisfied = (
-				is_ok_new(rule, 'm', current_ts.minute) and
-				is_ok_new(rule, 'h', current_ts.hour) and
-				is_ok_new(rule, 'mon', current_ts.month) and
+@functools.lru_cache(maxsize=None)
+def week_days_mask(dow, first_dow, days):
+	"""
+	Return the bitmask (bits 1-31) of the days of a month whose day of week is
+	in the "dow" bitmask.
 
-				# Day of month and day of week are evalued in OR (ref:
-				( is_ok_new(rule, 'dom', current_ts.day) or
-				  is_ok_new(rule, 'dow', current_ts.isoweekday()) )
-			)
+	Args:
+		dow (int): Days of week bitmask (bits 0-6, 0 is sunday)
+		first_dow (int): Day of week of the first day of the month
+		days (int): Number of days of the month
 
-			if satisfied:
-				ret_list += [{
-					'ts': current_ts,
-					'rule': rule
-				}]
+	Returns:
+		int: Days of month bitmask
+	"""
+	mask = 0
+	for day in range(1, days + 1):
+		if dow >> ((first_dow + day - 1) % 7) & 1:
+			mask |= 1 << day
+	return mask
 
-		current_ts = current_ts + one_minute
+# -------------------------------------------------------------------- #
 
-	return ret_list
+def month_day_mask(rule, year, month):
+	"""
+	Return the bitmask (bits 1-31) of the days of a month in which the rule is
+	allowed to run (month excluded, see :meth:`CronRule.is_day_ok`)
+	"""
+	days = month_length(year, month)
+	dom_days = rule.dom & ((1 << days + 1) - 2)
+	dow_days = week_days_mask(rule.dow, datetime.date(year, month, 1).isoweekday() % 7, days)
 
-# ==================================================================== #
+	if rule.dom_star or rule.dow_star:
+		return dom_days & dow_days
 
-def too_much_frequent(input_args, rule):
-	if len(rule['m']) > input_args.max_hourly_repetitions:
-		return True
-	else:
-		return False
+	return dom_days | dow_days
 
 # -------------------------------------------------------------------- #
 
-def print_executed_crontabs(input_args, exec_l):
+def iter_fire_days(rule, start_day, stop_day):
+	"""
+	Generate, in chronological order, the days between "start_day" and
+	"stop_day" (both included) in which the rule is allowed to run (i.e. month,
+	day of month and day of week match).
 
-	if not exec_l:
-		return
+	Days are never tested one by one: months not in rule.mon are skipped as a
+	whole, and the matching days of the other months are read from their days
+	bitmask (see :func:`month_day_mask`).
 
-	max_user_length = max([len(e['rule']['user']) for e in exec_l])
-	tmp_format = PRINT_FORMAT % vars()
+	Args:
+		rule (CronRule): Rule as returned by :func:`analyze_cron_file`
+		start_day (datetime.date): First day
+		stop_day (datetime.date): Last day
 
-	for e in exec_l:
-		if not too_much_frequent(input_args, e['rule']):
-			print(tmp_format.format( ts=e['ts'], user=e['rule']['user'], raw=e['rule']['raw']))
+	Yields:
+		datetime.date: Matching days
+	"""
+	year, month = start_day.year, start_day.month
+	stop_month = (stop_day.year, stop_day.month)
 
-# ==================================================================== #
+	while (year, month) <= stop_month:
+		if rule.mon >> month & 1:
+			mask = month_day_mask(rule, year, month)
 
-def extend_sys_crontab(sys_l):
-	sys_l_ext = []
-	for regola in sys_l :
-		dir = regola['cmd'].split('root run-parts ')[1]
-		status,output = subprocess.getstatusoutput('find %s -mindepth 1' % dir)
-		scripts = output.split('\n')
-		for script in [ r for r in scripts if r ] :
-			new_r = dict(regola)
-			new_r['cmd'] = script
-			new_r['raw'] += ' (%s)' % script
+			if (year, month) == (start_day.year, start_day.month):
+				mask &= ~((1 << start_day.day) - 1)
+			if (year, month) == stop_month:
+				mask &= (1 << stop_day.day + 1) - 1
+
+			for day in bitmask_values(mask):
+				yield datetime.date(year, month, day)
+
+		if month == 12:
+			year, month = year + 1, 1
+		else:
+			month += 1
+
+# -------------------------------------------------------------------- #
+
+def iter_fire_times(rule, start_time, stop_time):
+	"""
+	Generate, in chronological order, all the timestamps in which a rule is
+	executed between "start_time" and "stop_time" (both included).
+
+	Instead of testing the rule minute by minute, the next matching timestamp
+	is computed directly from the expanded fields: whole months not in
+	rule.mon and whole days failing the dom/dow check are skipped, and only
+	the hours and minutes of the rule are generated for the matching days.
+	The cost is therefore proportional to the number of occurrences (plus one
+	days bitmask per month of the window), not to the number of minutes.
+
+	Args:
+		rule (CronRule): Rule as returned by :func:`analyze_cron_file`
+		start_time (datetime.datetime): Window start
+		stop_time (datetime.datetime): Window stop
+
+	Yields:
+		datetime.datetime: Execution timestamps (seconds and microseconds are
+			always 0)
+	"""
+
+	minutes = bitmask_values(rule.m)
+	hours = bitmask_values(rule.h)
+
+	if not minutes or not hours:
+		return
+
+	start_time = start_time.replace(second=0, microsecond=0)
+
+	for day in iter_fire_days(rule, start_time.date(), stop_time.date()):
+		for hour in hours:
+			for minute in minutes:
+				ts = datetime.datetime(day.year, day.month, day.day, hour, minute)
+				if ts > stop_time:
+					return
+				if ts >= start_time:
+					yield ts
+
+# -------------------------------------------------------------------- #
+
+def next_fire_time(rule, from_time, stop_time):
+	"""
+	Return the first timestamp, starting from "from_time" (included), in which
+	the rule is executed.
+
+	Args:
+		rule (CronRule): Rule as returned by :func:`analyze_cron_file`
+		from_time (datetime.datetime): Search start
+		stop_time (datetime.datetime): Search limit
+
+	Returns:
+		datetime.datetime: The next execution timestamp or None if the rule is
+			not executed up to "stop_time"
+	"""
+	return next(iter_fire_times(rule, from_time, stop_time), None)
+
+# -------------------------------------------------------------------- #
+
+def iter_executed_crontabs(input_args, crontab_l):
+	"""
+	Generate all the rules executions in the [start_time, stop_time] window, in
+	chronological order, as soon as they are found.
+
+	Timestamps are computed once per distinct schedule (see
+	:func:`group_by_schedule`) and fanned out to the member rules. The
+	per schedule streams of :func:`iter_fire_times` are merged through a heap,
+	so only one pending timestamp per schedule is kept in memory, whatever the
+	window length.
+
+	Args:
+		input_args (argparse.Namespace): Command line arguments
+		crontab_l (list): Rules as returned by :func:`process_crontab`
+
+	Yields:
+		tuple: (ts, rule) pairs, where "ts" is a datetime.datetime and "rule" a
+			:class:`CronRule`. Rules executed in the same minute keep the
+			"crontab_l" order.
+	"""
+
+	for ts, members in iter_fired_groups(input_args, crontab_l):
+		for _, rule in members:
+			yield ts, rule
+
+# -------------------------------------------------------------------- #
+
+def iter_fired_groups(input_args, crontab_l):
+	"""
+	Same as :func:`iter_executed_crontabs`, but the executions are grouped by
+	minute.
+
+	Yields:
+		tuple: (ts, members) pairs, where "members" is the list of the (index,
+			rule) pairs of the rules executed at "ts", sorted by index
+	"""
+
+	def schedule_stream(group):
+		first_index, rule = group[0]
+		for ts in iter_fire_times(rule, input_args.start_time, input_args.stop_time):
+			yield ts, first_index, group
+
+	streams = [schedule_stream(group) for group in group_by_schedule(crontab_l)]
+
+	for ts, fired in itertools.groupby(heapq.merge(*streams), key=lambda e: e[0]):
+		fired = list(fired)
+
+		if len(fired) == 1:
+			yield ts, fired[0][2]
+		else:
+			yield ts, sorted(itertools.chain.from_iterable(group for _, _, group in fired))
+
+# -------------------------------------------------------------------- #
+
+def group_by_schedule(crontab_l):
+	"""
+	Group the rules with the same schedule (see :meth:`CronRule.signature`), so
+	that each distinct schedule is evaluated only once.
+
+	Args:
+		crontab_l (list): Rules as returned by :func:`process_crontab`
+
+	Returns:
+		list: One list of (index, rule) pairs per distinct schedule, where
+			"index" is the rule position in "crontab_l". Groups are sorted by
+			their first index.
+	"""
+	groups = {}
+	for index, rule in enumerate(crontab_l):
+		groups.setdefault(rule.signature(), []).append((index, rule))
+
+	# Dicts don't keep insertion order on all supported versions
+	return sorted(groups.values(), key=lambda group: group[0][0])
+
+# -------------------------------------------------------------------- #
+
+class Occurrences(object):
+	"""
+	Compact container of rules executions: each execution takes 12 bytes, the
+	timestamp stored as minutes since EPOCH in an array('l') and the rule as an
+	index of "rules" in an array('I'). Datetime objects are built only while
+	iterating, once per distinct minute.
+
+	It behaves as a sequence of (ts, rule) pairs: len(), iteration, indexing and
+	slicing (slices are Occurrences sharing the same rules).
+
+	Args:
+		rules (list): List of :class:`CronRule` objects
+		minutes (array.array): Timestamps, as minutes since EPOCH
+		rule_ids (array.array): Rules, as indexes of "rules"
+	"""
+
+	def __init__(self, rules, minutes=None, rule_ids=None):
+		self.rules = rules
+		self.minutes = minutes if minutes is not None else array.array('l')
+		self.rule_ids = rule_ids if rule_ids is not None else array.array('I')
+
+	def __len__(self):
+		return len(self.minutes)
+
+	def __iter__(self):
+		rules = self.rules
+		last_minute = None
+		ts = None
+
+		for minute, rule_id in zip(self.minutes, self.rule_ids):
+			if minute != last_minute:
+				last_minute = minute
+				ts = minute_to_datetime(minute)
+			yield ts, rules[rule_id]
+
+	def __getitem__(self, i):
+		if isinstance(i, slice):
+			return Occurrences(self.rules, self.minutes[i], self.rule_ids[i])
+		return minute_to_datetime(self.minutes[i]), self.rules[self.rule_ids[i]]
+
+	def append(self, ts, rule_id):
+		"""
+		Add the execution at "ts" (datetime.datetime) of rules[rule_id]
+		"""
+		self.minutes.append(datetime_to_minute(ts))
+		self.rule_ids.append(rule_id)
+
+	def sort(self):
+		"""
+		Sort the executions by timestamp and then by rule index (in place)
+		"""
+		# A single int key per execution sorts much faster than tuples
+		factor = len(self.rules) or 1
+		keys = sorted([minute * factor + rule_id for minute, rule_id in zip(self.minutes, self.rule_ids)])
+		self.minutes = array.array('l', [key // factor for key in keys])
+		self.rule_ids = array.array('I', [key % factor for key in keys])
+
+	def filter_user(self, user):
+		"""
+		Return the executions of the rules of "user"
+		"""
+		selected = set(i for i, rule in enumerate(self.rules) if rule.user == user)
+		kept = [j for j, rule_id in enumerate(self.rule_ids) if rule_id in selected]
+		return Occurrences(
+			self.rules,
+			array.array('l', [self.minutes[j] for j in kept]),
+			array.array('I', [self.rule_ids[j] for j in kept]))
+
+# -------------------------------------------------------------------- #
+
+def datetime_to_minute(ts):
+	"""
+	Convert a datetime to minutes since EPOCH (seconds are ignored)
+	"""
+	return (ts - EPOCH) // ONE_MINUTE
+
+def minute_to_datetime(minute):
+	"""
+	Inverse of :func:`datetime_to_minute`
+	"""
+	return EPOCH + datetime.timedelta(0, minute * 60)
+
+# -------------------------------------------------------------------- #
+
+def calc_executed_crontabs(input_args, crontab_l):
+	"""
+	Compute all the rules executions in the [start_time, stop_time] window.
+
+	Prefer :func:`iter_executed_crontabs` when the executions don't need to be
+	kept all together in memory.
+
+	Args:
+		input_args (argparse.Namespace): Command line arguments
+		crontab_l (list): Rules as returned by :func:`process_crontab`
+
+	Returns:
+		Occurrences: The executions, sorted by timestamp (see
+			:func:`iter_executed_crontabs`)
+	"""
+	occurrences = Occurrences(crontab_l)
+	minutes = occurrences.minutes
+	rule_ids = occurrences.rule_ids
+
+	for ts, members in iter_fired_groups(input_args, crontab_l):
+		minutes.extend(array.array('l', [datetime_to_minute(ts)]) * len(members))
+		rule_ids.extend(array.array('I', [index for index, rule in members]))
+
+	return occurrences
+
+# -------------------------------------------------------------------- #
+
+def split_window(start_time, stop_time, shards):
+	"""
+	Split the [start_time, stop_time] window in at most "shards" consecutive
+	windows of whole days (the first and the last one excepted).
+
+	Args:
+		start_time (datetime.datetime): Window start
+		stop_time (datetime.datetime): Window stop
+		shards (int): Max number of windows
+
+	Returns:
+		list: List of (start_time, stop_time) pairs, in chronological order.
+			Seconds are dropped, and each stop is the minute before the next
+			start.
+	"""
+	start_time = start_time.replace(second=0, microsecond=0)
+	stop_time = stop_time.replace(second=0, microsecond=0)
+
+	if stop_time < start_time:
+		return []
+
+	days = (stop_time.date() - start_time.date()).days + 1
+	shard_days = -(-days // max(1, min(shards, days)))
+
+	windows = []
+	day = start_time.date()
+	while day <= stop_time.date():
+		next_day = day + datetime.timedelta(shard_days)
+		windows.append((
+			max(start_time, datetime.datetime(day.year, day.month, day.day)),
+			min(stop_time, datetime.datetime(next_day.year, next_day.month, next_day.day) - ONE_MINUTE),
+		))
+		day = next_day
+
+	return windows
+
+# -------------------------------------------------------------------- #
+
+# Rules and engine of a process pool worker (see init_shard_worker)
+shard_worker = {}
+
+def init_shard_worker(crontab_l, engine_name):
+	"""
+	Process pool initializer: the rules are shipped once per worker
+	"""
+	shard_worker['crontab_l'] = crontab_l
+	shard_worker['engine'] = load_numpy_engine() if engine_name == 'numpy' else None
+
+def evaluate_shard(window):
+	"""
+	Compute, in a process pool worker, the executions in a window returned by
+	:func:`split_window`
+
+	Returns:
+		tuple: Minutes and rule ids arrays of the :class:`Occurrences`
+	"""
+	start_time, stop_time = window
+	shard_args = argparse.Namespace(start_time=start_time, stop_time=stop_time)
+
+	if shard_worker['engine'] is not None:
+		occurrences = shard_worker['engine'].calc_executed_crontabs(shard_args, shard_worker['crontab_l'])
+	else:
+		occurrences = calc_executed_crontabs(shard_args, shard_worker['crontab_l'])
+
+	return occurrences.minutes, occurrences.rule_ids
+
+# -------------------------------------------------------------------- #
+
+def iter_executed_shards(input_args, crontab_l, jobs, engine_name='python'):
+	"""
+	Same as :func:`iter_executed_crontabs`, with the window split in day
+	aligned shards (see :func:`split_window`) evaluated by a pool of "jobs"
+	processes. Shards are yielded back in chronological order, so the result
+	is the same as the serial one.
+
+	Args:
+		input_args (argparse.Namespace): Command line arguments
+		crontab_l (list): Rules as returned by :func:`process_crontab`
+		jobs (int): Number of worker processes
+		engine_name (str): Evaluation engine of the workers ("python" or
+			"numpy", see :func:`load_numpy_engine`)
+
+	Yields:
+		tuple: (ts, rule) pairs
+	"""
+	import concurrent.futures
+
+	windows = split_window(input_args.start_time, input_args.stop_time, jobs * SHARDS_PER_JOB)
+
+	with concurrent.futures.ProcessPoolExecutor(
+			max_workers=jobs, initializer=init_shard_worker, initargs=(crontab_l, engine_name)) as executor:
+		for minutes, rule_ids in executor.map(evaluate_shard, windows):
+			for execution in Occurrences(crontab_l, minutes, rule_ids):
+				yield execution
+
+# ==================================================================== #
+
+def count_day_executions(rule, from_minute, to_minute, hours_count):
+	"""
+	Count the executions of a rule in a (matching) day, between two minutes of
+	the day, without enumerating them.
+
+	Args:
+		rule (CronRule): The rule
+		from_minute (int): First minute of the day (0-1439, included)
+		to_minute (int): Last minute of the day (0-1439, included)
+		hours_count (list): 24 items list where the executions of each hour are
+			added
+
+	Returns:
+		int: Number of executions
+	"""
+	total = 0
+
+	for hour in bitmask_values(rule.h):
+		lo = max(0, from_minute - hour * 60)
+		hi = min(59, to_minute - hour * 60)
+		if lo > hi:
+			continue
+
+		n = bit_count(rule.m >> lo & ((1 << (hi - lo + 1)) - 1))
+		hours_count[hour] += n
+		total += n
+
+	return total
+
+# -------------------------------------------------------------------- #
+
+def count_executed_crontabs(input_args, crontab_l):
+	"""
+	Count the rules executions in the [start_time, stop_time] window, without
+	generating them.
+
+	For each distinct schedule only the matching days are enumerated: full
+	days count as (minutes per hour) x (hours per day), while the first and the
+	last day of the window are counted hour by hour.
+
+	Args:
+		input_args (argparse.Namespace): Command line arguments
+		crontab_l (list): Rules as returned by :func:`process_crontab`
+
+	Returns:
+		dict: Dictionary in the form:
+			{
+				'rules': [n, ...],          # Executions of each rule (same
+				                            # order of "crontab_l")
+				'users': {'<user>': n},     # Executions of each user rules
+				                            # (of each (host, user) pair
+				                            # with "--fleet")
+				'hours': [n, ...],          # Executions in each hour of the
+				                            # day (0-23)
+			}
+	"""
+	start_time = input_args.start_time.replace(second=0, microsecond=0)
+	stop_time = input_args.stop_time
+	start_day = start_time.date()
+	stop_day = stop_time.date()
+
+	counts = {
+		'rules': [0] * len(crontab_l),
+		'users': {},
+		'hours': [0] * 24,
+	}
+
+	for group in group_by_schedule(crontab_l):
+		rule = group[0][1]
+		hours_count = [0] * 24
+		full_days = 0
+		total = 0
+
+		for day in iter_fire_days(rule, start_day, stop_day):
+			from_minute = start_time.hour * 60 + start_time.minute if day == start_day else 0
+			to_minute = stop_time.hour * 60 + stop_time.minute if day == stop_day else 1439
+
+			if from_minute == 0 and to_minute == 1439:
+				full_days += 1
+			else:
+				total += count_day_executions(rule, from_minute, to_minute, hours_count)
+
+		if full_days:
+			per_hour = bit_count(rule.m) * full_days
+			for hour in bitmask_values(rule.h):
+				hours_count[hour] += per_hour
+				total += per_hour
+
+		for index, member in group:
+			counts['rules'][index] = total
+			user = member.user if member.host is None else (member.host, member.user)
+			counts['users'][user] = counts['users'].get(user, 0) + total
+			for hour in range(24):
+				counts['hours'][hour] += hours_count[hour]
+
+	return counts
+
+# ==================================================================== #
+
+class DayIndex(object):
+	"""
+	Inverted index from months, days of month and days of week to the rules
+	that can run on them. Each entry is an int bitset of rule positions, so the
+	rules allowed to run in a day are found with a few ANDs and ORs, whatever
+	the number of rules.
+
+	Args:
+		rules (list): List of :class:`CronRule` objects
+	"""
+
+	def __init__(self, rules):
+		self.by_mon = [0] * 13
+		self.by_dom = [0] * 32
+		self.by_dow = [0] * 7
+
+		# Rules whose dom and dow are evaluated in AND (see CronRule.is_day_ok)
+		self.and_set = 0
+		self.or_set = 0
+
+		for i, rule in enumerate(rules):
+			bit = 1 << i
+			for v in bitmask_values(rule.mon):
+				self.by_mon[v] |= bit
+			for v in bitmask_values(rule.dom):
+				self.by_dom[v] |= bit
+			for v in bitmask_values(rule.dow):
+				self.by_dow[v] |= bit
+
+			if rule.dom_star or rule.dow_star:
+				self.and_set |= bit
+			else:
+				self.or_set |= bit
+
+	def matching(self, day):
+		"""
+		Return the bitset of the rules allowed to run in "day" (datetime.date)
+		"""
+		dom = self.by_dom[day.day]
+		dow = self.by_dow[day.isoweekday() % 7]
+
+		return self.by_mon[day.month] & (
+			(self.and_set & dom & dow) |
+			(self.or_set & (dom | dow))
+		)
+
+# -------------------------------------------------------------------- #
+
+class RuleIndex(DayIndex):
+	"""
+	Inverted index from the values of every field (minutes, hours, days of
+	month, months and days of week) to the rules that can run on them, used to
+	answer point queries without evaluating any window: the rules executed at
+	a timestamp are the AND of a few bitsets (see :class:`DayIndex`).
+
+	Args:
+		rules (list): List of :class:`CronRule` objects
+	"""
+
+	def __init__(self, rules):
+		super(RuleIndex, self).__init__(rules)
+
+		self.rules = rules
+		self.by_minute = [0] * 60
+		self.by_hour = [0] * 24
+
+		for i, rule in enumerate(rules):
+			bit = 1 << i
+			for v in bitmask_values(rule.m):
+				self.by_minute[v] |= bit
+			for v in bitmask_values(rule.h):
+				self.by_hour[v] |= bit
+
+	def matching_at(self, ts):
+		"""
+		Return the bitset of the rules executed at "ts" (datetime.datetime)
+		"""
+		return self.by_minute[ts.minute] & self.by_hour[ts.hour] & self.matching(ts)
+
+	def rules_at(self, ts):
+		"""
+		Return the rules executed at "ts" (datetime.datetime), in the index order
+		"""
+		matching = self.matching_at(ts)
+		rules = []
+		while matching:
+			low = matching & -matching
+			rules.append(self.rules[low.bit_length() - 1])
+			matching ^= low
+		return rules
+
+	def next_runs(self, from_time, n, user=None, job=None, stop_time=None):
+		"""
+		Return the first "n" executions from "from_time" (included) on of the
+		rules of "user" whose command contains "job" (None matches everything).
+
+		Each rule jumps directly to its next matching day (see
+		:func:`iter_fire_times`), so no window is scanned.
+
+		Args:
+			from_time (datetime.datetime): Search start
+			n (int): Number of executions
+			user (str): User of the rules
+			job (str): Part of the command of the rules
+			stop_time (datetime.datetime): Search limit (default
+				NEXT_RUNS_HORIZON after "from_time", or the last representable
+				time)
+
+		Returns:
+			list: (ts, rule) pairs, in chronological order
+		"""
+		if stop_time is None:
+			try:
+				stop_time = from_time + NEXT_RUNS_HORIZON
+			except OverflowError:
+				stop_time = datetime.datetime.max
+
+		def rule_stream(index, rule):
+			for ts in iter_fire_times(rule, from_time, stop_time):
+				yield ts, index, rule
+
+		streams = [
+			rule_stream(index, rule) for index, rule in enumerate(self.rules)
+			if (user is None or rule.user == user) and (job is None or job in rule.cmd)
+		]
+		return [(ts, rule) for ts, index, rule in itertools.islice(heapq.merge(*streams), n)]
+
+# -------------------------------------------------------------------- #
+
+def calc_minute_histogram(input_args, crontab_l):
+	"""
+	Compute how many jobs start in each minute of the [start_time, stop_time]
+	window.
+
+	The histogram is an array of counters: each day of the window is filled
+	with a copy of the 1440 minutes profile of the schedules allowed to run in
+	that day. Profiles are computed once per distinct set of matching schedules
+	(see :class:`DayIndex`), so the cost doesn't depend on the number of
+	executions.
+
+	Args:
+		input_args (argparse.Namespace): Command line arguments
+		crontab_l (list): Rules as returned by :func:`process_crontab`
+
+	Returns:
+		tuple: Tuple containing:
+
+			start_time (datetime.datetime): Timestamp of the first minute
+			histogram (array.array): Job starts per minute
+	"""
+	start_time = input_args.start_time.replace(second=0, microsecond=0)
+	stop_time = input_args.stop_time.replace(second=0, microsecond=0)
+
+	size = max(0, int((stop_time - start_time).total_seconds()) // 60 + 1)
+	histogram = array.array('I', [0]) * size
+
+	groups = group_by_schedule(crontab_l)
+	schedules = [group[0][1] for group in groups]
+	index = DayIndex(schedules)
+
+	# Minutes of the day (0-1439) in which each schedule starts
+	day_minutes = [
+		[h * 60 + m for h in bitmask_values(rule.h) for m in bitmask_values(rule.m)]
+		for rule in schedules
+	]
+
+	profiles = {}
+	start_minute = start_time.hour * 60 + start_time.minute
+	day = start_time.date()
+	one_day = datetime.timedelta(1)
+
+	while day <= stop_time.date():
+		matching = index.matching(day)
+
+		if matching:
+			profile = profiles.get(matching)
+			if profile is None:
+				profile = array.array('I', [0]) * 1440
+				for i in bitmask_values(matching):
+					weight = len(groups[i])
+					for minute in day_minutes[i]:
+						profile[minute] += weight
+				profiles[matching] = profile
+
+			offset = (day - start_time.date()).days * 1440 - start_minute
+			lo = max(0, offset)
+			hi = min(size, offset + 1440)
+			histogram[lo:hi] = profile[lo - offset:hi - offset]
+
+		day += one_day
+
+	return start_time, histogram
+
+# -------------------------------------------------------------------- #
+
+def calc_peak_minutes(start_time, histogram, top):
+	"""
+	Return the "top" minutes with the most job starts (earliest first among
+	equals), as a list of (ts, starts) pairs
+	"""
+	peaks = heapq.nlargest(top, range(len(histogram)), key=histogram.__getitem__)
+	return [(start_time + datetime.timedelta(0, 60 * i), histogram[i]) for i in peaks if histogram[i]]
+
+# -------------------------------------------------------------------- #
+
+def calc_heatmap(start_time, histogram):
+	"""
+	Sum the job starts of the histogram per hour of the day and day of week.
+
+	Returns:
+		list: 24 lists (one per hour) of 7 counters (from monday to sunday)
+	"""
+	heatmap = [[0] * 7 for hour in range(24)]
+	offset = -(start_time.hour * 60 + start_time.minute)
+	day = start_time.date()
+	one_day = datetime.timedelta(1)
+
+	while offset < len(histogram):
+		weekday = day.weekday()
+		for hour in range(24):
+			lo = max(0, offset + hour * 60)
+			hi = max(0, offset + hour * 60 + 60)
+			heatmap[hour][weekday] += sum(histogram[lo:hi])
+
+		offset += 1440
+		day += one_day
+
+	return heatmap
+
+# ==================================================================== #
+
+def arithmetic_runs(values):
+	"""
+	Split a sorted list of ints in maximal arithmetic progressions (greedy,
+	from the left).
+
+	Args:
+		values (list): Sorted list of ints
+
+	Returns:
+		list: List of (first, step, count) tuples (step is 0 when count is 1)
+	"""
+	runs = []
+	i = 0
+	n = len(values)
+
+	while i < n:
+		if i + 1 == n:
+			runs.append((values[i], 0, 1))
+			break
+
+		step = values[i + 1] - values[i]
+		j = i + 1
+		while j + 1 < n and values[j + 1] - values[j] == step:
+			j += 1
+
+		runs.append((values[i], step, j - i + 1))
+		i = j + 1
+
+	return runs
+
+# -------------------------------------------------------------------- #
+
+def format_values(values):
+	"""
+	Format a sorted list of ints in crontab style (e.g. [1, 2, 3, 10, 20, 30]
+	becomes "1-3,10-30/10")
+	"""
+	parts = []
+	for first, step, count in arithmetic_runs(values):
+		last = first + step * (count - 1)
+		if count == 1:
+			parts.append('%d' % first)
+		elif count == 2:
+			parts.append('%d,%d' % (first, last))
+		elif step == 1:
+			parts.append('%d-%d' % (first, last))
+		else:
+			parts.append('%d-%d/%d' % (first, last, step))
+	return ','.join(parts)
+
+# -------------------------------------------------------------------- #
+
+def format_names(values, names):
+	"""
+	Format a sorted list of indexes of "names" in a compact form (e.g.
+	[0, 1, 2, 3, 4, 6] of WEEKDAY_NAMES becomes "Mon-Fri,Sun")
+	"""
+	parts = []
+	for first, step, count in arithmetic_runs(values):
+		if step == 1 and count > 2:
+			parts.append('%s-%s' % (names[first], names[first + count - 1]))
+		else:
+			parts.extend(names[first + step * i] for i in range(count))
+	return ','.join(parts)
+
+# -------------------------------------------------------------------- #
+
+def describe_days(rule):
+	"""
+	Describe the days in which a rule runs, e.g. "Mon-Fri", "day 1" or
+	"day 13 or Fri in Jan-Mar".
+
+	Returns:
+		str: The description (empty if the rule runs every day)
+	"""
+	# 7 is sunday too
+	dom = sorted(bitmask_values(rule.dom))
+	dow = sorted(set((d - 1) % 7 for d in bitmask_values(rule.dow)))
+	mon = sorted(m - 1 for m in bitmask_values(rule.mon))
+
+	parts = []
+	if len(dom) < 31:
+		parts.append('day %s' % format_values(dom))
+	if len(dow) < 7:
+		parts.append(format_names(dow, WEEKDAY_NAMES))
+
+	# Restricted day of month and day of week: either is enough (see
+	# CronRule.is_day_ok), so a full one (e.g. "1-31" or "0-6") means every day
+	if rule.dom_star or rule.dow_star:
+		description = ' and '.join(parts)
+	elif len(parts) < 2:
+		description = ''
+	else:
+		description = ' or '.join(parts)
+
+	if len(mon) < 12:
+		description = (description + ' in ' if description else 'in ') + format_names(mon, MONTH_NAMES)
+
+	return description
+
+# -------------------------------------------------------------------- #
+
+def describe_day_minutes(minutes):
+	"""
+	Describe in a compact form the executions of a rule in a day, e.g.
+	"every 5 min from 08:00 to 18:55".
+
+	Args:
+		minutes (list): Sorted minutes of the day (0-1439) of the executions
+
+	Returns:
+		str: The description
+	"""
+
+	def hhmm(minute):
+		return '%02d:%02d' % divmod(minute, 60)
+
+	runs = arithmetic_runs(minutes)
+
+	if len(runs) <= MAX_SUMMARY_RUNS:
+		parts = []
+		for first, step, count in runs:
+			if count == 1:
+				parts.append('at %s' % hhmm(first))
+			else:
+				parts.append('every %d min from %s to %s' % (step, hhmm(first), hhmm(first + step * (count - 1))))
+		return ', '.join(parts)
+
+	# Irregular sequences are described as a grid of minutes and hours
+	hours = sorted(set(m // 60 for m in minutes))
+	hour_minutes = sorted(set(m % 60 for m in minutes))
+	description = 'at minutes %s of hours %s' % (format_values(hour_minutes), format_values(hours))
+
+	# The grid is not complete in the first and last day of the window
+	if len(hours) * len(hour_minutes) != len(minutes):
+		description += ', from %s to %s' % (hhmm(minutes[0]), hhmm(minutes[-1]))
+
+	return description
+
+# -------------------------------------------------------------------- #
+
+def calc_summaries(input_args, crontab_l):
+	"""
+	Summarize the rules executions in the [start_time, stop_time] window: for
+	each rule, all the days in which the rule runs are collapsed in a single
+	entry, whose description tells which days (see :func:`describe_days`) and
+	the executions in each of them (see :func:`describe_day_minutes`), e.g.
+	"Mon-Fri, every 5 min from 08:00 to 18:55".
+
+	Everything is computed from the rule fields: executions are never generated
+	one by one. The first and the last day of the window, when not complete,
+	have their own entries.
+
+	Args:
+		input_args (argparse.Namespace): Command line arguments
+		crontab_l (list): Rules as returned by :func:`process_crontab`
+
+	Returns:
+		list: List of dictionaries, sorted by first day (and then by rule
+			position), in the form:
+			{
+				'from': <datetime.date>,    # First day
+				'to': <datetime.date>,      # Last day
+				'rule': <CronRule>,
+				'description': '...',       # Days and executions in each day
+				'runs_per_day': n,          # Executions in each day
+				'runs': n,                  # Total executions
+			}
+	"""
+	start_time = input_args.start_time.replace(second=0, microsecond=0)
+	stop_time = input_args.stop_time
+	start_day = start_time.date()
+	stop_day = stop_time.date()
+	start_minute = start_time.hour * 60 + start_time.minute
+	stop_minute = stop_time.hour * 60 + stop_time.minute
+
+	summaries = []
+
+	for group in group_by_schedule(crontab_l):
+		rule = group[0][1]
+		minutes = [h * 60 + m for h in bitmask_values(rule.h) for m in bitmask_values(rule.m)]
+
+		description = describe_day_minutes(minutes)
+		days_description = describe_days(rule)
+		if days_description:
+			description = '%s, %s' % (days_description, description)
+
+		# [from, to, minutes, description, days] of each entry: the partial
+		# first day, all the complete days and the partial last day
+		spans = []
+		complete = None
+
+		for day in iter_fire_days(rule, start_day, stop_day):
+			lo = start_minute if day == start_day else 0
+			hi = stop_minute if day == stop_day else 1439
+
+			if lo > 0 or hi < 1439:
+				day_minutes = [m for m in minutes if lo <= m <= hi]
+				if day_minutes:
+					spans.append([day, day, day_minutes, describe_day_minutes(day_minutes), 1])
+			elif complete is not None:
+				complete[1] = day
+				complete[4] += 1
+			else:
+				complete = [day, day, minutes, description, 1]
+				spans.append(complete)
+
+		for day_from, day_to, day_minutes, day_description, days in spans:
+			for index, member in group:
+				summaries.append((day_from, index, {
+					'from': day_from,
+					'to': day_to,
+					'rule': member,
+					'description': day_description,
+					'runs_per_day': len(day_minutes),
+					'runs': len(day_minutes) * days,
+				}))
+
+	summaries.sort(key=lambda e: e[:2])
+	return [summary for day_from, index, summary in summaries]
+
+# ==================================================================== #
+
+def too_much_frequent(input_args, rule):
+	"""
+	Check if a rule runs more times per hour than "--max-hourly-repetitions"
+	(or per day than "--max-daily-repetitions", if given)
+	"""
+	if rule.runs_per_hour() > input_args.max_hourly_repetitions:
+		return True
+
+	max_daily_repetitions = getattr(input_args, 'max_daily_repetitions', None)
+	if max_daily_repetitions is not None and rule.runs_per_day() > max_daily_repetitions:
+		return True
+
+	return False
+
+# -------------------------------------------------------------------- #
+
+def prune_frequent_rules(input_args, crontab_l):
+	"""
+	Remove the rules that are too frequent to be shown (see
+	:func:`too_much_frequent`) before any execution is computed.
+
+	Args:
+		input_args (argparse.Namespace): Command line arguments
+		crontab_l (list): List of :class:`CronRule` objects
+
+	Returns:
+		list: The rules to be evaluated
+	"""
+	return [rule for rule in crontab_l if not too_much_frequent(input_args, rule)]
+
+# -------------------------------------------------------------------- #
+
+def format_rule_columns(output_format, rule, max_user_length, max_host_length=None):
+	"""
+	Return the part of an execution output line that depends only on the
+	rule (i.e. everything but the timestamp), "\n" included.
+
+	Args:
+		output_format (str): One of OUTPUT_FORMATS
+		rule (CronRule): The executed rule
+		max_user_length (int): Width of the user column (text format only)
+		max_host_length (int): Width of the host column (text format only). If
+			None there is no host column.
+
+	Returns:
+		str: The line suffix
+	"""
+	if output_format == 'text':
+		host = ''
+		if max_host_length is not None:
+			host = (TEXT_HOST_COLUMN_FORMAT % vars()).format(host=rule.host)
+		return host + (TEXT_COLUMNS_FORMAT % vars()).format(user=rule.user, raw=rule.raw)
+
+	if output_format == 'jsonl':
+		import json
+		host = ''
+		if max_host_length is not None:
+			host = ', "host": %s' % json.dumps(rule.host)
+		return '%s, "user": %s, "raw": %s, "cmd": %s}\n' % (
+			host, json.dumps(rule.user), json.dumps(rule.raw), json.dumps(rule.cmd))
+
+	import csv
+
+	# csv and tsv: the first (empty) column is replaced by the timestamp, that
+	# never needs quoting
+	columns = ['', rule.user, rule.raw, rule.cmd]
+	if max_host_length is not None:
+		columns.insert(1, rule.host)
+
+	buf = io.StringIO()
+	csv.writer(buf, delimiter=',' if output_format == 'csv' else '\t', lineterminator='\n').writerow(columns)
+	return buf.getvalue()
+
+# -------------------------------------------------------------------- #
+
+def print_executed_crontabs(input_args, exec_l, max_user_length=None, out=None, max_host_length=None):
+	"""
+	Print the rules executions, in the format selected by "--format".
+
+	Output lines are built from a per rule cached suffix and a per minute
+	cached timestamp, and written in large chunks.
+
+	Args:
+		input_args (argparse.Namespace): Command line arguments
+		exec_l (iterable): (ts, rule) pairs, as returned by
+			:func:`calc_executed_crontabs` or :func:`iter_executed_crontabs`
+		max_user_length (int): Width of the user column (text format only). If
+			None it is computed from "exec_l", which (unless it is an
+			:class:`Occurrences`) is consumed entirely before printing anything:
+			pass it when "exec_l" is a stream.
+		out (file): Output file (default sys.stdout)
+		max_host_length (int): Width of the host column (text format only). If
+			None there is no host column.
+
+	Returns:
+		int: Number of printed lines (header excluded)
+	"""
+
+	output_format = getattr(input_args, 'output_format', 'text')
+
+	if out is None:
+		out = sys.stdout
+
+	if output_format == 'text' and max_user_length is None and isinstance(exec_l, Occurrences):
+		if not exec_l:
+			return 0
+		max_user_length = max([len(exec_l.rules[rule_id].user) for rule_id in set(exec_l.rule_ids)])
+
+	elif output_format == 'text' and max_user_length is None:
+		exec_l = list(exec_l)
+		if not exec_l:
+			return 0
+		max_user_length = max([len(rule.user) for ts, rule in exec_l])
+
+	ts_format = OUTPUT_TS_FORMATS[output_format]
+	header = (OUTPUT_HEADERS if max_host_length is None else OUTPUT_HOST_HEADERS)[output_format]
+	chunk = [header] if header else []
+	printed = -len(chunk)
+
+	# Line suffix of each rule
+	suffixes = {}
+	last_ts = None
+	ts_str = None
+
+	for ts, rule in exec_l:
+		try:
+			suffix = suffixes[id(rule)]
+		except KeyError:
+			suffix = suffixes[id(rule)] = format_rule_columns(output_format, rule, max_user_length, max_host_length)
+
+		if ts != last_ts:
+			last_ts = ts
+			ts_str = ts.strftime(ts_format)
+
+		chunk.append(ts_str + suffix)
+
+		if len(chunk) >= OUTPUT_CHUNK_LINES:
+			out.write(''.join(chunk))
+			printed += len(chunk)
+			chunk = []
+
+	out.write(''.join(chunk))
+	out.flush()
+
+	return printed + len(chunk)
+
+# -------------------------------------------------------------------- #
+
+def print_summaries(input_args, crontab_l, summaries):
+	"""
+	Print the executions summaries.
+
+	Args:
+		input_args (argparse.Namespace): Command line arguments
+		crontab_l (list): Rules as returned by :func:`process_crontab`
+		summaries (list): Summaries as returned by :func:`calc_summaries`
+	"""
+
+	if not crontab_l:
+		return
+
+	max_user_length = max([len(rule.user) for rule in crontab_l])
+	if getattr(input_args, 'fleet', None):
+		max_host_length = max([len(rule.host) for rule in crontab_l])
+		tmp_format = SUMMARY_HOST_FORMAT % vars()
+	else:
+		tmp_format = SUMMARY_FORMAT % vars()
+
+	for summary in summaries:
+		runs = '%d run%s' % (summary['runs'], '' if summary['runs'] == 1 else 's')
+
+		if summary['from'] == summary['to']:
+			days = '{0:%Y-%m-%d}'.format(summary['from'])
+		else:
+			days = '{0:%Y-%m-%d}..{1:%Y-%m-%d}'.format(summary['from'], summary['to'])
+			runs = '%d/day, %s' % (summary['runs_per_day'], runs)
+
+		print(tmp_format.format(
+			days=days, host=summary['rule'].host, user=summary['rule'].user, description=summary['description'],
+			runs=runs, raw=summary['rule'].raw))
+
+# -------------------------------------------------------------------- #
+
+def print_counts(input_args, crontab_l, counts):
+	"""
+	Print the executions counts per rule, per user (per host and user with
+	"--fleet") and per hour of the day.
+
+	Args:
+		input_args (argparse.Namespace): Command line arguments
+		crontab_l (list): Rules as returned by :func:`process_crontab`
+		counts (dict): Counts as returned by :func:`count_executed_crontabs`
+	"""
+
+	if not crontab_l:
+		return
+
+	max_user_length = max([len(rule.user) for rule in crontab_l])
+	fleet = getattr(input_args, 'fleet', None)
+	if fleet:
+		max_host_length = max([len(rule.host) for rule in crontab_l])
+		tmp_format = COUNT_HOST_FORMAT % vars()
+	else:
+		tmp_format = COUNT_FORMAT % vars()
+
+	print('# Executions per rule')
+	for rule, count in zip(crontab_l, counts['rules']):
+		print(tmp_format.format(count=count, host=rule.host, user=rule.user, raw=rule.raw))
+
+	if fleet:
+		print('# Executions per host and user')
+		for host, user in sorted(counts['users']):
+			print('{count:8d} :: {host:{width}} :: {user}'.format(
+				count=counts['users'][host, user], host=host, user=user, width=max_host_length))
+	else:
+		print('# Executions per user')
+		for user in sorted(counts['users']):
+			print('{count:8d} :: {user}'.format(count=counts['users'][user], user=user))
+
+	print('# Executions per hour of the day')
+	for hour, count in enumerate(counts['hours']):
+		print('{count:8d} :: {hour:02d}:00-{hour:02d}:59'.format(count=count, hour=hour))
+
+# -------------------------------------------------------------------- #
+
+def print_heatmap(input_args, crontab_l):
+	"""
+	Print the minutes with the most job starts and the job starts per hour of
+	the day and day of week (and per host with "--fleet"), as text or CSV
+	(according to "--heatmap").
+
+	Args:
+		input_args (argparse.Namespace): Command line arguments
+		crontab_l (list): Rules as returned by :func:`process_crontab`
+	"""
+
+	start_time, histogram = calc_minute_histogram(input_args, crontab_l)
+	peaks = calc_peak_minutes(start_time, histogram, input_args.top)
+	heatmap = calc_heatmap(start_time, histogram)
+
+	hosts = {}
+	if getattr(input_args, 'fleet', None):
+		for rule, count in zip(crontab_l, count_executed_crontabs(input_args, crontab_l)['rules']):
+			hosts[rule.host] = hosts.get(rule.host, 0) + count
+
+	if input_args.heatmap == 'csv':
+		print('minute,starts')
+		for ts, starts in peaks:
+			print('{ts:%Y-%m-%d %H:%M},{starts}'.format(ts=ts, starts=starts))
+		print('')
+		print('hour,' + ','.join(WEEKDAY_NAMES))
+		for hour, row in enumerate(heatmap):
+			print('%02d,' % hour + ','.join(str(v) for v in row))
+		if hosts:
+			print('')
+			print('host,starts')
+			for host in sorted(hosts):
+				print('%s,%d' % (host, hosts[host]))
+		return
+
+	print('# Peak minutes (top %d)' % input_args.top)
+	for ts, starts in peaks:
+		print('{ts:%Y-%m-%d %H:%M} :: {starts:8d}'.format(ts=ts, starts=starts))
+
+	print('# Job starts per hour of the day and day of week')
+	print('     ' + ''.join('%9s' % name for name in WEEKDAY_NAMES))
+	for hour, row in enumerate(heatmap):
+		print('%02d:00' % hour + ''.join('%9d' % v for v in row))
+
+	if hosts:
+		print('# Job starts per host')
+		for host in sorted(hosts):
+			print('{starts:8d} :: {host}'.format(starts=hosts[host], host=host))
+
+# ==================================================================== #
+
+# Scripts of the run-parts directories listed so far (see list_run_parts())
+run_parts_cache = cache.ParseCache(None)
+
+# -------------------------------------------------------------------- #
+
+def list_run_parts(path, parse_cache=None):
+	"""
+	List the files of a run-parts directory, caching the listing by directory
+	key (see :func:`cache.file_key`): adding, removing or renaming a script
+	changes the directory modification time, so an unchanged directory costs a
+	single stat.
+
+	Args:
+		path (str): Directory to scan
+		parse_cache (cache.ParseCache): Cache of the listings (default a memory
+			only cache shared by the whole process)
+
+	Returns:
+		list: Sorted list of file paths
+
+	Raises:
+		OSError: If the directory can't be read
+	"""
+	if parse_cache is None:
+		parse_cache = run_parts_cache
+
+	cache_path = 'run-parts:' + path
+	key = cache.file_key(path)
+
+	files = parse_cache.get(cache_path, key)
+	if files is None:
+		files = tuple(list_files(path))
+		parse_cache.put(cache_path, key, files)
+
+	return list(files)
+
+# -------------------------------------------------------------------- #
+
+def extend_sys_crontab(sys_l, list_dir=None):
+	"""
+	Expand the "run-parts DIR" rules of a system crontab in one rule per script
+	of DIR (see :data:`RUN_PARTS_RE`). Other rules are kept as they are.
+
+	Args:
+		sys_l (list): List of :class:`CronRule` objects
+		list_dir (callable): Function listing the files of a directory
+			(default :func:`list_run_parts`)
+
+	Returns:
+		list: List of :class:`CronRule` objects
+	"""
+	if list_dir is None:
+		list_dir = list_run_parts
+
+	sys_l_ext = []
+	for regola in sys_l :
+		match = RUN_PARTS_RE.search(regola.cmd)
+		if match is None:
+			sys_l_ext += [ regola ]
+			continue
+
+		dir = match.group(1)
+		try:
+			scripts = list_dir(dir)
+		except OSError as e:
+			print_error('Ignored run-parts directory %r (%s)' % (dir, e))
+			continue
+		for script in scripts:
+			if not VALID_NAME_RE.match(os.path.basename(script)):
+				continue
+			new_r = regola.copy(cmd=script, raw=regola.raw + ' (%s)' % script)
 			sys_l_ext += [ new_r ]
-	#for e in sys_l_ext: print e
 	return sys_l_ext
 
 # -------------------------------------------------------------------- #
 
-def process_crontab(input_args):
-	c_files = get_crontab_files(input_args)
+def open_parse_cache(input_args):
+	"""
+	Return the parse cache selected by the command line arguments (None if
+	disabled)
+	"""
+	cache_file = getattr(input_args, 'cache_file', None)
+	if not cache_file:
+		return None
+	return cache.ParseCache(cache_file, version=PARSE_CACHE_VERSION)
+
+# -------------------------------------------------------------------- #
+
+def parse_crontab_file(c_file, parse_cache=None):
+	"""
+	Parse a crontab file as returned by :func:`get_crontab_files`, using and
+	updating the parse cache.
+
+	Args:
+		c_file (dict): Crontab file
+		parse_cache (cache.ParseCache): Parse cache (optional)
+
+	Returns:
+		list: List of :class:`CronRule` objects
+	"""
+	if 'cached' in c_file:
+		rule_tuples, errors = c_file['cached']
+		# The user of system crontab rules comes from each row
+		processed_cron = [CronRule.from_tuple(t[0], t[1:]) for t in rule_tuples]
+	else:
+		errors = []
+		processed_cron = analyze_cron_file(c_file['user'], c_file['rows'], errors, c_file.get('system'))
+
+		if parse_cache is not None and 'key' in c_file:
+			parse_cache.put(c_file['path'], c_file['key'], (
+				tuple((rule.user,) + rule.to_tuple() for rule in processed_cron),
+				tuple(errors)
+			))
+
+	for message in errors:
+		print_error(message)
+
+	return processed_cron
+
+# -------------------------------------------------------------------- #
+
+def finalize_crontab_file(input_args, c_file, processed_cron, list_dir=None):
+	"""
+	Prepare the parsed rules of a crontab file for evaluation: drop the too
+	frequent ones and expand the system crontabs.
+
+	Args:
+		input_args (argparse.Namespace): Command line arguments
+		c_file (dict): Crontab file, as returned by :func:`get_crontab_files`
+		processed_cron (list): Rules as returned by :func:`parse_crontab_file`
+		list_dir (callable): Function listing the scripts of a "run-parts"
+			directory (default :func:`list_run_parts`)
+
+	Returns:
+		list: List of :class:`CronRule` objects
+	"""
+
+	# Noisy rules are dropped before any other processing (summaries are
+	# compact whatever the rules frequency, counts and heatmap are about the
+	# load of every job)
+	if not (
+		getattr(input_args, 'summarize', False) or getattr(input_args, 'count', False) or
+		getattr(input_args, 'heatmap', None)
+	):
+		processed_cron = prune_frequent_rules(input_args, processed_cron)
+
+	if c_file.get('system') and getattr(input_args, 'expand_run_parts', True):
+		# If crontab is a system one, we need to do some work
+		return extend_sys_crontab(processed_cron, list_dir)
+
+	return processed_cron
+
+# -------------------------------------------------------------------- #
+
+def process_crontab(input_args, stats=NULL_STATS):
+	if getattr(input_args, 'fleet', None):
+		try:
+			import cronls.fleet as fleet
+		except ImportError:
+			import fleet
+
+		return fleet.process_fleet(input_args, stats)
+
+	with stats.stage('read'):
+		parse_cache = open_parse_cache(input_args) if input_args.all else None
+		c_files = get_crontab_files(input_args, parse_cache)
+
+	stats.count('files', len(c_files))
 
 	crontab_l = []
+	parsed = 0
 
-	for file in c_files:
-		processed_cron = analyze_cron_file(file['user'], file['rows'])
+	# run-parts listings are cached between runs too
+	list_dir = None
+	if parse_cache is not None:
+		list_dir = functools.partial(list_run_parts, parse_cache=parse_cache)
 
-		if file['user'] == SYS_USER:
-			# If crontab is the system one, we need to do some work
-			crontab_l.extend(extend_sys_crontab(processed_cron))
-		else:
-			crontab_l.extend(processed_cron)
+	with stats.stage('parse'):
+		for file in c_files:
+			processed_cron = parse_crontab_file(file, parse_cache)
+			parsed += len(processed_cron)
+			crontab_l.extend(finalize_crontab_file(input_args, file, processed_cron, list_dir))
 
-	# if input_args.system_cron :
-	# 	sys_l = analyze_cron_file('sys', read_file('/etc/crontab')[4:])
-	# 	sys_l_ext = extend_sys_crontab(sys_l)
-	# 	crontab_l.extend( sys_l_ext )
+		# if input_args.system_cron :
+		# 	sys_l = analyze_cron_file('sys', read_file('/etc/crontab')[4:])
+		# 	sys_l_ext = extend_sys_crontab(sys_l)
+		# 	crontab_l.extend( sys_l_ext )
+
+		if parse_cache is not None:
+			parse_cache.save()
+
+	stats.count('rules parsed', parsed)
+	stats.count('rules kept', len(crontab_l))
 
 	return crontab_l
 
 # ==================================================================== #
 
 
-class CronlsCommand(setuptools.Command):
-	"""setuptools Command"""
+def make_cronls_command():
+	"""
+	Build the setuptools Command class. setuptools takes longer to import than
+	a whole cronls run, so it is imported only when the class is requested (see
+	:func:`__getattr__`).
+	"""
+	import setuptools
 
-	description = "TODO"
-	user_options = [  ]
-	input_args = None
+	class CronlsCommand(setuptools.Command):
+		"""setuptools Command"""
 
-	def initialize_options(self):
-		if 'setup.py' in sys.argv[0]:
-			argv = sys.argv[2:]
-		else:
-			argv = sys.argv[1:]
+		description = "TODO"
+		user_options = [  ]
+		input_args = None
 
-		self.input_args = args.parse_cmd_args(argv)
+		def initialize_options(self):
+			if 'setup.py' in sys.argv[0]:
+				argv = sys.argv[2:]
+			else:
+				argv = sys.argv[1:]
 
-	def finalize_options(self):
-		pass
+			self.input_args = args.parse_cmd_args(argv)
+
+		def finalize_options(self):
+			pass
+
+		def run(self):
+			main(self.input_args)
 
-	def run(self):
-		main(self.input_args)
+	return CronlsCommand
 
 # -------------------------------------------------------------------- #
 
-def main(input_args):
-	crontab_l = process_crontab(input_args)
-	exec_l = calc_executed_crontabs(input_args, crontab_l)
+def __getattr__(name):
+	"""
+	Lazy module attributes (PEP 562): "CronlsCommand" is built on first access
+	"""
+	if name == 'CronlsCommand':
+		globals()[name] = make_cronls_command()
+		return globals()[name]
+
+	raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+# -------------------------------------------------------------------- #
+
+def load_numpy_engine():
+	"""
+	Return the NumPy engine module (see :mod:`cronls.numpy_engine`), or None
+	(with a warning) if NumPy is not installed
+	"""
+	try:
+		try:
+			import cronls.numpy_engine as numpy_engine
+		except ImportError:
+			import numpy_engine
+	except ImportError:
+		print_error('cronls: NumPy is not installed, using the python engine')
+		return None
+
+	return numpy_engine
+
+# -------------------------------------------------------------------- #
+
+def print_report(input_args, crontab_l, stats=NULL_STATS):
+	"""
+	Compute and print the output selected by the command line arguments
+	"""
+
+	if input_args.heatmap:
+		with stats.stage('heatmap'):
+			print_heatmap(input_args, crontab_l)
+		return
+
+	if input_args.summarize:
+		with stats.stage('summarize'):
+			print_summaries(input_args, crontab_l, calc_summaries(input_args, crontab_l))
+		return
+
+	if input_args.count:
+		with stats.stage('count'):
+			print_counts(input_args, crontab_l, count_executed_crontabs(input_args, crontab_l))
+		return
+
+	max_user_length = max([len(rule.user) for rule in crontab_l])
+	max_host_length = None
+	if getattr(input_args, 'fleet', None):
+		max_host_length = max([len(rule.host) for rule in crontab_l])
+
+	engine = load_numpy_engine() if getattr(input_args, 'engine', 'python') == 'numpy' else None
+	jobs = getattr(input_args, 'jobs', 1)
+
+	if jobs > 1:
+		with stats.stage('print'):
+			exec_l = stats.timed(
+				'evaluate', iter_executed_shards(input_args, crontab_l, jobs, 'numpy' if engine else 'python'),
+				'executions generated')
+			printed = print_executed_crontabs(input_args, exec_l, max_user_length, max_host_length=max_host_length)
+
+	elif engine is not None:
+		with stats.stage('evaluate'):
+			exec_l = engine.calc_executed_crontabs(input_args, crontab_l)
+		stats.count('executions generated', len(exec_l))
+
+		with stats.stage('print'):
+			printed = print_executed_crontabs(input_args, exec_l, max_user_length, max_host_length=max_host_length)
+	else:
+		with stats.stage('print'):
+			exec_l = stats.timed('evaluate', iter_executed_crontabs(input_args, crontab_l), 'executions generated')
+			printed = print_executed_crontabs(input_args, exec_l, max_user_length, max_host_length=max_host_length)
+
+	stats.count('executions printed', printed)
+
+# -------------------------------------------------------------------- #
+
+def print_lookup(input_args, crontab_l):
+	"""
+	Print the answer of the "at" and "next" subcommands (see :class:`RuleIndex`)
+
+	Args:
+		input_args (argparse.Namespace): Command line arguments
+		crontab_l (list): Rules as returned by :func:`process_crontab`
+	"""
+	index = RuleIndex(crontab_l)
+
+	if input_args.command == 'at':
+		ts = input_args.ts.replace(second=0, microsecond=0)
+		exec_l = [(ts, rule) for rule in index.rules_at(ts)]
+	else:
+		exec_l = index.next_runs(
+			input_args.from_time, input_args.runs, input_args.user, input_args.job)
+
 	print_executed_crontabs(input_args, exec_l)
 
 # -------------------------------------------------------------------- #
 
+def main(input_args):
+	if getattr(input_args, 'command', None) == 'serve':
+		try:
+			import cronls.serve as serve
+		except ImportError:
+			import serve
+
+		serve.serve(input_args)
+		return
+
+	if getattr(input_args, 'command', None) == 'reconcile':
+		try:
+			import cronls.reconcile as reconcile
+		except ImportError:
+			import reconcile
+
+		reconcile.reconcile(input_args, process_crontab(input_args))
+		return
+
+	if getattr(input_args, 'command', None) in ('at', 'next'):
+		crontab_l = process_crontab(input_args)
+		if crontab_l:
+			print_lookup(input_args, crontab_l)
+		return
+
+	if getattr(input_args, 'watch', False):
+		try:
+			import cronls.watch as watch
+		except ImportError:
+			import watch
+
+		watch.watch(input_args)
+		return
+
+	stats = Stats() if getattr(input_args, 'stats', False) else NULL_STATS
+
+	crontab_l = process_crontab(input_args, stats)
+
+	if stats:
+		stats.count('distinct schedules', len(group_by_schedule(crontab_l)))
+
+	if crontab_l:
+		print_report(input_args, crontab_l, stats)
+
+	stats.report()
+
+# -------------------------------------------------------------------- #
+
+def run(argv=None):
+	"""
+	Console script entry point
+
+	Args:
+		argv (list): Command line arguments (default sys.argv[1:])
+	"""
+	if argv is None:
+		argv = sys.argv[1:]
+
+	input_args = args.parse_cmd_args(argv)
+
+	if not getattr(input_args, 'profile', None):
+		main(input_args)
+		return
+
+	import cProfile
+
+	profiler = cProfile.Profile()
+	try:
+		profiler.runcall(main, input_args)
+	finally:
+		profiler.dump_stats(input_args.profile)
+
+# -------------------------------------------------------------------- #
+
 if __name__ == '__main__':
-	
-	in_args = args.parse_cmd_args(sys.argv[1:])
-	main(in_args)
+	run()
 
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module containing the "--fleet" mode: the crontabs of many hosts, collected
+in a directory as one snapshot per host, are analyzed together.
+
+Each snapshot is a directory or a tarball named after the host, containing
+the host files at their original paths (e.g. "web1/var/spool/cron/alice"
+and "web1/etc/crontab", or the same paths inside "web1.tar.gz"). The cron
+directory, the system crontab and its drop-ins are looked for at the
+"--cron-dir", "--sys-cron-file" and "--cron-d-dir" paths.
+"""
+
+import os
+import tarfile
+import posixpath
+
+try:
+	import cronls.cronls as cronls
+except ImportError:
+	# Executed as a script (e.g. "python cronls/cronls.py")
+	import cronls
+
+# Tarball extensions, removed to get the host name
+TARBALL_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+# ==================================================================== #
+
+def discover_snapshots(fleet_dir):
+	"""
+	Find the host snapshots in "fleet_dir".
+
+	Args:
+		fleet_dir (str): Directory containing the snapshots
+
+	Returns:
+		list: Sorted list of (host, path) pairs
+	"""
+	snapshots = []
+
+	for entry in os.scandir(fleet_dir):
+		if entry.is_dir():
+			snapshots.append((entry.name, entry.path))
+			continue
+
+		for suffix in TARBALL_SUFFIXES:
+			if entry.name.endswith(suffix) and entry.is_file():
+				snapshots.append((entry.name[:-len(suffix)], entry.path))
+				break
+
+	return sorted(snapshots)
+
+# -------------------------------------------------------------------- #
+
+def read_snapshot_dir(root, input_args):
+	"""
+	Read the crontabs of a directory snapshot.
+
+	Returns:
+		tuple: (c_files, list_dir), where "c_files" is a list of dictionaries
+			in the same form of :func:`cronls.get_crontab_files` and "list_dir" a
+			function listing the files of a snapshot directory (see
+			:func:`cronls.list_files`)
+	"""
+
+	def snapshot_path(path):
+		return os.path.join(root, path.lstrip('/'))
+
+	def list_dir(path):
+		return ['/' + os.path.relpath(f, root) for f in cronls.list_files(snapshot_path(path))]
+
+	c_files = []
+
+	cron_dir = snapshot_path(input_args.cron_dir)
+	if os.path.isdir(cron_dir):
+		for file in cronls.list_files(cron_dir, recursive=True):
+			c_files.append({'user': os.path.basename(file), 'rows': cronls.read_file(file)})
+
+	sys_cron_file = snapshot_path(input_args.sys_cron_file)
+	if input_args.system_cron and os.path.isfile(sys_cron_file):
+		c_files.append({'user': cronls.SYS_USER, 'system': 'sys', 'rows': cronls.read_file(sys_cron_file)})
+
+	if input_args.system_cron:
+		for c_file in cronls.list_cron_d_files(snapshot_path(input_args.cron_d_dir)):
+			c_file['rows'] = cronls.read_file(c_file.pop('path'))
+			c_files.append(c_file)
+
+	return c_files, list_dir
+
+# -------------------------------------------------------------------- #
+
+def read_snapshot_tarball(path, host, input_args):
+	"""
+	Read the crontabs of a tarball snapshot, in a single pass over the
+	(compressed) stream and without extracting anything to disk. Member paths
+	can also start with a "<host>/" directory.
+
+	Returns:
+		tuple: Same as :func:`read_snapshot_dir`
+	"""
+	cron_dir = input_args.cron_dir.rstrip('/') + '/'
+	sys_cron_file = input_args.sys_cron_file
+	cron_d_dir = posixpath.normpath('/' + input_args.cron_d_dir.lstrip('/'))
+
+	crontabs = []
+	sys_rows = None
+	cron_d_rows = {}
+	dirs = {}
+
+	with tarfile.open(path, mode='r|*') as tar:
+		for member in tar:
+			if not member.isfile():
+				continue
+
+			name = member.name
+			while name.startswith('./'):
+				name = name[2:]
+			name = posixpath.normpath(name.lstrip('/'))
+			if name.startswith(host + '/'):
+				name = name[len(host) + 1:]
+			name = '/' + name
+
+			dirs.setdefault(posixpath.dirname(name), []).append(name)
+
+			if name.startswith(cron_dir):
+				rows = tar.extractfile(member).read().decode('utf-8', 'replace').splitlines(True)
+				crontabs.append((name, rows))
+			elif name == sys_cron_file and input_args.system_cron:
+				sys_rows = tar.extractfile(member).read().decode('utf-8', 'replace').splitlines(True)
+			elif posixpath.dirname(name) == cron_d_dir and input_args.system_cron:
+				cron_d_rows[name] = tar.extractfile(member).read().decode('utf-8', 'replace').splitlines(True)
+
+	def list_dir(path):
+		path = posixpath.normpath('/' + path.lstrip('/'))
+		if path not in dirs:
+			raise OSError('No such directory in the %s snapshot' % host)
+		return sorted(dirs[path])
+
+	# Same order of cronls.list_files()
+	c_files = [{'user': posixpath.basename(name), 'rows': rows} for name, rows in sorted(crontabs)]
+	if sys_rows is not None:
+		c_files.append({'user': cronls.SYS_USER, 'system': 'sys', 'rows': sys_rows})
+
+	if input_args.system_cron:
+		for c_file in cronls.list_cron_d_files(cron_d_dir, list_dir):
+			c_file['rows'] = cron_d_rows[c_file.pop('path')]
+			c_files.append(c_file)
+
+	return c_files, list_dir
+
+# -------------------------------------------------------------------- #
+
+def parse_snapshot(task):
+	"""
+	Read and parse a host snapshot (run in a process pool worker).
+
+	Args:
+		task (tuple): (host, path, input_args)
+
+	Returns:
+		tuple: (rules, files), where "rules" is the list of the host
+			:class:`cronls.CronRule` objects (with the host set) and "files" the
+			number of crontab files
+	"""
+	host, path, input_args = task
+
+	try:
+		if os.path.isdir(path):
+			c_files, list_dir = read_snapshot_dir(path, input_args)
+		else:
+			c_files, list_dir = read_snapshot_tarball(path, host, input_args)
+	except (OSError, tarfile.TarError) as e:
+		cronls.print_error('Ignored snapshot %r (%s)' % (path, e))
+		return [], 0
+
+	rules = []
+	for c_file in c_files:
+		processed_cron = cronls.parse_crontab_file(c_file)
+		rules.extend(cronls.finalize_crontab_file(input_args, c_file, processed_cron, list_dir))
+
+	for rule in rules:
+		rule.host = host
+
+	return rules, len(c_files)
+
+# ==================================================================== #
+
+def process_fleet(input_args, stats=cronls.NULL_STATS):
+	"""
+	Same as :func:`cronls.process_crontab` for the snapshots in the "--fleet"
+	directory, parsed by a pool of "--jobs" processes (one per CPU if
+	"--jobs" is 0, serially if it is 1).
+
+	The rules of all the hosts are returned together, in hosts order: rules
+	with the same schedule are evaluated once, whatever their host (see
+	:func:`cronls.group_by_schedule`).
+
+	Args:
+		input_args (argparse.Namespace): Command line arguments
+		stats (cronls.Stats): Statistics collector
+
+	Returns:
+		list: List of :class:`cronls.CronRule` objects
+	"""
+	import concurrent.futures
+
+	snapshots = discover_snapshots(input_args.fleet)
+	stats.count('hosts', len(snapshots))
+
+	jobs = getattr(input_args, 'jobs', 1)
+	if jobs == 0:
+		jobs = os.cpu_count() or 1
+
+	tasks = [(host, path, input_args) for host, path in snapshots]
+
+	with stats.stage('parse'):
+		if len(tasks) > 1 and jobs > 1:
+			with concurrent.futures.ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as executor:
+				results = list(executor.map(parse_snapshot, tasks))
+		else:
+			results = [parse_snapshot(task) for task in tasks]
+
+	crontab_l = []
+	files = 0
+	for rules, n in results:
+		crontab_l.extend(rules)
+		files += n
+
+	stats.count('files', files)
+	stats.count('rules kept', len(crontab_l))
+
+	return crontab_l
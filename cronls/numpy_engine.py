@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module containing the NumPy evaluation engine ("--engine numpy"), faster than
+the python one on long windows. Importing it raises ImportError if NumPy is
+not installed (see :func:`cronls.load_numpy_engine`).
+"""
+
+import array
+
+import numpy
+
+try:
+	import cronls.cronls as cronls
+except ImportError:
+	# Executed as a script (e.g. "python cronls/cronls.py")
+	import cronls
+
+# ==================================================================== #
+
+def bitmask_table(mask, size):
+	"""
+	Return the boolean lookup table of a bitmask: table[v] is True if bit "v"
+	of "mask" is set
+	"""
+	return numpy.array([bool(mask >> v & 1) for v in range(size)])
+
+# -------------------------------------------------------------------- #
+
+class WindowColumns(object):
+	"""
+	Calendar columns of a window, built once and shared by all the rules: the
+	month, day of month and day of week of each day, and the hour and minute
+	of each minute of the day.
+
+	Args:
+		start_minute (int): First minute of the window (minutes since EPOCH)
+		stop_minute (int): Last minute of the window (minutes since EPOCH)
+	"""
+
+	def __init__(self, start_minute, stop_minute):
+		self.start_minute = start_minute
+		self.stop_minute = stop_minute
+
+		# Days since EPOCH
+		self.days = numpy.arange(start_minute // 1440, stop_minute // 1440 + 1, dtype=numpy.int64)
+
+		dates = self.days.astype('datetime64[D]')
+		months = dates.astype('datetime64[M]')
+		self.mon = months.astype(numpy.int64) % 12 + 1
+		self.dom = (dates - months.astype('datetime64[D]')).astype(numpy.int64) + 1
+		# 1970-01-01 is a thursday (4), sunday is 0
+		self.dow = (self.days + 4) % 7
+
+		day_minutes = numpy.arange(1440)
+		self.hour = day_minutes // 60
+		self.minute = day_minutes % 60
+
+	def fire_minutes(self, rule):
+		"""
+		Return the sorted array of the minutes of the window (minutes since
+		EPOCH) in which "rule" is executed
+		"""
+		dom_ok = bitmask_table(rule.dom, 32)[self.dom]
+		dow_ok = bitmask_table(rule.dow, 7)[self.dow]
+
+		if rule.dom_star or rule.dow_star:
+			day_ok = dom_ok & dow_ok
+		else:
+			day_ok = dom_ok | dow_ok
+		day_ok &= bitmask_table(rule.mon, 13)[self.mon]
+
+		minute_ok = bitmask_table(rule.h, 24)[self.hour] & bitmask_table(rule.m, 60)[self.minute]
+
+		minutes = (
+			self.days[day_ok][:, numpy.newaxis] * 1440 + numpy.flatnonzero(minute_ok)[numpy.newaxis, :]
+		).ravel()
+
+		return minutes[(minutes >= self.start_minute) & (minutes <= self.stop_minute)]
+
+# ==================================================================== #
+
+def calc_executed_crontabs(input_args, crontab_l):
+	"""
+	Same as :func:`cronls.calc_executed_crontabs`, with the same result.
+
+	Each distinct schedule (see :func:`cronls.group_by_schedule`) is evaluated
+	once, as boolean masks built by indexing the window columns (see
+	:class:`WindowColumns`) with the lookup tables of its fields. The executions
+	of all the rules are then sorted at once by timestamp and rule index.
+
+	Args:
+		input_args (argparse.Namespace): Command line arguments
+		crontab_l (list): Rules as returned by :func:`cronls.process_crontab`
+
+	Returns:
+		cronls.Occurrences: The executions, sorted by timestamp
+	"""
+	# Seconds are ignored, as in cronls.iter_fire_times
+	start_minute = cronls.datetime_to_minute(input_args.start_time)
+	stop_minute = cronls.datetime_to_minute(input_args.stop_time)
+
+	occurrences = cronls.Occurrences(crontab_l)
+	if stop_minute < start_minute or not crontab_l:
+		return occurrences
+
+	columns = WindowColumns(start_minute, stop_minute)
+
+	minutes_l = []
+	rule_ids_l = []
+	for group in cronls.group_by_schedule(crontab_l):
+		minutes = columns.fire_minutes(group[0][1])
+		for index, rule in group:
+			minutes_l.append(minutes)
+			rule_ids_l.append(numpy.full(len(minutes), index, dtype=numpy.int64))
+
+	minutes = numpy.concatenate(minutes_l)
+	rule_ids = numpy.concatenate(rule_ids_l)
+	order = numpy.lexsort((rule_ids, minutes))
+
+	occurrences.minutes = array.array('l', minutes[order].astype(numpy.dtype('l')).tobytes())
+	occurrences.rule_ids = array.array('I', rule_ids[order].astype(numpy.dtype('I')).tobytes())
+
+	return occurrences
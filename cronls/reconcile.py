@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module containing the "reconcile" subcommand: the executions predicted in a
+window are compared with the ones logged by cron ("CMD" entries of
+/var/log/cron or syslog), reporting the missed, late and extra runs.
+
+Logs are memory-mapped and scanned with a single regular expression, and the
+predicted executions are generated on the fly: memory usage depends on the
+"--tolerance" only, whatever the log size and the window length.
+
+Log lines are in the form written by Vixie cron and cronie, with a classic or
+an ISO 8601 syslog timestamp:
+
+	May 20 08:17:01 host CRON[1234]: (root) CMD (   cd / && run-parts --report /etc/cron.hourly)
+	2016-05-20T08:17:01.000000+02:00 host CROND[1234]: (root) CMD (run-parts /etc/cron.hourly)
+"""
+
+import io
+import re
+import sys
+import mmap
+import heapq
+import datetime
+import collections
+
+try:
+	import cronls.cronls as cronls
+except ImportError:
+	# Executed as a script (e.g. "python cronls/cronls.py")
+	import cronls
+
+# "CMD" entries, from the daemon name to the end of the line: it starts with a
+# literal, so lines are skipped at C speed (the timestamp is read only for the
+# matching lines, see LogReader)
+CMD_RE = re.compile(rb' CROND?\[\d+\]: \(([^)\n]*)\) CMD \((.*)\)\r?$', re.MULTILINE)
+
+# Timestamp prefixes, truncated to the minute
+BSD_TS_LENGTH = len('May 20 08:17')
+ISO_TS_LENGTH = len('2016-05-20T08:17')
+
+# Logged commands are matched to the rules of the same user (see log_key())
+OK, LATE, MISSED, EXTRA = 'ok', 'late', 'missed', 'extra'
+
+TEXT_REPORT_FORMAT = '{ts} :: {status:6} :: {user:%(max_user_length)d} :: {text}\n'
+REPORT_HEADERS = {
+	'csv': 'ts,status,user,raw,cmd,ran\n',
+	'tsv': 'ts\tstatus\tuser\traw\tcmd\tran\n',
+}
+
+# ==================================================================== #
+
+def log_key(user, cmd):
+	"""
+	Return the key matching a logged command to its rules: the user without
+	the crontab label (e.g. "root" for "root[sys]") and the command without
+	the surrounding spaces
+	"""
+	return (user.partition('[')[0], cmd.strip())
+
+# -------------------------------------------------------------------- #
+
+class LogReader(object):
+	"""
+	Read the "CMD" entries of a cron log in a window.
+
+	Syslog classic timestamps have no year: it is the one of "stop_time", or
+	the previous one for dates after "stop_time" (e.g. a December log read in
+	January).
+
+	Args:
+		start_minute (int): First minute of the window (minutes since EPOCH)
+		stop_minute (int): Last minute of the window (minutes since EPOCH)
+		stop_time (datetime.datetime): End of the window (for the year of the
+			classic timestamps)
+	"""
+
+	def __init__(self, start_minute, stop_minute, stop_time):
+		self.start_minute = start_minute
+		self.stop_minute = stop_minute
+		self.stop_time = stop_time
+
+		# Lines of the same minute are consecutive: only the last timestamp
+		# is remembered
+		self.last_prefix = None
+		self.last_minute = None
+
+	# -------------------------------------------------------------------- #
+
+	def parse_minute(self, prefix):
+		"""
+		Convert a timestamp prefix (see BSD_TS_LENGTH and ISO_TS_LENGTH) to
+		minutes since EPOCH (None if it is not valid)
+		"""
+		try:
+			if prefix[:1].isdigit():
+				ts = datetime.datetime.strptime(prefix.decode('ascii'), '%Y-%m-%dT%H:%M')
+			else:
+				ts = datetime.datetime.strptime(
+					'%d %s' % (self.stop_time.year, prefix.decode('ascii')), '%Y %b %d %H:%M')
+				if ts > self.stop_time + datetime.timedelta(1):
+					ts = ts.replace(year=ts.year - 1)
+		except ValueError:
+			# Also UnicodeDecodeError, and February 29 of the previous year
+			return None
+
+		return cronls.datetime_to_minute(ts)
+
+	# -------------------------------------------------------------------- #
+
+	def iter_commands(self, data):
+		"""
+		Generate the "CMD" entries of a log content in the window
+
+		Args:
+			data (bytes): Log content (also a mmap object)
+
+		Yields:
+			tuple: (minute, key) pairs, where "key" is the one of :func:`log_key`
+		"""
+		for match in CMD_RE.finditer(data):
+			line_start = data.rfind(b'\n', 0, match.start()) + 1
+
+			if data[line_start:line_start + 1].isdigit():
+				prefix = data[line_start:line_start + ISO_TS_LENGTH]
+			else:
+				prefix = data[line_start:line_start + BSD_TS_LENGTH]
+
+			if prefix != self.last_prefix:
+				self.last_prefix = prefix
+				self.last_minute = self.parse_minute(prefix)
+
+			minute = self.last_minute
+			if minute is None or not self.start_minute <= minute <= self.stop_minute:
+				continue
+
+			user, cmd = match.groups()
+			yield minute, log_key(user.decode('utf-8', 'replace'), cmd.decode('utf-8', 'replace'))
+
+	# -------------------------------------------------------------------- #
+
+	def iter_file(self, path):
+		"""
+		Same as :meth:`iter_commands` for a log file, memory-mapped: the file
+		pages are read on demand and can be dropped by the kernel at any time
+		"""
+		with open(path, 'rb') as f:
+			try:
+				data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+			except ValueError:
+				# Empty file
+				return
+
+			with data:
+				if hasattr(data, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+					data.madvise(mmap.MADV_SEQUENTIAL)
+
+				yield from self.iter_commands(data)
+
+# ==================================================================== #
+
+def reconcile_runs(predicted, logged, tolerance, stop_minute):
+	"""
+	Merge-join the predicted executions with the logged ones, both in
+	chronological order.
+
+	A logged command matches the unmatched prediction of the same key in its
+	own minute (on time) or, if there is none, the oldest one at most
+	"tolerance" minutes before it (late): a missed run doesn't shift the
+	matches of the following ones. Predictions not matched within "tolerance"
+	minutes are missed, logged commands matching no prediction are extra.
+	Only the predictions of the last "tolerance" minutes are kept in memory.
+
+	Args:
+		predicted (iterable): (minute, key, rule) triplets
+		logged (iterable): (minute, key) pairs, up to "stop_minute" plus
+			"tolerance" (for the late runs of the last predictions)
+		tolerance (int): Max delay in minutes
+		stop_minute (int): Last minute of the window: later logged commands
+			are never extra
+
+	Yields:
+		tuple: (status, minute, key, rule, ran), where "status" is one of OK,
+			LATE, MISSED and EXTRA, "minute" is the scheduled minute (logged
+			minute for EXTRA), "rule" is None for EXTRA and "ran" is the logged
+			minute (None for MISSED)
+	"""
+	events = heapq.merge(
+		((minute, 0, key, rule) for minute, key, rule in predicted),
+		((minute, 1, key, None) for minute, key in logged),
+		# Predictions first, in the same minute
+		key=lambda event: event[:2])
+
+	# Unmatched (or not yet expired) predictions: [minute, key, rule, matched]
+	pending = collections.deque()
+	pending_by_key = {}
+
+	def expire(minute):
+		while pending and pending[0][0] < minute:
+			entry = pending.popleft()
+			if not entry[3]:
+				queue = pending_by_key[entry[1]]
+				queue.popleft()
+				if not queue:
+					del pending_by_key[entry[1]]
+				yield MISSED, entry[0], entry[1], entry[2], None
+
+	for minute, is_logged, key, rule in events:
+		yield from expire(minute - tolerance)
+
+		if not is_logged:
+			entry = [minute, key, rule, False]
+			pending.append(entry)
+			pending_by_key.setdefault(key, collections.deque()).append(entry)
+			continue
+
+		queue = pending_by_key.get(key)
+		if queue:
+			# Predictions of this minute are the last ones
+			if queue[-1][0] == minute:
+				entry = queue.pop()
+			else:
+				entry = queue.popleft()
+			if not queue:
+				del pending_by_key[key]
+			entry[3] = True
+			yield (OK if entry[0] == minute else LATE), entry[0], key, entry[2], minute
+		elif minute <= stop_minute:
+			yield EXTRA, minute, key, None, minute
+
+	# Logs are over: everything still pending is missed
+	yield from expire(float('inf'))
+
+# -------------------------------------------------------------------- #
+
+def iter_predicted(input_args, crontab_l):
+	"""
+	Generate the predicted executions of the [start_time, stop_time] window
+
+	Yields:
+		tuple: (minute, key, rule) triplets, see :func:`reconcile_runs`
+	"""
+	keys = dict((id(rule), log_key(rule.user, rule.cmd)) for rule in crontab_l)
+
+	for ts, rule in cronls.iter_executed_crontabs(input_args, crontab_l):
+		yield cronls.datetime_to_minute(ts), keys[id(rule)], rule
+
+# -------------------------------------------------------------------- #
+
+def iter_logged(input_args, start_minute, stop_minute):
+	"""
+	Generate the "CMD" entries of the "--log" files in the [start_minute,
+	stop_minute] window, in chronological order (rotated files can be given in
+	any order)
+
+	Yields:
+		tuple: (minute, key) pairs, see :func:`reconcile_runs`
+	"""
+	streams = []
+	for path in input_args.logs:
+		reader = LogReader(start_minute, stop_minute, input_args.stop_time)
+		streams.append(reader.iter_file(path))
+
+	return heapq.merge(*streams, key=lambda entry: entry[0])
+
+# ==================================================================== #
+
+def format_report_line(output_format, status, minute, key, rule, ran, max_user_length):
+	"""
+	Return an output line of :func:`reconcile`, "\\n" included
+	"""
+	ts = cronls.minute_to_datetime(minute).strftime(cronls.OUTPUT_TS_FORMATS['csv'])
+	ran_ts = None if ran is None else cronls.minute_to_datetime(ran).strftime(cronls.OUTPUT_TS_FORMATS['csv'])
+
+	if rule is None:
+		user, raw, cmd = key[0], '', key[1]
+	else:
+		user, raw, cmd = rule.user, rule.raw, rule.cmd
+
+	if output_format == 'text':
+		if status == EXTRA:
+			text = cmd
+		elif status == LATE:
+			text = '%s (ran at %s, +%d min)' % (raw, ran_ts[-5:], ran - minute)
+		else:
+			text = raw
+		return (TEXT_REPORT_FORMAT % vars()).format(ts=ts, status=status, user=user, text=text)
+
+	if output_format == 'jsonl':
+		import json
+		return json.dumps({
+			'ts': ts.replace(' ', 'T'), 'status': status, 'user': user, 'raw': raw, 'cmd': cmd,
+			'ran': ran_ts and ran_ts.replace(' ', 'T'),
+		}) + '\n'
+
+	import csv
+
+	buf = io.StringIO()
+	csv.writer(buf, delimiter=',' if output_format == 'csv' else '\t', lineterminator='\n').writerow(
+		[ts, status, user, raw, cmd, ran_ts or ''])
+	return buf.getvalue()
+
+# -------------------------------------------------------------------- #
+
+def reconcile(input_args, crontab_l, out=None):
+	"""
+	Print the missed, late and extra runs of the [start_time, stop_time]
+	window, followed (text format only) by the counts of each status.
+
+	Args:
+		input_args (argparse.Namespace): Command line arguments
+		crontab_l (list): Rules as returned by :func:`cronls.process_crontab`
+		out (file): Output file (default sys.stdout)
+
+	Returns:
+		collections.Counter: Number of executions of each status
+	"""
+	if out is None:
+		out = sys.stdout
+
+	output_format = getattr(input_args, 'output_format', 'text')
+	start_minute = cronls.datetime_to_minute(input_args.start_time)
+	stop_minute = cronls.datetime_to_minute(input_args.stop_time)
+	tolerance = input_args.tolerance
+
+	max_user_length = max([len(rule.user) for rule in crontab_l] or [0])
+
+	counts = collections.Counter()
+	chunk = [REPORT_HEADERS[output_format]] if output_format in REPORT_HEADERS else []
+
+	runs = reconcile_runs(
+		iter_predicted(input_args, crontab_l),
+		iter_logged(input_args, start_minute, stop_minute + tolerance),
+		tolerance, stop_minute)
+
+	for status, minute, key, rule, ran in runs:
+		counts[status] += 1
+		if status == OK:
+			continue
+
+		chunk.append(format_report_line(output_format, status, minute, key, rule, ran, max_user_length))
+		if len(chunk) >= cronls.OUTPUT_CHUNK_LINES:
+			out.write(''.join(chunk))
+			chunk = []
+
+	if output_format == 'text':
+		chunk.append('# %d scheduled: %d on time, %d late, %d missed; %d extra\n' % (
+			counts[OK] + counts[LATE] + counts[MISSED], counts[OK], counts[LATE], counts[MISSED], counts[EXTRA]))
+
+	out.write(''.join(chunk))
+	out.flush()
+
+	return counts
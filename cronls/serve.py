@@ -0,0 +1,407 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module containing the "serve" subcommand: the crontabs are loaded once and
+queries about their executions are answered on a Unix socket.
+
+The protocol is line-delimited JSON: each request is a JSON object on a line,
+with an "op" key, and each response is a JSON object on a line, with an "ok"
+key and either a "result" or an "error" key. Timestamps are in the
+"YYYY-MM-DDTHH:MM" format. Requests:
+
+	{"op": "occurrences", "from": TS, "to": TS[, "user": U][, "job": J][, "limit": N]}
+		Executions in the [from, to] window, in chronological order
+	{"op": "next"[, "from": TS][, "user": U][, "job": J][, "n": N]}
+		First N executions after "from" (default now)
+	{"op": "at", "ts": TS[, "user": U][, "job": J]}
+		Rules executed at TS
+	{"op": "reload"}
+		Read the crontabs again
+
+"user" selects the rules of a user, "job" the rules whose command contains
+the given string. Executions are objects with "ts", "user", "raw" and "cmd"
+keys, rules the same without "ts".
+"""
+
+import os
+import sys
+import json
+import stat
+import argparse
+import signal
+import socket
+import datetime
+import functools
+import itertools
+import socketserver
+
+try:
+	import cronls.cronls as cronls
+except ImportError:
+	# Executed as a script (e.g. "python cronls/cronls.py")
+	import cronls
+
+# Timestamps format in requests and responses
+TS_FORMAT = '%Y-%m-%dT%H:%M'
+
+# Max number of executions returned by a query
+MAX_RESULTS = 10000
+
+# Number of executions returned by "next" queries without "n"
+DEFAULT_NEXT_RUNS = 10
+
+# ==================================================================== #
+
+class QueryError(ValueError):
+	"""
+	Invalid query
+	"""
+	pass
+
+# -------------------------------------------------------------------- #
+
+def parse_ts(value, name):
+	"""
+	Convert the "name" request field to a datetime (truncated to the minute).
+
+	Args:
+		value (str): "now", "YYYY-MM-DDTHH:MM[:SS]" or "YYYY-MM-DD"
+		name (str): Field name (for error messages)
+
+	Returns:
+		datetime.datetime: The timestamp
+
+	Raises:
+		QueryError
+	"""
+	if value == 'now':
+		return datetime.datetime.now().replace(second=0, microsecond=0)
+
+	for ts_format in (TS_FORMAT, TS_FORMAT + ':%S', '%Y-%m-%d'):
+		try:
+			return datetime.datetime.strptime(str(value), ts_format).replace(second=0)
+		except ValueError:
+			pass
+
+	raise QueryError('"%(name)s": invalid timestamp %(value)r' % vars())
+
+# -------------------------------------------------------------------- #
+
+def parse_count(value, name):
+	"""
+	Check the "name" request field is a count between 1 and MAX_RESULTS
+
+	Raises:
+		QueryError
+	"""
+	if not isinstance(value, int) or isinstance(value, bool) or not 1 <= value <= MAX_RESULTS:
+		raise QueryError('"%s": must be an integer between 1 and %d' % (name, MAX_RESULTS))
+	return value
+
+# -------------------------------------------------------------------- #
+
+def rule_object(rule):
+	return {'user': rule.user, 'raw': rule.raw, 'cmd': rule.cmd}
+
+def execution_object(ts, rule):
+	return {'ts': ts.strftime(TS_FORMAT), 'user': rule.user, 'raw': rule.raw, 'cmd': rule.cmd}
+
+# ==================================================================== #
+
+class QueryEngine(object):
+	"""
+	Answer queries on the rules returned by :func:`cronls.process_crontab`,
+	keeping the responses of the most recent queries in a LRU cache.
+
+	The rules, their index and the cache of their responses are a single
+	"state" tuple (see :meth:`make_state`), replaced at once by
+	:meth:`reload`: a query running during a reload is answered entirely from
+	the old rules or entirely from the new ones, and never cached with the
+	others.
+
+	Args:
+		input_args (argparse.Namespace): Command line arguments
+		cache_size (int): Number of cached responses
+	"""
+
+	def __init__(self, input_args, cache_size=1024):
+		self.input_args = input_args
+		self.cache_size = cache_size
+		self.state = self.make_state([])
+
+		self.reload()
+
+	# -------------------------------------------------------------------- #
+
+	def make_state(self, crontab_l):
+		"""
+		Return the (crontab_l, index, answer) state of a list of rules, where
+		"answer" is :meth:`run_query` on them with its own LRU cache
+		"""
+		index = cronls.RuleIndex(crontab_l)
+		answer = functools.lru_cache(maxsize=self.cache_size)(functools.partial(self.run_query, crontab_l, index))
+		return (crontab_l, index, answer)
+
+	# -------------------------------------------------------------------- #
+
+	@property
+	def crontab_l(self):
+		"""Rules of the current state"""
+		return self.state[0]
+
+	@property
+	def answer(self):
+		"""Cached :meth:`run_query` of the current state"""
+		return self.state[2]
+
+	# -------------------------------------------------------------------- #
+
+	def reload(self):
+		"""
+		Read the crontabs again, replacing the rules and emptying the cache
+
+		Returns:
+			dict: {'rules': <number of loaded rules>}
+		"""
+		state = self.make_state(cronls.process_crontab(self.input_args))
+		self.state = state
+		return {'rules': len(state[0])}
+
+	# -------------------------------------------------------------------- #
+
+	@staticmethod
+	def select_rules(crontab_l, user=None, job=None):
+		"""
+		Return the rules of "user" whose command contains "job" (None matches
+		everything)
+		"""
+		return [
+			rule for rule in crontab_l
+			if (user is None or rule.user == user) and (job is None or job in rule.cmd)
+		]
+
+	# -------------------------------------------------------------------- #
+
+	def occurrences(self, crontab_l, start_time, stop_time, user=None, job=None, limit=MAX_RESULTS):
+		"""
+		Return the executions of "crontab_l" in the [start_time, stop_time]
+		window
+
+		Returns:
+			tuple: (executions, truncated), where "executions" is a list of
+				(ts, rule) pairs and "truncated" is True if there are more than
+				"limit" executions
+		"""
+		window = argparse.Namespace(start_time=start_time, stop_time=stop_time)
+		exec_l = list(itertools.islice(
+			cronls.iter_executed_crontabs(window, self.select_rules(crontab_l, user, job)), limit + 1))
+		return exec_l[:limit], len(exec_l) > limit
+
+	# -------------------------------------------------------------------- #
+
+	def next_runs(self, index, start_time, user=None, job=None, n=DEFAULT_NEXT_RUNS):
+		"""
+		Return the first "n" executions of the "index" rules from "start_time"
+		on
+
+		Returns:
+			list: (ts, rule) pairs
+		"""
+		return index.next_runs(start_time, n, user, job)
+
+	# -------------------------------------------------------------------- #
+
+	def fired_at(self, index, ts, user=None, job=None):
+		"""
+		Return the "index" rules executed at "ts"
+		"""
+		return [
+			rule for rule in index.rules_at(ts)
+			if (user is None or rule.user == user) and (job is None or job in rule.cmd)
+		]
+
+	# -------------------------------------------------------------------- #
+
+	def canonical_query(self, request):
+		"""
+		Validate a request and convert it to a hashable key, with relative
+		timestamps resolved (so that the same query in the same minute is
+		answered from the cache)
+
+		Raises:
+			QueryError
+		"""
+		if not isinstance(request, dict):
+			raise QueryError('Request must be a JSON object')
+
+		op = request.get('op')
+		user = request.get('user')
+		job = request.get('job')
+
+		for name, value in (('user', user), ('job', job)):
+			if value is not None and not isinstance(value, str):
+				raise QueryError('"%(name)s": must be a string' % vars())
+
+		if op == 'occurrences':
+			start_time = parse_ts(request.get('from'), 'from')
+			stop_time = parse_ts(request.get('to'), 'to')
+			limit = parse_count(request.get('limit', MAX_RESULTS), 'limit')
+			return (op, start_time, stop_time, user, job, limit)
+
+		if op == 'next':
+			start_time = parse_ts(request.get('from', 'now'), 'from')
+			n = parse_count(request.get('n', DEFAULT_NEXT_RUNS), 'n')
+			return (op, start_time, user, job, n)
+
+		if op == 'at':
+			return (op, parse_ts(request.get('ts'), 'ts'), user, job)
+
+		raise QueryError('Unknown op %(op)r' % vars())
+
+	# -------------------------------------------------------------------- #
+
+	def run_query(self, crontab_l, index, query):
+		"""
+		Answer a query returned by :meth:`canonical_query` on "crontab_l"
+		(indexed by "index")
+
+		Returns:
+			bytes: The encoded response line
+		"""
+		op = query[0]
+
+		if op == 'occurrences':
+			exec_l, truncated = self.occurrences(crontab_l, *query[1:])
+			response = {
+				'ok': True,
+				'result': [execution_object(ts, rule) for ts, rule in exec_l],
+				'truncated': truncated,
+			}
+		elif op == 'next':
+			exec_l = self.next_runs(index, *query[1:])
+			response = {'ok': True, 'result': [execution_object(ts, rule) for ts, rule in exec_l]}
+		else:
+			response = {'ok': True, 'result': [rule_object(rule) for rule in self.fired_at(index, *query[1:])]}
+
+		return json.dumps(response).encode('utf-8') + b'\n'
+
+	# -------------------------------------------------------------------- #
+
+	def handle(self, line):
+		"""
+		Answer a request line
+
+		Args:
+			line (bytes): JSON request
+
+		Returns:
+			bytes: The encoded response line
+		"""
+		try:
+			request = json.loads(line.decode('utf-8'))
+
+			if isinstance(request, dict) and request.get('op') == 'reload':
+				response = {'ok': True, 'result': self.reload()}
+			else:
+				return self.answer(self.canonical_query(request))
+
+		except (ValueError, UnicodeDecodeError, OverflowError) as e:
+			# Also QueryError and json errors, and timestamps out of the
+			# datetime range
+			response = {'ok': False, 'error': str(e)}
+
+		return json.dumps(response).encode('utf-8') + b'\n'
+
+# ==================================================================== #
+
+class QueryHandler(socketserver.StreamRequestHandler):
+	"""
+	Answer the requests of a connection, one per line
+	"""
+
+	def handle(self):
+		for line in self.rfile:
+			if line.strip():
+				self.wfile.write(self.server.engine.handle(line))
+
+# -------------------------------------------------------------------- #
+
+def make_server(socket_path, engine):
+	"""
+	Create the server listening on "socket_path", replacing a stale socket.
+	The socket is accessible by the current user only, as the responses
+	expose the crontabs of every user.
+
+	Args:
+		socket_path (str): Unix socket path
+		engine (QueryEngine): Engine answering the queries
+
+	Returns:
+		socketserver.ThreadingUnixStreamServer: The server
+	"""
+	try:
+		if stat.S_ISSOCK(os.stat(socket_path).st_mode):
+			os.unlink(socket_path)
+	except OSError:
+		pass
+
+	old_umask = os.umask(0o177)
+	try:
+		server = socketserver.ThreadingUnixStreamServer(socket_path, QueryHandler)
+	finally:
+		os.umask(old_umask)
+
+	server.daemon_threads = True
+	server.engine = engine
+	return server
+
+# -------------------------------------------------------------------- #
+
+def query(socket_path, request, timeout=None):
+	"""
+	Send a request to a running server and return the response
+
+	Args:
+		socket_path (str): Unix socket path
+		request (dict): The request
+		timeout (float): Socket timeout in seconds
+
+	Returns:
+		dict: The response
+	"""
+	with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+		sock.settimeout(timeout)
+		sock.connect(socket_path)
+		with sock.makefile('rwb') as f:
+			f.write(json.dumps(request).encode('utf-8') + b'\n')
+			f.flush()
+			return json.loads(f.readline().decode('utf-8'))
+
+# -------------------------------------------------------------------- #
+
+def serve(input_args):
+	"""
+	Answer queries on the "--socket" Unix socket until interrupted. SIGHUP
+	reloads the crontabs.
+
+	Args:
+		input_args (argparse.Namespace): Command line arguments
+	"""
+	engine = QueryEngine(input_args, input_args.query_cache_size)
+	server = make_server(input_args.socket, engine)
+
+	if hasattr(signal, 'SIGHUP'):
+		signal.signal(signal.SIGHUP, lambda signum, frame: engine.reload())
+
+	print('cronls: %d rules loaded, listening on %s' % (len(engine.crontab_l), input_args.socket), file=sys.stderr)
+
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+		try:
+			os.unlink(input_args.socket)
+		except OSError:
+			pass
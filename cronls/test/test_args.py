@@ -85,6 +85,25 @@ class TestCommandLineArgs:
 	def test_times_3(self):
 		args = parse_args("--all")
 
+	def test_commands(self):
+		assert parse_args("").command is None
+
+		args = parse_args("next 16/04/10 -n 3 -u alice -f jsonl")
+		assert args.command == 'next'
+		assert cmp_datetimes(args.from_time, datetime.datetime(2016,4,10))
+		assert (args.runs, args.user, args.job, args.output_format) == (3, 'alice', None, 'jsonl')
+		assert args.max_hourly_repetitions == 60
+
+		args = parse_args("at 16/04/10-10:10 -r 4")
+		assert args.command == 'at'
+		assert cmp_datetimes(args.ts, datetime.datetime(2016,4,10,10,10))
+		assert args.max_hourly_repetitions == 4
+		assert parse_args("at 16/04/10-10:10").max_hourly_repetitions == 60
+
+		args = parse_args("reconcile 16/04/10 16/04/11 -l %s --tolerance 2" % __file__)
+		assert args.command == 'reconcile'
+		assert cmp_datetimes(args.stop_time, datetime.datetime(2016,4,11))
+		assert (args.logs, args.tolerance, args.max_hourly_repetitions) == ([__file__], 2, 60)
 
 # ==================================================================== #
 
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import cronls.cronls
+from benchmarks import generator
+
+# ==================================================================== #
+
+class TestGenerator:
+	"""
+	Tests for the benchmarks crontab generator
+	"""
+
+	def read_spool(self, path):
+		cron_dir = os.path.join(path, 'crontabs')
+		return dict((name, open(os.path.join(cron_dir, name)).read()) for name in os.listdir(cron_dir))
+
+	def test_deterministic(self, tmp_path):
+		generator.generate_spool(str(tmp_path / 'a'), users=3, rules=20, seed=1)
+		generator.generate_spool(str(tmp_path / 'b'), users=3, rules=20, seed=1)
+
+		spool = self.read_spool(str(tmp_path / 'a'))
+		assert len(spool) == 3
+		assert spool == self.read_spool(str(tmp_path / 'b'))
+
+	def test_valid_rows(self, tmp_path):
+		cron_dir, sys_cron_file = generator.generate_spool(str(tmp_path), users=5, rules=50)
+
+		for name in os.listdir(cron_dir):
+			errors = []
+			with open(os.path.join(cron_dir, name)) as f:
+				rules = cronls.cronls.analyze_cron_file(name, f.readlines(), errors)
+			assert errors == []
+			assert len(rules) == 50
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+import cronls.cache
+
+# ==================================================================== #
+
+class TestParseCache:
+	"""
+	Tests for the persistent parse cache
+	"""
+
+	def test_get_put(self, tmp_path):
+		path = str(tmp_path / 'cache')
+
+		c = cronls.cache.ParseCache(path, version=1)
+		c.put('/a', (1, 2, 3), ('value',))
+		assert c.get('/a', (1, 2, 3)) == ('value',)
+		assert c.get('/a', (1, 2, 4)) is None
+		assert c.get('/b', (1, 2, 3)) is None
+		c.save()
+
+		assert cronls.cache.ParseCache(path, version=1).get('/a', (1, 2, 3)) == ('value',)
+
+		# A different version discards the whole cache
+		assert cronls.cache.ParseCache(path, version=2).get('/a', (1, 2, 3)) is None
+
+	def test_file_key(self, tmp_path):
+		f = tmp_path / 'f'
+		f.write_text('x')
+		key = cronls.cache.file_key(str(f))
+		f.write_text('xy')
+		assert cronls.cache.file_key(str(f)) != key
+		assert cronls.cache.file_key(str(tmp_path / 'missing')) is None
+
+	def test_eviction(self, tmp_path):
+		path = str(tmp_path / 'cache')
+
+		c = cronls.cache.ParseCache(path, max_size=3000)
+		for i in range(10):
+			c.put('/f%d' % i, (i,), '%d' % i * 500)
+		c.save()
+
+		c = cronls.cache.ParseCache(path)
+		assert (tmp_path / 'cache').stat().st_size <= 3000
+		assert c.get('/f0', (0,)) is None
+		assert c.get('/f9', (9,)) == '9' * 500
+
+	def test_eviction_lru(self, tmp_path):
+		path = str(tmp_path / 'cache')
+
+		c = cronls.cache.ParseCache(path, max_size=3000)
+		for i in range(10):
+			c.put('/f%d' % i, (i,), '%d' % i * 500)
+		# The first entry is used again: the least recently used ones go
+		assert c.get('/f0', (0,)) == '0' * 500
+		c.save()
+
+		c = cronls.cache.ParseCache(path)
+		assert c.get('/f0', (0,)) == '0' * 500
+		assert c.get('/f1', (1,)) is None
+		assert c.get('/f9', (9,)) == '9' * 500
+
+	def test_corrupted(self, tmp_path):
+		(tmp_path / 'cache').write_bytes(b'garbage')
+		c = cronls.cache.ParseCache(str(tmp_path / 'cache'))
+		assert c.get('/a', (1,)) is None
@@ -1,5 +1,14 @@
 # -*- coding: utf-8 -*-
 
+import io
+import os
+import sys
+import csv
+import subprocess
+import json
+import datetime
+import pytest
+
 import cronls.args
 import cronls.cronls
 
@@ -21,6 +30,172 @@ class TestGetFiles:
 		l = cronls.cronls.get_crontab_files(input_args)
 		# TODO...
 
+	def test_cron_dir(self, tmp_path):
+		(tmp_path / 'crontabs').mkdir()
+		(tmp_path / 'crontabs' / 'alice').write_text('0 * * * * a\n')
+		(tmp_path / 'crontabs' / 'bob').write_text('1 * * * * b\n2 * * * * b\n')
+		(tmp_path / 'crontab').write_text('3 * * * * root c\n')
+		(tmp_path / 'cron.d').mkdir()
+		(tmp_path / 'cron.d' / 'php').write_text('4 * * * * www-data d\n')
+		(tmp_path / 'cron.d' / 'php.dpkg-old').write_text('5 * * * * www-data e\n')
+
+		input_args = cronls.args.parse_cmd_args([
+			'--all', '-d', str(tmp_path / 'crontabs'), '--sys-cron-file', str(tmp_path / 'crontab'),
+			'--cron-d-dir', str(tmp_path / 'cron.d')])
+		l = cronls.cronls.get_crontab_files(input_args)
+
+		assert [(c_file['user'], c_file['rows']) for c_file in l] == [
+			('alice', ['0 * * * * a\n']),
+			('bob', ['1 * * * * b\n', '2 * * * * b\n']),
+			(cronls.cronls.SYS_USER, ['3 * * * * root c\n']),
+			('cron.d/php', ['4 * * * * www-data d\n']),
+		]
+		assert [c_file.get('system') for c_file in l] == [None, None, 'sys', 'cron.d/php']
+
+		# No cron.d directory
+		input_args.cron_d_dir = str(tmp_path / 'missing')
+		assert len(cronls.cronls.get_crontab_files(input_args)) == 3
+
+	def test_system_crontabs(self, tmp_path):
+		(tmp_path / 'crontabs').mkdir()
+		(tmp_path / 'cron.hourly').mkdir()
+		(tmp_path / 'cron.hourly' / 'logrotate').write_text('')
+		(tmp_path / 'cron.hourly' / 'logrotate.dpkg-old').write_text('')
+		(tmp_path / 'crontab').write_text(
+			'SHELL=/bin/sh\n'
+			'17 * * * * root cd / && run-parts --report %s\n'
+			'25 6 * * * backup /usr/bin/backup --full\n'
+			'@reboot root /usr/bin/boot\n' % (tmp_path / 'cron.hourly'))
+		(tmp_path / 'cron.d').mkdir()
+		(tmp_path / 'cron.d' / 'php').write_text('@daily www-data php clean\n0 * * * * nocommand\n')
+
+		input_args = cronls.args.parse_cmd_args([
+			'--all', '--no-cache', '-d', str(tmp_path / 'crontabs'), '--sys-cron-file', str(tmp_path / 'crontab'),
+			'--cron-d-dir', str(tmp_path / 'cron.d')])
+		rules = cronls.cronls.process_crontab(input_args)
+
+		assert [(rule.user, rule.cmd) for rule in rules] == [
+			('root[sys]', str(tmp_path / 'cron.hourly' / 'logrotate')),
+			('backup[sys]', '/usr/bin/backup --full'),
+			('www-data[cron.d/php]', 'php clean'),
+		]
+
+	def test_run_parts_cache(self, tmp_path, monkeypatch):
+		parts = tmp_path / 'cron.daily'
+		parts.mkdir()
+		(parts / 'a').write_text('')
+		os.utime(str(parts), ns=(0, 10 ** 9))
+
+		parse_cache = cronls.cronls.cache.ParseCache(None)
+		assert cronls.cronls.list_run_parts(str(parts), parse_cache) == [str(parts / 'a')]
+
+		# Unchanged directory: not scanned again
+		scanned = []
+		list_files = cronls.cronls.list_files
+		monkeypatch.setattr(cronls.cronls, 'list_files', lambda path: scanned.append(path) or list_files(path))
+		assert cronls.cronls.list_run_parts(str(parts), parse_cache) == [str(parts / 'a')]
+		assert scanned == []
+
+		# A new script changes the directory modification time
+		(parts / 'b').write_text('')
+		os.utime(str(parts), ns=(0, 2 * 10 ** 9))
+		assert cronls.cronls.list_run_parts(str(parts), parse_cache) == [str(parts / 'a'), str(parts / 'b')]
+		assert scanned == [str(parts)]
+
+	def test_parse_cache(self, tmp_path, monkeypatch):
+		(tmp_path / 'crontabs').mkdir()
+		(tmp_path / 'crontabs' / 'alice').write_text('0 * * * * a\nbad row\n')
+		(tmp_path / 'crontabs' / 'bob').write_text('1 * * * * b\n')
+
+		input_args = cronls.args.parse_cmd_args([
+			'--all', '-s', '-d', str(tmp_path / 'crontabs'), '--cache-file', str(tmp_path / 'cache')])
+
+		cold = cronls.cronls.process_crontab(input_args)
+		assert [rule.raw for rule in cold] == ['0 * * * * a', '1 * * * * b']
+
+		# Warm run: nothing is read
+		read = []
+		monkeypatch.setattr(cronls.cronls, 'read_file', lambda f: read.append(f) or [])
+		warm = cronls.cronls.process_crontab(input_args)
+		assert [r.user for r in warm] == [r.user for r in cold]
+		assert [r.to_tuple() for r in warm] == [r.to_tuple() for r in cold]
+		assert read == []
+
+		# A rewritten file is read again
+		monkeypatch.undo()
+		(tmp_path / 'crontabs' / 'bob').unlink()
+		(tmp_path / 'crontabs' / 'bob').write_text('2 * * * * b2\n')
+		assert [rule.raw for rule in cronls.cronls.process_crontab(input_args)] == ['0 * * * * a', '2 * * * * b2']
+
+	def test_collect_crontab(self, tmp_path, monkeypatch, capsys):
+		# Fake "crontab -l -u USER"
+		fake = tmp_path / 'bin' / 'crontab'
+		fake.parent.mkdir()
+		fake.write_text(
+			'#!/bin/sh\n'
+			'case "$3" in\n'
+			'  alice) printf "0 * * * * a\\n1 * * * * b\\n" ;;\n'
+			'  bob) echo "no crontab for bob" >&2; exit 1 ;;\n'
+			'  bsd) echo "crontab: no crontab for bsd" >&2; exit 1 ;;\n'
+			'  carol) echo "crontab: must be privileged" >&2; exit 2 ;;\n'
+			'  erin) echo "sudo: a password is required" >&2; exit 1 ;;\n'
+			'  *) echo "2 * * * * $3" ;;\n'
+			'esac\n')
+		fake.chmod(0o755)
+		monkeypatch.setenv('PATH', str(fake.parent), prepend=os.pathsep)
+		monkeypatch.setattr(cronls.cronls, 'list_users', lambda: ['alice', 'bob', 'bsd', 'carol', 'dave', 'erin'])
+
+		input_args = cronls.args.parse_cmd_args(['--all', '-s', '--collect', 'crontab', '--collect-workers', '2'])
+		l = cronls.cronls.get_crontab_files(input_args)
+
+		assert [(c_file['user'], c_file['rows']) for c_file in l] == [
+			('alice', ['0 * * * * a', '1 * * * * b']),
+			('dave', ['2 * * * * dave']),
+		]
+
+		# Only the real errors are reported
+		errors = capsys.readouterr().err
+		assert 'carol' in errors and 'sudo: a password is required' in errors
+		assert 'bob' not in errors and 'bsd' not in errors
+
+		input_args.crontab_command = str(tmp_path / 'missing')
+		with pytest.raises(NotImplementedError):
+			cronls.cronls.get_crontab_files(input_args)
+
+	def test_frequent_rules(self, tmp_path):
+		(tmp_path / 'alice').write_text('0 * * * * a\n*/10 * * * * b\n0 */2 * * * c\n0,30 8-17 * * * d\n')
+
+		input_args = cronls.args.parse_cmd_args(['--all', '-s', '--no-cache', '-d', str(tmp_path)])
+		assert [rule.cmd for rule in cronls.cronls.process_crontab(input_args)] == ['a', 'c', 'd']
+
+		input_args = cronls.args.parse_cmd_args(['--all', '-s', '--no-cache', '-d', str(tmp_path), '-r', '6', '-R', '12'])
+		assert [rule.cmd for rule in cronls.cronls.process_crontab(input_args)] == ['c']
+
+	def test_frequent_rules_heatmap(self, tmp_path, capsys):
+		(tmp_path / 'alice').write_text('0 * * * * a\n* * * * * b\n')
+
+		input_args = cronls.args.parse_cmd_args([
+			'16/01/01-08:00', '16/01/01-09:59', '--all', '-s', '--no-cache', '-d', str(tmp_path), '--heatmap', '--top', '1'])
+		assert [rule.cmd for rule in cronls.cronls.process_crontab(input_args)] == ['a', 'b']
+
+		cronls.cronls.main(input_args)
+		lines = capsys.readouterr().out.splitlines()
+		assert lines[1] == '2016-01-01 08:00 ::        2'
+		# Friday
+		assert '08:00        0        0        0        0       61        0        0' in lines
+
+	def test_frequent_rules_count(self, tmp_path):
+		(tmp_path / 'alice').write_text('0 * * * * a\n*/5 * * * * b\n')
+
+		input_args = cronls.args.parse_cmd_args([
+			'16/01/01-08:00', '16/01/01-09:59', '--all', '-s', '--no-cache', '-d', str(tmp_path), '-c'])
+		crontab_l = cronls.cronls.process_crontab(input_args)
+		assert [rule.cmd for rule in crontab_l] == ['a', 'b']
+
+		counts = cronls.cronls.count_executed_crontabs(input_args, crontab_l)
+		assert counts['rules'] == [2, 24]
+		assert counts['users'] == {'alice': 26}
+
 # ==================================================================== #
 
 class TestCronsProcessing:
@@ -57,9 +232,457 @@ class TestCronsProcessing:
 			'5,mon,7', field_type='', values_range=6, mapping=cronls.cronls.DAYS_OF_WEEK, aliases=cronls.cronls.DAYS_OF_WEEK_ALIASES)
 		assert values == set([0, 1, 5])
 
+	def test_compiled_rule(self):
+		rule = cronls.cronls.analyze_cron_file('user', ['*/20 8-9 * jan sun cmd arg'])[0]
+		assert rule.m == cronls.cronls.to_bitmask([0, 20, 40])
+		assert cronls.cronls.bitmask_values(rule.h) == (8, 9)
+		assert cronls.cronls.bitmask_values(rule.dow) == (0,)
+		assert rule.cmd == 'cmd arg'
+		assert rule.matches(datetime.datetime(2017, 1, 1, 9, 40))
+		assert not rule.matches(datetime.datetime(2017, 1, 1, 9, 41))
+		assert not rule.matches(datetime.datetime(2017, 1, 2, 9, 40))
+
+		values = cronls.cronls.expand_rule(
+			'JAN-Mar,dec', field_type='', values_range=12, mapping=cronls.cronls.MONTHS_OF_YEAR, aliases={})
+		assert values == set([1, 2, 3, 12])
+
+	def test_compile_field(self):
+		assert cronls.cronls.compile_field('*/15', 'm') == cronls.cronls.to_bitmask([0, 15, 30, 45])
+		assert cronls.cronls.compile_field('fri-sun', 'dow') == cronls.cronls.to_bitmask([0, 5, 6])
+		assert cronls.cronls.compile_field('sun-tue', 'dow') == cronls.cronls.to_bitmask([0, 1, 2])
+		assert cronls.cronls.compile_field('*/10', 'dom') == cronls.cronls.to_bitmask([1, 11, 21, 31])
+
+		for val, field_type in [('5-2', 'dow'), ('31-1', 'dom'), ('0', 'dom'), ('0-3', 'mon')]:
+			with pytest.raises(cronls.cronls.CronParseError):
+				cronls.cronls.compile_field(val, field_type)
+
+		assert cronls.cronls.analyze_cron_file('user', ['0 0 0 * * cmd', '0 0 1 0 * cmd']) == []
+
 	def test_conversion_failures(self):
-		# print(cronls.cronls.expand_rule('*/10,', field_type='', values_range=59, mapping={}, aliases={}))
-		pass
+		for val in ['*/10,', '1-2-3', '*/0', '*/x', '5/2', 'foo', '60', '1-99']:
+			with pytest.raises(cronls.cronls.CronParseError):
+				cronls.cronls.expand_rule(val, field_type='', values_range=59, mapping={}, aliases={})
+
+# ==================================================================== #
+
+def brute_force_executions(crontab_l, start_time, stop_time):
+	"""
+	Reference implementation: check every rule minute by minute
+	"""
+	ret = []
+	ts = start_time
+	while ts <= stop_time:
+		for rule in crontab_l:
+			if cronls.cronls.is_ok_new(rule, 'm', ts.minute) and \
+					cronls.cronls.is_ok_new(rule, 'h', ts.hour) and \
+					cronls.cronls.is_ok_new(rule, 'mon', ts.month) and \
+					cronls.cronls.is_day_ok(rule, ts.date()):
+				ret += [(ts, rule.raw)]
+		ts += datetime.timedelta(0, 60)
+	return ret
+
+# -------------------------------------------------------------------- #
+
+class TestExecutionEngine:
+	"""
+	Tests for the executions computation
+	"""
+
+	ROWS = [
+		'*/15 * * * * every_15',
+		'0 12 * * mon-fri weekdays',
+		'30 2 1,15 * sun dom_or_dow',
+		'0 0 29 feb * leap',
+		'5 4 * jan,jul * some_months',
+		'@weekly weekly',
+		'0 12 * * 1-5 weekdays_again',
+		'*/15 * * * * every_15_again',
+	]
+
+	def test_same_as_brute_force(self):
+		input_args = cronls.args.parse_cmd_args(['16/01/30', '16/03/02'])
+		crontab_l = cronls.cronls.analyze_cron_file('user', self.ROWS)
+
+		executions = cronls.cronls.calc_executed_crontabs(input_args, crontab_l)
+		expected = brute_force_executions(crontab_l, input_args.start_time, input_args.stop_time)
+
+		assert [(ts, rule.raw) for ts, rule in executions] == expected
+
+	def test_streaming(self):
+		input_args = cronls.args.parse_cmd_args(['16/01/01', '17/01/01'])
+		crontab_l = cronls.cronls.analyze_cron_file('user', self.ROWS)
+
+		stream = cronls.cronls.iter_executed_crontabs(input_args, crontab_l)
+		first = [next(stream) for i in range(3)]
+
+		assert [(ts, rule.raw) for ts, rule in first] == [
+			(datetime.datetime(2016, 1, 1, 0, 0), '*/15 * * * * every_15'),
+			(datetime.datetime(2016, 1, 1, 0, 0), '*/15 * * * * every_15_again'),
+			(datetime.datetime(2016, 1, 1, 0, 15), '*/15 * * * * every_15'),
+		]
+
+	def test_group_by_schedule(self):
+		crontab_l = cronls.cronls.analyze_cron_file('user', [
+			'0 0 * * * a',
+			'*/1 * * * * b',
+			'@daily c',
+			'0 0 1-31 * * d',
+			'* * * * * e',
+			'0 0 1-31 * 0-6 f',
+		])
+		groups = cronls.cronls.group_by_schedule(crontab_l)
+		assert [[index for index, rule in group] for group in groups] == [[0, 2, 3], [1, 4], [5]]
+
+	def test_count(self):
+		input_args = cronls.args.parse_cmd_args(['16/01/30-13:10', '16/03/02-12:00'])
+		crontab_l = cronls.cronls.analyze_cron_file('user', self.ROWS + ['0-40/20 8-14 * * * partial'])
+
+		counts = cronls.cronls.count_executed_crontabs(input_args, crontab_l)
+		executions = cronls.cronls.calc_executed_crontabs(input_args, crontab_l)
+
+		assert counts['rules'] == [
+			len([ts for ts, rule in executions if rule is r]) for r in crontab_l]
+		assert counts['users'] == {'user': len(executions)}
+		assert counts['hours'] == [
+			len([ts for ts, rule in executions if ts.hour == hour]) for hour in range(24)]
+
+	def test_minute_histogram(self):
+		input_args = cronls.args.parse_cmd_args(['16/01/30-13:10', '16/03/02-12:00'])
+		crontab_l = cronls.cronls.analyze_cron_file('user', self.ROWS)
+
+		start_time, histogram = cronls.cronls.calc_minute_histogram(input_args, crontab_l)
+		executions = cronls.cronls.calc_executed_crontabs(input_args, crontab_l)
+
+		expected = [0] * len(histogram)
+		for ts, rule in executions:
+			expected[int((ts - start_time).total_seconds()) // 60] += 1
+		assert list(histogram) == expected
+
+		heatmap = cronls.cronls.calc_heatmap(start_time, histogram)
+		assert heatmap[12][0] == len([ts for ts, rule in executions if ts.hour == 12 and ts.weekday() == 0])
+		assert sum(map(sum, heatmap)) == len(executions)
+
+		peaks = cronls.cronls.calc_peak_minutes(start_time, histogram, 2)
+		assert peaks == [(datetime.datetime(2016, 2, 1, 12, 0), 4), (datetime.datetime(2016, 2, 2, 12, 0), 4)]
+
+	def test_summaries(self):
+		input_args = cronls.args.parse_cmd_args(['16/01/30-13:10', '16/03/02-12:00'])
+		crontab_l = cronls.cronls.analyze_cron_file('user', self.ROWS + ['*/5 8-18 * * * work'])
+
+		summaries = cronls.cronls.calc_summaries(input_args, crontab_l)
+		counts = cronls.cronls.count_executed_crontabs(input_args, crontab_l)
+
+		assert [sum(s['runs'] for s in summaries if s['rule'] is rule) for rule in crontab_l] == counts['rules']
+
+		work = [s for s in summaries if s['rule'].cmd == 'work']
+		assert [(s['from'], s['to'], s['description']) for s in work] == [
+			(datetime.date(2016, 1, 30), datetime.date(2016, 1, 30), 'every 5 min from 13:10 to 18:55'),
+			(datetime.date(2016, 1, 31), datetime.date(2016, 3, 1), 'every 5 min from 08:00 to 18:55'),
+			(datetime.date(2016, 3, 2), datetime.date(2016, 3, 2), 'every 5 min from 08:00 to 12:00'),
+		]
+
+	def test_summaries_day_patterns(self):
+		input_args = cronls.args.parse_cmd_args(['16/05/01', '16/07/01'])
+		crontab_l = cronls.cronls.analyze_cron_file('user', [
+			'*/5 8-18 * * mon-fri work',
+			'@weekly weekly',
+			'0 0 1 * * monthly',
+			'0 0 13 * 5 friday13',
+			'30 2 * 5,6 sat,sun weekend',
+		])
+
+		summaries = cronls.cronls.calc_summaries(input_args, crontab_l)
+		counts = cronls.cronls.count_executed_crontabs(input_args, crontab_l)
+		assert [sum(s['runs'] for s in summaries if s['rule'] is rule) for rule in crontab_l] == counts['rules']
+
+		# One entry per rule, plus the partial last day
+		assert [(s['from'], s['to'], s['rule'].cmd, s['description']) for s in summaries] == [
+			(datetime.date(2016, 5, 1), datetime.date(2016, 6, 26), 'weekly', 'Sun, at 00:00'),
+			(datetime.date(2016, 5, 1), datetime.date(2016, 6, 1), 'monthly', 'day 1, at 00:00'),
+			(datetime.date(2016, 5, 1), datetime.date(2016, 6, 26), 'weekend', 'Sat,Sun in May,Jun, at 02:30'),
+			(datetime.date(2016, 5, 2), datetime.date(2016, 6, 30), 'work', 'Mon-Fri, every 5 min from 08:00 to 18:55'),
+			(datetime.date(2016, 5, 6), datetime.date(2016, 6, 24), 'friday13', 'day 13 or Fri, at 00:00'),
+			(datetime.date(2016, 7, 1), datetime.date(2016, 7, 1), 'monthly', 'at 00:00'),
+			(datetime.date(2016, 7, 1), datetime.date(2016, 7, 1), 'friday13', 'at 00:00'),
+		]
+		assert summaries[3]['runs'] == 44 * 132
+
+	def test_describe_days(self):
+		crontab_l = cronls.cronls.analyze_cron_file('user', [
+			'0 0 1 * 0-6 a',
+			'0 0 1-31 * 1 b',
+			'0 0 1-31 jan 1 c',
+			'0 0 * * 1 d',
+			'0 0 1 * * e',
+		])
+		assert [cronls.cronls.describe_days(rule) for rule in crontab_l] == ['', '', 'in Jan', 'Mon', 'day 1']
+
+	def test_describe_day_minutes(self):
+		assert cronls.cronls.describe_day_minutes([0, 15] + list(range(60, 1440, 60))) == \
+			'every 15 min from 00:00 to 00:15, every 60 min from 01:00 to 23:00'
+		assert cronls.cronls.describe_day_minutes([h * 60 + m for h in range(24) for m in (0, 15)]) == \
+			'at minutes 0,15 of hours 0-23'
+		assert cronls.cronls.describe_day_minutes([720]) == 'at 12:00'
+		assert cronls.cronls.format_values([1, 2, 3, 10, 20, 30, 45]) == '1-3,10-30/10,45'
+
+	def test_dom_dow(self):
+		crontab_l = cronls.cronls.analyze_cron_file('user', [
+			'0 0 * * 1 dow_only',
+			'0 0 13 * 5 dom_or_dow',
+		])
+		# Monday
+		assert cronls.cronls.is_day_ok(crontab_l[0], datetime.date(2016, 5, 16))
+		assert not cronls.cronls.is_day_ok(crontab_l[0], datetime.date(2016, 5, 17))
+		# Friday, 13th of month and neither of them
+		assert cronls.cronls.is_day_ok(crontab_l[1], datetime.date(2016, 5, 20))
+		assert cronls.cronls.is_day_ok(crontab_l[1], datetime.date(2016, 4, 13))
+		assert not cronls.cronls.is_day_ok(crontab_l[1], datetime.date(2016, 4, 14))
+
+	def test_next_fire_time(self):
+		rule = cronls.cronls.analyze_cron_file('user', ['0 0 29 feb * leap'])[0]
+		assert cronls.cronls.next_fire_time(
+			rule, datetime.datetime(2016, 3, 1), datetime.datetime(2021, 1, 1)) == datetime.datetime(2020, 2, 29)
+		assert cronls.cronls.next_fire_time(
+			rule, datetime.datetime(2016, 3, 1), datetime.datetime(2019, 1, 1)) is None
+
+	def test_occurrences(self):
+		input_args = cronls.args.parse_cmd_args(['16/01/30', '16/03/02'])
+		crontab_l = cronls.cronls.analyze_cron_file('alice', self.ROWS[:4]) + \
+			cronls.cronls.analyze_cron_file('bob', self.ROWS[4:])
+
+		occurrences = cronls.cronls.calc_executed_crontabs(input_args, crontab_l)
+		expected = list(cronls.cronls.iter_executed_crontabs(input_args, crontab_l))
+
+		assert list(occurrences) == expected
+		assert len(occurrences) == len(expected)
+		assert occurrences[3] == expected[3]
+		assert list(occurrences[10:20]) == expected[10:20]
+		assert list(occurrences.filter_user('bob')) == [(ts, rule) for ts, rule in expected if rule.user == 'bob']
+
+		# Sorting restores the order of the executions
+		shuffled = cronls.cronls.Occurrences(crontab_l)
+		for ts, rule in reversed(expected):
+			shuffled.append(ts, crontab_l.index(rule))
+		shuffled.sort()
+		assert list(shuffled) == expected
+
+	def test_split_window(self):
+		start_time = datetime.datetime(2016, 1, 30, 13, 10, 30)
+		stop_time = datetime.datetime(2016, 3, 2, 12, 0)
+
+		windows = cronls.cronls.split_window(start_time, stop_time, 4)
+		assert len(windows) == 4
+		assert windows[0] == (datetime.datetime(2016, 1, 30, 13, 10), datetime.datetime(2016, 2, 7, 23, 59))
+		assert windows[-1][1] == stop_time
+		for (start_1, stop_1), (start_2, stop_2) in zip(windows, windows[1:]):
+			assert start_2 - stop_1 == datetime.timedelta(0, 60)
+			assert start_2.time() == datetime.time(0, 0)
+
+		assert cronls.cronls.split_window(start_time, start_time, 4) == [(start_time.replace(second=0), start_time.replace(second=0))]
+		assert cronls.cronls.split_window(stop_time, start_time, 4) == []
+
+	def test_shards(self):
+		input_args = cronls.args.parse_cmd_args(['16/01/30-13:10', '16/03/02-12:00'])
+		crontab_l = cronls.cronls.analyze_cron_file('user', self.ROWS)
+
+		executions = list(cronls.cronls.iter_executed_shards(input_args, crontab_l, 3))
+		assert [(ts, rule.to_tuple()) for ts, rule in executions] == [
+			(ts, rule.to_tuple()) for ts, rule in cronls.cronls.iter_executed_crontabs(input_args, crontab_l)]
+
+	def test_fire_days(self):
+		crontab_l = cronls.cronls.analyze_cron_file('user', self.ROWS + [
+			'0 0 13 * fri friday_13_or',
+			'0 0 * * sun,sat weekend',
+			'0 0 31 * * day_31',
+		])
+		start_day = datetime.date(2015, 12, 20)
+		stop_day = datetime.date(2017, 2, 10)
+
+		for rule in crontab_l:
+			expected = []
+			day = start_day
+			while day <= stop_day:
+				if rule.mon >> day.month & 1 and rule.is_day_ok(day):
+					expected.append(day)
+				day += datetime.timedelta(1)
+
+			assert list(cronls.cronls.iter_fire_days(rule, start_day, stop_day)) == expected, rule.raw
+
+	def test_rule_index(self):
+		crontab_l = cronls.cronls.analyze_cron_file('user', self.ROWS)
+		index = cronls.cronls.RuleIndex(crontab_l)
+
+		ts = datetime.datetime(2016, 2, 28)
+		while ts < datetime.datetime(2016, 3, 2):
+			assert index.rules_at(ts) == [rule for rule in crontab_l if rule.matches(ts)]
+			ts += datetime.timedelta(0, 60)
+
+	def test_next_runs(self):
+		input_args = cronls.args.parse_cmd_args(['16/01/30', '17/01/30'])
+		crontab_l = cronls.cronls.analyze_cron_file('user', self.ROWS)
+		index = cronls.cronls.RuleIndex(crontab_l)
+
+		executions = cronls.cronls.calc_executed_crontabs(input_args, crontab_l)
+		assert index.next_runs(input_args.start_time, 50) == list(executions[:50])
+
+		leap = [(ts, rule) for ts, rule in executions if rule.cmd == 'leap']
+		assert index.next_runs(input_args.start_time, 1, job='leap') == leap
+		assert index.next_runs(input_args.start_time, 3, user='nobody') == []
+
+# ==================================================================== #
+
+class TestOutput:
+	"""
+	Tests for the executions output formats
+	"""
+
+	def print_executions(self, output_format):
+		input_args = cronls.args.parse_cmd_args(['16/05/20-08:00', '16/05/20-09:00', '-f', output_format])
+		crontab_l = cronls.cronls.analyze_cron_file('alice', [
+			'0 * * * * echo "a, b"',
+			'*/20 * * * * noisy',
+			'0 9 * * * x',
+		])
+		crontab_l[1].user = 'bob'
+		exec_l = cronls.cronls.iter_executed_crontabs(input_args, crontab_l)
+
+		out = io.StringIO()
+		cronls.cronls.print_executed_crontabs(input_args, exec_l, max_user_length=6, out=out)
+		return out.getvalue()
+
+	def test_text(self):
+		assert self.print_executions('text').splitlines() == [
+			'2016-05-20 08:00 :: alice  :: 0 * * * * echo "a, b"',
+			'2016-05-20 08:00 :: bob    :: */20 * * * * noisy',
+			'2016-05-20 08:20 :: bob    :: */20 * * * * noisy',
+			'2016-05-20 08:40 :: bob    :: */20 * * * * noisy',
+			'2016-05-20 09:00 :: alice  :: 0 * * * * echo "a, b"',
+			'2016-05-20 09:00 :: bob    :: */20 * * * * noisy',
+			'2016-05-20 09:00 :: alice  :: 0 9 * * * x',
+		]
+
+	def test_jsonl(self):
+		rows = [json.loads(line) for line in self.print_executions('jsonl').splitlines()]
+		assert rows[0] == {'ts': '2016-05-20T08:00', 'user': 'alice', 'raw': '0 * * * * echo "a, b"', 'cmd': 'echo "a, b"'}
+		assert len(rows) == 7
+
+	def test_csv(self):
+		rows = list(csv.reader(io.StringIO(self.print_executions('csv'))))
+		assert rows[0] == ['ts', 'user', 'raw', 'cmd']
+		assert rows[1] == ['2016-05-20 08:00', 'alice', '0 * * * * echo "a, b"', 'echo "a, b"']
+		assert len(rows) == 8
+
+		rows = list(csv.reader(io.StringIO(self.print_executions('tsv')), delimiter='\t'))
+		assert rows[-1] == ['2016-05-20 09:00', 'alice', '0 9 * * * x', 'x']
+
+	def test_jobs(self, tmp_path, capsys):
+		(tmp_path / 'alice').write_text('0 * * * * a\n30 8 * * mon b\n')
+		(tmp_path / 'bob').write_text('*/20 * * * * c\n')
+		argv = ['16/05/20-08:00', '16/06/20-10:00', '--all', '-s', '--no-cache', '-r', '60', '-d', str(tmp_path)]
+
+		cronls.cronls.main(cronls.args.parse_cmd_args(argv))
+		serial = capsys.readouterr().out
+
+		cronls.cronls.main(cronls.args.parse_cmd_args(argv + ['--jobs', '3']))
+		assert capsys.readouterr().out == serial
+
+	def test_lookup(self, tmp_path, capsys):
+		(tmp_path / 'alice').write_text('0 * * * * a\n*/5 9-17 * * mon-fri b\n* * * * * noisy\n')
+		argv = ['--all', '-s', '--no-cache', '-d', str(tmp_path)]
+
+		# Frequent jobs are not hidden
+		cronls.cronls.main(cronls.args.parse_cmd_args(['at', '16/05/20-09:00'] + argv))
+		assert [line.split(' :: ')[-1] for line in capsys.readouterr().out.splitlines()] == [
+			'0 * * * * a', '*/5 9-17 * * mon-fri b', '* * * * * noisy']
+
+		cronls.cronls.main(cronls.args.parse_cmd_args(['next', '16/05/20-09:00', '-n', '2', '-j', 'noisy'] + argv))
+		assert capsys.readouterr().out.splitlines() == [
+			'2016-05-20 09:00 :: alice :: * * * * * noisy',
+			'2016-05-20 09:01 :: alice :: * * * * * noisy',
+		]
+
+	def test_occurrences(self):
+		input_args = cronls.args.parse_cmd_args(['16/05/20-08:00', '16/05/20-09:00'])
+		crontab_l = cronls.cronls.analyze_cron_file('alice', ['0 9 * * * x'])
+		crontab_l += cronls.cronls.analyze_cron_file('bob', ['*/20 * * * * noisy'])
+		crontab_l += cronls.cronls.analyze_cron_file('charlotte', ['0 0 * * * never_in_window'])
+
+		out_list = io.StringIO()
+		exec_l = list(cronls.cronls.iter_executed_crontabs(input_args, crontab_l))
+		cronls.cronls.print_executed_crontabs(input_args, exec_l, out=out_list)
+
+		out_occurrences = io.StringIO()
+		occurrences = cronls.cronls.calc_executed_crontabs(input_args, crontab_l)
+		cronls.cronls.print_executed_crontabs(input_args, occurrences, out=out_occurrences)
+
+		assert out_occurrences.getvalue() == out_list.getvalue()
+		assert out_list.getvalue().splitlines()[0] == '2016-05-20 08:00 :: bob   :: */20 * * * * noisy'
+
+# ==================================================================== #
+
+class TestStats:
+	"""
+	Tests for the --stats instrumentation
+	"""
+
+	def test_stats(self, tmp_path, capsys):
+		(tmp_path / 'alice').write_text('0 * * * * a\n*/2 * * * * b\n')
+
+		cronls.cronls.main(cronls.args.parse_cmd_args([
+			'16/05/20-08:00', '16/05/20-09:59', '--all', '-s', '--no-cache', '-d', str(tmp_path), '--stats']))
+
+		out, err = capsys.readouterr()
+		assert len(out.splitlines()) == 2
+
+		stats = dict(line.rsplit(None, 1) for line in err.splitlines()[2:] if not line.startswith(('read', 'parse', 'evaluate', 'print')))
+		assert stats == {
+			'files': '1',
+			'rules parsed': '2',
+			'rules kept': '1',
+			'distinct schedules': '1',
+			'executions generated': '2',
+			'executions printed': '2',
+		}
+		assert [line.split()[0] for line in err.splitlines()[2:6]] == ['read', 'parse', 'evaluate', 'print']
+
+	def test_no_stats(self, tmp_path, capsys):
+		(tmp_path / 'alice').write_text('0 * * * * a\n')
+
+		cronls.cronls.main(cronls.args.parse_cmd_args([
+			'16/05/20-08:00', '16/05/20-09:59', '--all', '-s', '--no-cache', '-d', str(tmp_path)]))
+
+		assert capsys.readouterr()[1] == ''
+
+# ==================================================================== #
+
+class TestStartup:
+	"""
+	Tests for the module import time, that dominates short runs
+	"""
+
+	# Max cumulative import time of cronls.cronls, in microseconds
+	IMPORT_TIME_BUDGET = 100000
+
+	def test_import_time(self):
+		result = subprocess.run(
+			[sys.executable, '-X', 'importtime', '-c', 'import cronls.cronls'],
+			cwd=os.path.dirname(os.path.dirname(cronls.__file__)),
+			stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+
+		imported = {}
+		for line in result.stderr.splitlines():
+			if line.startswith('import time:') and '|' in line:
+				self_us, cumulative_us, name = line[len('import time:'):].split('|')
+				if cumulative_us.strip().isdigit():
+					imported[name.strip()] = int(cumulative_us)
+
+		assert 'setuptools' not in imported
+		assert 'subprocess' not in imported
+		assert imported['cronls.cronls'] < self.IMPORT_TIME_BUDGET
+
+	def test_cronls_command(self):
+		import setuptools
+		assert issubclass(cronls.cronls.CronlsCommand, setuptools.Command)
 
 # ==================================================================== #
 
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+import io
+import tarfile
+
+import pytest
+
+import cronls.args
+import cronls.cronls
+import cronls.fleet
+
+# ==================================================================== #
+
+class TestFleet:
+	"""
+	Tests for the "--fleet" mode
+	"""
+
+	def make_fleet(self, tmp_path):
+		fleet = tmp_path / 'fleet'
+
+		# Directory snapshot
+		(fleet / 'web1' / 'var' / 'spool' / 'cron').mkdir(parents=True)
+		(fleet / 'web1' / 'etc' / 'cron.hourly').mkdir(parents=True)
+		(fleet / 'web1' / 'var' / 'spool' / 'cron' / 'alice').write_text('0 * * * * backup\n')
+		(fleet / 'web1' / 'etc' / 'crontab').write_text('SHELL=/bin/sh\n17 * * * * root run-parts /etc/cron.hourly\n')
+		(fleet / 'web1' / 'etc' / 'cron.hourly' / 'logrotate').write_text('')
+
+		# Tarball snapshot, with a "<host>/" top directory
+		files = {
+			'db2/var/spool/cron/crontabs/bob': b'0 * * * * backup\n30 * * * * dump\n',
+			'db2/etc/crontab': b'17 * * * * root run-parts /etc/cron.hourly\n',
+			'db2/etc/cron.hourly/a': b'',
+			'db2/etc/cron.d/pg': b'45 * * * * pg vacuum\n',
+			'db2/etc/cron.d/pg.dpkg-old': b'46 * * * * pg old\n',
+		}
+		with tarfile.open(str(fleet / 'db2.tar.gz'), 'w:gz') as tar:
+			for name, data in sorted(files.items()):
+				info = tarfile.TarInfo(name)
+				info.size = len(data)
+				tar.addfile(info, io.BytesIO(data))
+
+		(fleet / 'notes.txt').write_text('not a snapshot')
+
+		return str(fleet)
+
+	def test_discover(self, tmp_path):
+		fleet = self.make_fleet(tmp_path)
+		assert [host for host, path in cronls.fleet.discover_snapshots(fleet)] == ['db2', 'web1']
+
+	@pytest.mark.parametrize('jobs', ['1', '2'])
+	def test_fleet(self, tmp_path, capsys, jobs):
+		fleet = self.make_fleet(tmp_path)
+		input_args = cronls.args.parse_cmd_args(
+			['16/05/20-08:00', '16/05/20-09:00', '--fleet', fleet, '--jobs', jobs])
+
+		crontab_l = cronls.cronls.process_crontab(input_args)
+		assert [(rule.host, rule.user, rule.cmd) for rule in crontab_l] == [
+			('db2', 'bob', 'backup'),
+			('db2', 'bob', 'dump'),
+			('db2', cronls.cronls.SYS_USER, '/etc/cron.hourly/a'),
+			('db2', 'pg[cron.d/pg]', 'vacuum'),
+			('web1', 'alice', 'backup'),
+			('web1', cronls.cronls.SYS_USER, '/etc/cron.hourly/logrotate'),
+		]
+
+		# Schedules identical across hosts are evaluated once
+		assert len(cronls.cronls.group_by_schedule(crontab_l)) == 4
+
+		cronls.cronls.main(input_args)
+		assert capsys.readouterr().out.splitlines()[:6] == [
+			'2016-05-20 08:00 :: db2  :: bob           :: 0 * * * * backup',
+			'2016-05-20 08:00 :: web1 :: alice         :: 0 * * * * backup',
+			'2016-05-20 08:17 :: db2  :: root[sys]     :: 17 * * * * root run-parts /etc/cron.hourly (/etc/cron.hourly/a)',
+			'2016-05-20 08:17 :: web1 :: root[sys]     :: 17 * * * * root run-parts /etc/cron.hourly (/etc/cron.hourly/logrotate)',
+			'2016-05-20 08:30 :: db2  :: bob           :: 30 * * * * dump',
+			'2016-05-20 08:45 :: db2  :: pg[cron.d/pg] :: 45 * * * * pg vacuum',
+		]
+
+	def test_csv(self, tmp_path, capsys):
+		fleet = self.make_fleet(tmp_path)
+		cronls.cronls.main(cronls.args.parse_cmd_args(
+			['16/05/20-08:00', '16/05/20-08:10', '--fleet', fleet, '-s', '-f', 'csv']))
+
+		assert capsys.readouterr().out.splitlines() == [
+			'ts,host,user,raw,cmd',
+			'2016-05-20 08:00,db2,bob,0 * * * * backup,backup',
+			'2016-05-20 08:00,web1,alice,0 * * * * backup,backup',
+		]
+
+	def test_reports(self, tmp_path, capsys):
+		fleet = self.make_fleet(tmp_path)
+		args = ['16/05/20-08:00', '16/05/20-09:00', '--fleet', fleet]
+
+		cronls.cronls.main(cronls.args.parse_cmd_args(args + ['-c']))
+		lines = capsys.readouterr().out.splitlines()
+		assert lines[1] == '       2 :: db2  :: bob           :: 0 * * * * backup'
+		assert lines[7:13] == [
+			'# Executions per host and user',
+			'       3 :: db2  :: bob',
+			'       1 :: db2  :: pg[cron.d/pg]',
+			'       1 :: db2  :: root[sys]',
+			'       2 :: web1 :: alice',
+			'       1 :: web1 :: root[sys]',
+		]
+
+		cronls.cronls.main(cronls.args.parse_cmd_args(args + ['-S']))
+		assert capsys.readouterr().out.splitlines()[4] == \
+			'2016-05-20             :: web1 :: alice         :: every 60 min from 08:00 to 09:00 (2 runs) :: 0 * * * * backup'
+
+		cronls.cronls.main(cronls.args.parse_cmd_args(args + ['--heatmap']))
+		assert capsys.readouterr().out.splitlines()[-3:] == ['# Job starts per host', '       5 :: db2', '       3 :: web1']
+
+	def test_serial(self, tmp_path, monkeypatch):
+		import concurrent.futures
+
+		def no_pool(*args, **kwargs):
+			raise AssertionError('no process pool expected')
+
+		monkeypatch.setattr(concurrent.futures, 'ProcessPoolExecutor', no_pool)
+		fleet = self.make_fleet(tmp_path)
+		input_args = cronls.args.parse_cmd_args(['--fleet', fleet, '--jobs', '1'])
+		assert len(cronls.cronls.process_crontab(input_args)) == 6
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+import sys
+
+import pytest
+
+import cronls.args
+import cronls.cronls
+
+# ==================================================================== #
+
+class TestNumpyEngine:
+	"""
+	Tests for the NumPy evaluation engine
+	"""
+
+	ROWS = [
+		'*/15 * * * * every_15',
+		'0 12 * * mon-fri weekdays',
+		'30 2 1,15 * sun dom_or_dow',
+		'0 0 29 feb * leap',
+		'5 4 * jan,jul * some_months',
+		'@weekly weekly',
+		'*/15 * * * * every_15_again',
+		'0 0 13 * fri friday_13_or',
+		'*/7 3-5 */3 * 0,6 mixed',
+		'0 0 31 * * day_31',
+	]
+
+	@pytest.mark.parametrize('window', [
+		['16/01/30-13:10', '16/03/02-12:00'],
+		['15/12/31-23:59', '17/01/01-00:01'],
+		['16/05/20-08:00', '16/05/20-08:00'],
+	])
+	def test_same_as_python(self, window):
+		numpy_engine = pytest.importorskip('cronls.numpy_engine')
+
+		input_args = cronls.args.parse_cmd_args(window)
+		crontab_l = cronls.cronls.analyze_cron_file('alice', self.ROWS[:5]) + \
+			cronls.cronls.analyze_cron_file('bob', self.ROWS[5:])
+
+		expected = cronls.cronls.calc_executed_crontabs(input_args, crontab_l)
+		occurrences = numpy_engine.calc_executed_crontabs(input_args, crontab_l)
+
+		assert list(occurrences) == list(expected)
+
+	def test_fallback(self, tmp_path, monkeypatch, capsys):
+		(tmp_path / 'alice').write_text('0 * * * * a\n30 8 * * * b\n')
+		argv = ['16/05/20-08:00', '16/05/20-09:59', '--all', '-s', '--no-cache', '-d', str(tmp_path)]
+
+		cronls.cronls.main(cronls.args.parse_cmd_args(argv))
+		expected = capsys.readouterr().out
+
+		# NumPy not installed
+		monkeypatch.setitem(sys.modules, 'numpy', None)
+		monkeypatch.delitem(sys.modules, 'cronls.numpy_engine', raising=False)
+
+		cronls.cronls.main(cronls.args.parse_cmd_args(argv + ['--engine', 'numpy']))
+		out, err = capsys.readouterr()
+		assert out == expected
+		assert 'NumPy is not installed' in err
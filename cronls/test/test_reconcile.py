@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+
+import cronls.args
+import cronls.cronls
+import cronls.reconcile
+
+# ==================================================================== #
+
+class TestReconcile:
+	"""
+	Tests for the "reconcile" subcommand
+	"""
+
+	LOG = (
+		'May 20 08:00:01 host CRON[1]: (alice) CMD (backup)\n'
+		'May 20 08:00:01 host CRON[2]: (alice) CMD (poll)\n'
+		'May 20 08:10:00 host sshd[3]: Accepted publickey for alice\n'
+		'May 20 08:15:01 host CRON[4]: (alice) CMD (poll)\n'
+		'May 20 08:17:01 host CRON[5]: (root) CMD (   cd / && run-parts --report /etc/cron.hourly)\n'
+		'May 20 08:33:01 host CRON[6]: (alice) CMD (poll)\n'
+		'May 20 08:41:01 host CRON[7]: (bob) CMD (rm -f /tmp/x)\n'
+	)
+
+	def test_reconcile_runs(self):
+		a, b = ('alice', 'a'), ('alice', 'b')
+		predicted = [(0, a, 'ra'), (0, b, 'rb'), (10, a, 'ra'), (20, a, 'ra')]
+		logged = [(0, a), (2, b), (3, b), (17, a), (30, a)]
+
+		runs = list(cronls.reconcile.reconcile_runs(iter(predicted), iter(logged), 5, 25))
+		assert [(status, minute, key, ran) for status, minute, key, rule, ran in runs] == [
+			('ok', 0, a, 0),
+			('late', 0, b, 2),
+			('extra', 3, b, 3),
+			('missed', 10, a, None),
+			('extra', 17, a, 17),
+			# Logged after the window: never extra
+			('missed', 20, a, None),
+		]
+
+	def test_missed_frequent_run(self):
+		# "*/5" job whose first run is missing: the others are on time
+		a = ('alice', 'a')
+		predicted = [(minute, a, 'ra') for minute in range(0, 60, 5)]
+		logged = [(minute, a) for minute in range(5, 60, 5)]
+
+		runs = list(cronls.reconcile.reconcile_runs(iter(predicted), iter(logged), 5, 59))
+		assert [(status, minute) for status, minute, key, rule, ran in runs if status != 'ok'] == [('missed', 0)]
+		assert len(runs) == 12
+
+	def test_log_reader(self):
+		stop_time = datetime.datetime(2017, 1, 2)
+		reader = cronls.reconcile.LogReader(0, 10 ** 9, stop_time)
+		data = (
+			b'Dec 31 23:59:01 host CRON[1]: (root) CMD (a)\n'
+			b'2017-01-01T00:01:01.000000+01:00 host CROND[2]: (bob) CMD (b)\r\n'
+			b'Jan  1 00:02:01 host CRON[3]: (root) CMD (c (d))\n'
+			b'Jan  1 00:02:01 host CRON[3]: (root) MAIL (mailed 10 bytes of output)\n'
+		)
+
+		assert [
+			(cronls.cronls.minute_to_datetime(minute), key) for minute, key in reader.iter_commands(data)
+		] == [
+			(datetime.datetime(2016, 12, 31, 23, 59), ('root', 'a')),
+			(datetime.datetime(2017, 1, 1, 0, 1), ('bob', 'b')),
+			(datetime.datetime(2017, 1, 1, 0, 2), ('root', 'c (d)')),
+		]
+
+	def test_reconcile(self, tmp_path, capsys):
+		(tmp_path / 'spool').mkdir()
+		(tmp_path / 'spool' / 'alice').write_text('0 * * * * backup\n*/15 * * * * poll\n')
+		(tmp_path / 'crontab').write_text('17 * * * * root cd / && run-parts --report /etc/cron.hourly\n')
+		(tmp_path / 'cron.log').write_text(self.LOG)
+		(tmp_path / 'empty.log').write_text('')
+
+		input_args = cronls.args.parse_cmd_args([
+			'reconcile', '16/05/20-08:00', '16/05/20-08:59', '-a', '--no-cache', '-d', str(tmp_path / 'spool'),
+			'--sys-cron-file', str(tmp_path / 'crontab'), '--cron-d-dir', str(tmp_path / 'missing'),
+			'-l', str(tmp_path / 'cron.log'), '-l', str(tmp_path / 'empty.log')])
+		assert input_args.command == 'reconcile'
+		assert input_args.tolerance == 5
+
+		cronls.cronls.main(input_args)
+		assert capsys.readouterr().out.splitlines() == [
+			'2016-05-20 08:30 :: late   :: alice     :: */15 * * * * poll (ran at 08:33, +3 min)',
+			'2016-05-20 08:41 :: extra  :: bob       :: rm -f /tmp/x',
+			'2016-05-20 08:45 :: missed :: alice     :: */15 * * * * poll',
+			'# 6 scheduled: 4 on time, 1 late, 1 missed; 1 extra',
+		]
+
+		input_args.output_format = 'csv'
+		input_args.tolerance = 0
+		input_args.system_cron = False
+		counts = cronls.reconcile.reconcile(input_args, cronls.cronls.process_crontab(input_args))
+		assert capsys.readouterr().out.splitlines() == [
+			'ts,status,user,raw,cmd,ran',
+			'2016-05-20 08:17,extra,root,,cd / && run-parts --report /etc/cron.hourly,2016-05-20 08:17',
+			'2016-05-20 08:30,missed,alice,*/15 * * * * poll,poll,',
+			'2016-05-20 08:33,extra,alice,,poll,2016-05-20 08:33',
+			'2016-05-20 08:41,extra,bob,,rm -f /tmp/x,2016-05-20 08:41',
+			'2016-05-20 08:45,missed,alice,*/15 * * * * poll,poll,',
+		]
+		assert (counts['ok'], counts['missed'], counts['extra']) == (3, 2, 3)
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+import json
+import datetime
+import threading
+
+import cronls.args
+import cronls.serve
+
+# ==================================================================== #
+
+class TestServe:
+	"""
+	Tests for the "serve" subcommand
+	"""
+
+	def make_engine(self, tmp_path):
+		(tmp_path / 'alice').write_text('0 * * * * backup.sh\n30 12 * * * report.sh\n')
+		(tmp_path / 'bob').write_text('15 */6 * * * sync.sh\n')
+
+		input_args = cronls.args.parse_cmd_args([
+			'serve', '--socket', str(tmp_path / 'sock'), '--all', '-s', '--no-cache', '-d', str(tmp_path)])
+		assert input_args.command == 'serve'
+
+		return cronls.serve.QueryEngine(input_args, cache_size=16)
+
+	def ask(self, engine, request):
+		return json.loads(engine.handle(json.dumps(request).encode('utf-8')).decode('utf-8'))
+
+	def test_queries(self, tmp_path):
+		engine = self.make_engine(tmp_path)
+
+		response = self.ask(engine, {'op': 'occurrences', 'from': '2016-05-20T11:00', 'to': '2016-05-20T13:00'})
+		assert response['ok'] and not response['truncated']
+		assert [(e['ts'], e['cmd']) for e in response['result']] == [
+			('2016-05-20T11:00', 'backup.sh'),
+			('2016-05-20T12:00', 'backup.sh'),
+			('2016-05-20T12:15', 'sync.sh'),
+			('2016-05-20T12:30', 'report.sh'),
+			('2016-05-20T13:00', 'backup.sh'),
+		]
+
+		response = self.ask(engine, {'op': 'occurrences', 'from': '2016-05-20T11:00', 'to': '2016-05-20T13:00', 'limit': 2})
+		assert len(response['result']) == 2 and response['truncated']
+
+		response = self.ask(engine, {'op': 'next', 'from': '2016-05-20T11:00', 'user': 'bob', 'n': 3})
+		assert [e['ts'] for e in response['result']] == ['2016-05-20T12:15', '2016-05-20T18:15', '2016-05-21T00:15']
+
+		response = self.ask(engine, {'op': 'next', 'from': '2016-05-20T11:00', 'n': 4})
+		assert [(e['ts'], e['cmd']) for e in response['result']] == [
+			('2016-05-20T11:00', 'backup.sh'),
+			('2016-05-20T12:00', 'backup.sh'),
+			('2016-05-20T12:15', 'sync.sh'),
+			('2016-05-20T12:30', 'report.sh'),
+		]
+
+		response = self.ask(engine, {'op': 'next', 'from': '2016-05-20T11:00', 'job': 'report', 'n': 2})
+		assert [e['ts'] for e in response['result']] == ['2016-05-20T12:30', '2016-05-21T12:30']
+
+		response = self.ask(engine, {'op': 'at', 'ts': '2016-05-20T12:00'})
+		assert response['result'] == [{'user': 'alice', 'raw': '0 * * * * backup.sh', 'cmd': 'backup.sh'}]
+
+	def test_frequent_jobs(self, tmp_path):
+		engine = self.make_engine(tmp_path)
+		(tmp_path / 'carol').write_text('*/5 * * * * poll.sh\n')
+		engine.reload()
+
+		response = self.ask(engine, {'op': 'at', 'ts': '2016-05-20T12:15'})
+		assert [r['cmd'] for r in response['result']] == ['sync.sh', 'poll.sh']
+
+	def test_errors(self, tmp_path):
+		engine = self.make_engine(tmp_path)
+
+		assert not self.ask(engine, {'op': 'nope'})['ok']
+		assert not self.ask(engine, {'op': 'at', 'ts': 'yesterday'})['ok']
+		assert not self.ask(engine, {'op': 'next', 'n': 0})['ok']
+		assert not self.ask(engine, [1, 2])['ok']
+		assert not self.ask(engine, {'op': 'at', 'ts': '2016-05-20T12:00', 'user': ['alice']})['ok']
+		assert not json.loads(engine.handle(b'{not json').decode('utf-8'))['ok']
+
+		# End of the datetime range
+		response = self.ask(engine, {'op': 'next', 'from': '9999-12-31T22:00', 'n': 3})
+		assert [e['ts'] for e in response['result']] == ['9999-12-31T22:00', '9999-12-31T23:00']
+		assert self.ask(engine, {'op': 'next', 'from': '9999-12-30T00:00'})['ok']
+
+	def test_cache_and_reload(self, tmp_path):
+		engine = self.make_engine(tmp_path)
+		request = {'op': 'at', 'ts': '2016-05-20T12:15'}
+
+		assert len(self.ask(engine, request)['result']) == 1
+		assert len(self.ask(engine, request)['result']) == 1
+		assert engine.answer.cache_info().hits == 1
+
+		(tmp_path / 'alice').write_text('15 12 * * * other.sh\n')
+		state = engine.state
+		assert self.ask(engine, {'op': 'reload'}) == {'ok': True, 'result': {'rules': 2}}
+		assert engine.state is not state and engine.answer.cache_info().currsize == 0
+		assert len(self.ask(engine, request)['result']) == 2
+
+		# A query started before the reload is answered from the old rules
+		assert state[2](engine.canonical_query(request)).count(b'"cmd"') == 1
+
+	def test_socket(self, tmp_path):
+		engine = self.make_engine(tmp_path)
+		socket_path = str(tmp_path / 'sock')
+
+		server = cronls.serve.make_server(socket_path, engine)
+		thread = threading.Thread(target=server.serve_forever)
+		thread.start()
+		try:
+			response = cronls.serve.query(socket_path, {'op': 'at', 'ts': '2016-05-20T12:00'}, timeout=5)
+			assert [e['cmd'] for e in response['result']] == ['backup.sh']
+		finally:
+			server.shutdown()
+			server.server_close()
+			thread.join()
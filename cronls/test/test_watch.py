@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import datetime
+
+import pytest
+
+import cronls.args
+import cronls.cronls
+import cronls.watch
+
+# ==================================================================== #
+
+class TestWatch:
+	"""
+	Tests for the "--watch" mode
+	"""
+
+	NOW = datetime.datetime(2016, 5, 20, 10, 30, 15)
+
+	def make_watcher(self, tmp_path):
+		(tmp_path / 'alice').write_text('0 * * * * a\n')
+		(tmp_path / 'bob').write_text('15,45 * * * * b\n')
+
+		input_args = cronls.args.parse_cmd_args(['--all', '-s', '--no-cache', '-d', str(tmp_path)])
+		return input_args, cronls.watch.CrontabWatcher(input_args, datetime.timedelta(0, 6 * 3600))
+
+	def expected(self, input_args, watcher):
+		"""
+		Executions computed from scratch on the current files
+		"""
+		input_args.start_time = watcher.start_time
+		input_args.stop_time = watcher.stop_time
+		crontab_l = cronls.cronls.process_crontab(input_args)
+		return [(ts, rule.raw) for ts, rule in cronls.cronls.calc_executed_crontabs(input_args, crontab_l)]
+
+	def test_incremental_refresh(self, tmp_path, monkeypatch):
+		input_args, watcher = self.make_watcher(tmp_path)
+
+		watcher.advance(self.NOW)
+		assert watcher.refresh() == {str(tmp_path / 'alice'), str(tmp_path / 'bob')}
+		assert [(ts, rule.raw) for ts, rule in watcher.iter_executions()] == self.expected(input_args, watcher)
+
+		# Nothing changed: nothing is read
+		read = []
+		monkeypatch.setattr(cronls.cronls, 'read_file', lambda f: read.append(f) or [])
+		assert watcher.refresh() == set()
+		assert read == []
+		monkeypatch.undo()
+
+		# Only the rewritten file is parsed again
+		(tmp_path / 'bob').write_text('*/20 * * * * bob2\n')
+		(tmp_path / 'carol').write_text('30 12 * * * c\n')
+		assert watcher.refresh() == {str(tmp_path / 'bob'), str(tmp_path / 'carol')}
+		assert [(ts, rule.raw) for ts, rule in watcher.iter_executions()] == self.expected(input_args, watcher)
+
+		(tmp_path / 'alice').unlink()
+		assert watcher.refresh() == {str(tmp_path / 'alice')}
+		assert [(ts, rule.raw) for ts, rule in watcher.iter_executions()] == self.expected(input_args, watcher)
+
+	def test_run_parts(self, tmp_path):
+		(tmp_path / 'spool').mkdir()
+		(tmp_path / 'cron.hourly').mkdir()
+		(tmp_path / 'cron.hourly' / 'a').write_text('')
+		(tmp_path / 'crontab').write_text('17 * * * * root run-parts %s\n' % (tmp_path / 'cron.hourly'))
+
+		input_args = cronls.args.parse_cmd_args([
+			'--all', '--no-cache', '-d', str(tmp_path / 'spool'), '--sys-cron-file', str(tmp_path / 'crontab'),
+			'--cron-d-dir', str(tmp_path / 'missing')])
+		watcher = cronls.watch.CrontabWatcher(input_args, datetime.timedelta(0, 6 * 3600))
+		watcher.advance(self.NOW)
+		assert watcher.refresh() == {str(tmp_path / 'crontab')}
+		assert watcher.refresh() == set()
+
+		# A new script is noticed, the system crontab being unchanged
+		(tmp_path / 'cron.hourly' / 'b').write_text('')
+		os.utime(str(tmp_path / 'cron.hourly'), ns=(0, 10 ** 9))
+		assert watcher.refresh() == {str(tmp_path / 'crontab')}
+		assert [(ts, rule.raw) for ts, rule in watcher.iter_executions()] == self.expected(input_args, watcher)
+		assert len(watcher.rules[str(tmp_path / 'crontab')]) == 2
+
+	def test_advance(self, tmp_path):
+		input_args, watcher = self.make_watcher(tmp_path)
+
+		watcher.advance(self.NOW)
+		watcher.refresh()
+
+		assert not watcher.advance(self.NOW + datetime.timedelta(0, 30))
+
+		for minutes in (1, 44, 45, 200, 2000):
+			assert watcher.advance(self.NOW + datetime.timedelta(0, minutes * 60))
+			assert [(ts, rule.raw) for ts, rule in watcher.iter_executions()] == self.expected(input_args, watcher)
+
+	def test_watch(self, tmp_path):
+		input_args, watcher = self.make_watcher(tmp_path)
+		input_args.watch_interval = 60
+
+		times = iter([self.NOW, self.NOW + datetime.timedelta(0, 60)])
+
+		def sleep(seconds):
+			(tmp_path / 'alice').write_text('5 * * * * a2\n')
+
+		out = io.StringIO()
+		cronls.watch.watch(input_args, out=out, iterations=2, sleep=sleep, now=lambda: next(times))
+
+		renders = out.getvalue().split('# ')[1:]
+		assert len(renders) == 2
+		assert renders[0].startswith('2016-05-20 10:30: 2 crontabs, 2 rules')
+		assert ' a\n' in renders[0] and ' a2\n' in renders[1]
+
+	def test_exclusive_modes(self, tmp_path, capsys):
+		for extra in (['-c'], ['--fleet', str(tmp_path)]):
+			with pytest.raises(SystemExit):
+				cronls.args.parse_cmd_args(['--all', '-d', str(tmp_path), '--watch'] + extra)
+		assert '--watch can\'t be used with --fleet' in capsys.readouterr().err
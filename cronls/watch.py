@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module containing the "--watch" mode: the crontabs are polled and only the
+changed files are parsed and evaluated again, keeping a rolling window of the
+upcoming executions.
+"""
+
+import sys
+import time
+import heapq
+import argparse
+import datetime
+
+try:
+	import cronls.cronls as cronls
+	import cronls.cache as cache
+except ImportError:
+	# Executed as a script (e.g. "python cronls/cronls.py")
+	import cronls
+	import cache
+
+# Pseudo path of the crontabs read with "crontab -l" (followed by the user)
+USER_CRONTAB = 'crontab:'
+
+# Clear screen escape sequence, used when the output is a terminal
+CLEAR_SCREEN = '\033[2J\033[H'
+
+# ==================================================================== #
+
+class CrontabWatcher(object):
+	"""
+	Keep in memory the compiled rules of every crontab and their executions in
+	a rolling window.
+
+	Files are identified by their key (see :func:`cache.file_key`): at each
+	:meth:`refresh` unchanged files cost a single stat, while changed files are
+	read, parsed and evaluated again on their own. The run-parts directories of
+	the system crontabs are listed again at each refresh (a single stat when
+	unchanged, see :func:`cronls.list_run_parts`), so added or removed scripts
+	are noticed too. Moving the window forward
+	(see :meth:`advance`) drops the past executions and evaluates only the new
+	minutes.
+
+	Args:
+		input_args (argparse.Namespace): Command line arguments
+		horizon (datetime.timedelta): Length of the window
+	"""
+
+	def __init__(self, input_args, horizon):
+		self.input_args = input_args
+		self.horizon = horizon
+
+		# Memory only cache: values are the parsed rules of each file (before
+		# finalize_crontab_file())
+		self.parse_cache = cache.ParseCache(None)
+
+		self.paths = []
+		self.rules = {}
+		self.executions = {}
+		self.user_rows = {}
+
+		self.start_time = None
+		self.stop_time = None
+
+	# -------------------------------------------------------------------- #
+
+	def evaluate(self, rules, start_time, stop_time):
+		"""
+		Return the executions of "rules" in the [start_time, stop_time] window
+		"""
+		window = argparse.Namespace(start_time=start_time, stop_time=stop_time)
+		return list(cronls.iter_executed_crontabs(window, rules))
+
+	# -------------------------------------------------------------------- #
+
+	def advance(self, now):
+		"""
+		Move the window so that it starts at "now".
+
+		Args:
+			now (datetime.datetime): New window start
+
+		Returns:
+			bool: False if the window didn't move (same minute)
+		"""
+		start_time = now.replace(second=0, microsecond=0)
+		if start_time == self.start_time:
+			return False
+
+		stop_time = start_time + self.horizon
+
+		if self.start_time is None or start_time > self.stop_time or start_time < self.start_time:
+			# First call, or the window jumped: evaluate everything again
+			for path in self.executions:
+				self.executions[path] = self.evaluate(self.rules[path], start_time, stop_time)
+		else:
+			new_from = self.stop_time + datetime.timedelta(0, 60)
+			for path, exec_l in self.executions.items():
+				past = 0
+				while past < len(exec_l) and exec_l[past][0] < start_time:
+					past += 1
+				del exec_l[:past]
+
+				if new_from <= stop_time:
+					exec_l.extend(self.evaluate(self.rules[path], new_from, stop_time))
+
+		self.start_time = start_time
+		self.stop_time = stop_time
+		return True
+
+	# -------------------------------------------------------------------- #
+
+	def refresh(self):
+		"""
+		Check the crontabs and parse and evaluate again the changed ones.
+
+		Returns:
+			set: Paths of the added, changed or removed crontab files
+		"""
+		if self.input_args.all:
+			c_files = cronls.get_crontab_files(self.input_args, self.parse_cache)
+		else:
+			c_files = cronls.get_crontab_files(self.input_args)
+
+		paths = []
+		changed = set()
+
+		for c_file in c_files:
+			path = c_file.get('path') or USER_CRONTAB + c_file['user']
+			paths.append(path)
+
+			if 'cached' in c_file:
+				if not c_file.get('system'):
+					continue
+
+				# Unchanged system crontab: its run-parts directories may have changed
+				rules = cronls.finalize_crontab_file(self.input_args, c_file, c_file['cached'])
+				if [rule.to_tuple() for rule in rules] == [rule.to_tuple() for rule in self.rules[path]]:
+					continue
+			else:
+				if 'path' not in c_file:
+					# No file to stat: "crontab -l" output is compared instead
+					if path in self.rules and c_file['rows'] == self.user_rows.get(path):
+						continue
+					self.user_rows[path] = c_file['rows']
+
+				processed_cron = cronls.parse_crontab_file(c_file)
+				self.parse_cache.put(path, c_file.get('key'), processed_cron)
+				rules = cronls.finalize_crontab_file(self.input_args, c_file, processed_cron)
+
+			self.rules[path] = rules
+			changed.add(path)
+
+			if self.start_time is not None:
+				self.executions[path] = self.evaluate(rules, self.start_time, self.stop_time)
+
+		removed = set(self.paths).difference(paths)
+		for path in removed:
+			del self.rules[path]
+			self.executions.pop(path, None)
+			self.user_rows.pop(path, None)
+			self.parse_cache.entries.pop(path, None)
+
+		self.paths = paths
+
+		return changed | removed
+
+	# -------------------------------------------------------------------- #
+
+	def iter_executions(self):
+		"""
+		Generate the executions in the window, in chronological order (rules
+		executed in the same minute keep the crontab files order)
+
+		Yields:
+			tuple: (ts, rule) pairs
+		"""
+		streams = [self.executions[path] for path in self.paths if path in self.executions]
+		return heapq.merge(*streams, key=lambda e: e[0])
+
+	# -------------------------------------------------------------------- #
+
+	def render(self, out):
+		"""
+		Print the executions in the window
+
+		Args:
+			out (file): Output file
+
+		Returns:
+			int: Number of printed executions
+		"""
+		rules_count = sum([len(rules) for rules in self.rules.values()])
+
+		if getattr(self.input_args, 'output_format', 'text') == 'text':
+			if out.isatty():
+				out.write(CLEAR_SCREEN)
+			out.write('# %s: %d crontabs, %d rules, executions up to %s\n' % (
+				self.start_time.strftime('%Y-%m-%d %H:%M'), len(self.paths), rules_count,
+				self.stop_time.strftime('%Y-%m-%d %H:%M')))
+
+		if not rules_count:
+			out.flush()
+			return 0
+
+		max_user_length = max([len(rule.user) for rules in self.rules.values() for rule in rules] or [0])
+		return cronls.print_executed_crontabs(self.input_args, self.iter_executions(), max_user_length, out)
+
+# ==================================================================== #
+
+def watch(input_args, out=None, iterations=None, sleep=time.sleep, now=datetime.datetime.now):
+	"""
+	Print the executions in a window as long as the [start_time, stop_time] one,
+	starting from now, and print them again every time a crontab changes (and,
+	on a terminal, every minute), until interrupted.
+
+	Args:
+		input_args (argparse.Namespace): Command line arguments
+		out (file): Output file (default sys.stdout)
+		iterations (int): Stop after this number of polls (default never)
+		sleep (callable): Function used to wait between polls
+		now (callable): Function returning the current time
+	"""
+	if out is None:
+		out = sys.stdout
+
+	watcher = CrontabWatcher(input_args, input_args.stop_time - input_args.start_time)
+	polls = 0
+
+	try:
+		while True:
+			moved = watcher.advance(now())
+			changed = watcher.refresh()
+
+			if changed or polls == 0 or (moved and out.isatty()):
+				watcher.render(out)
+
+			polls += 1
+			if iterations is not None and polls >= iterations:
+				break
+
+			sleep(input_args.watch_interval)
+	except KeyboardInterrupt:
+		pass
@@ -60,7 +60,7 @@ setup(
 	},
 	entry_points={
 		'console_scripts': [
-			'cronls = cronls.cronls:CronlsCommand'
+			'cronls = cronls.cronls:run'
 		]
 	},
 	author_email='francesco.caliumi@gmail.com',
@@ -86,5 +86,6 @@ setup(
 	],
 	extras_require={
 		'testing': ['pytest', 'pytest-cov'],
+		'numpy': ['numpy'],
 	}
 )
\ No newline at end of file